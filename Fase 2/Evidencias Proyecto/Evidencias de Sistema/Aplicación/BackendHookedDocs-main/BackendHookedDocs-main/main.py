@@ -4,6 +4,7 @@ from tkinter import ttk
 import json
 import os
 import sys
+import multiprocessing
 import ttkthemes
 from plyer import notification
 from PIL import Image, ImageTk
@@ -19,7 +20,9 @@ from src.etl.physical_tickets import main as fun_pt
 from src.etl.electronic_tickets import main as fun_et
 from src.etl.invoices_issued import main as fun_ii
 from src.etl.invoices_received import main as fun_ir
-from src.core.crud import read_select_invoice, update_selected_invoice, delete_invoice, read_log
+from src.core.crud import read_select_invoice, update_selected_invoice, delete_invoice, iter_log, count_log
+from src.core.schemas import get_schema
+from src.core import metrics
 
 class HookedDocsApp:
     def __init__(self, root):
@@ -45,6 +48,7 @@ class HookedDocsApp:
         config_menu = tk.Menu(menu_bar, tearoff=0)
         config_menu.add_command(label="Configuración de Carpetas", command=self.config_folders)
         config_menu.add_command(label="Seleccionar Tema", command=self.select_theme_window)
+        config_menu.add_command(label="Exportar Métricas de BD", command=self.export_metrics)
         menu_bar.add_cascade(label="Configuración", menu=config_menu)
 
         # Crear el Notebook para las pestañas de funcionalidades
@@ -123,17 +127,31 @@ class HookedDocsApp:
         for item in self.logs_tree.get_children():
             self.logs_tree.delete(item)
 
-        # Leer los logs desde la base de datos
-        logs = read_log()
-        for log in logs:
+        # Leer los logs desde la base de datos por bloques, sin cargarlos completos en memoria
+        for log in iter_log():
             # Insertar cada log en la tabla con sus valores correspondientes
             self.logs_tree.insert("", "end", values=(log["ISSUER_NAME"], log["PROCESS"], log["INVOICE_ID"], log["VALIDATION_MESSAGE"]))
 
     def check_pending_errors(self):
-        # Verificar si hay errores pendientes
-        logs = read_log()
-        if logs:
-            messagebox.showwarning("DTE's con errores", f"Hay {len(logs)} DTE's con errores de lectura, favor revisar la ventana Auditoría DTE's.")
+        # Verificar si hay errores pendientes (solo se cuentan, sin traer las filas)
+        pending_errors = count_log()
+        if pending_errors:
+            messagebox.showwarning("DTE's con errores", f"Hay {pending_errors} DTE's con errores de lectura, favor revisar la ventana Auditoría DTE's.")
+
+    def export_metrics(self):
+        # Guardar las métricas de las llamadas a la BD (JSON o texto Prometheus según la extensión)
+        path = filedialog.asksaveasfilename(
+            title="Exportar Métricas de BD",
+            defaultextension=".json",
+            filetypes=[("JSON", "*.json"), ("Prometheus", "*.prom")]
+        )
+        if not path:
+            return
+        try:
+            metrics.dump(path)
+            messagebox.showinfo("Métricas", f"Métricas exportadas en {path}")
+        except OSError as e:
+            messagebox.showerror("Error", f"No se pudieron exportar las métricas: {str(e)}")
 
     def config_folders(self):
         # Ventana de configuración para seleccionar carpetas
@@ -247,15 +265,8 @@ class HookedDocsApp:
         self.invoice_data_entries = {}
 
         # Definir los campos específicos según la funcionalidad
-        fields = []
-        if functionality_number == 1:  # Facturas Recibidas
-            fields = ["Número Factura", "Nombre Proveedor", "RUT Proveedor", "Subtotal", "IVA", "Total", "Método de Pago"]
-        elif functionality_number == 2:  # Facturas Emitidas
-            fields = ["Número Factura", "Nombre Comprador", "RUT Comprador", "RUT Proveedor", "Tipo de Factura", "Subtotal", "IVA", "Total", "Método de Pago"]
-        elif functionality_number == 3:  # Boletas Físicas
-            fields = ["Folio", "RUT Vendedor", "Sucursal", "Fecha", "Neto", "IVA", "Total"]
-        elif functionality_number == 4:  # Boletas Electrónicas
-            fields = ["Folio", "Tipo Documento", "Emisión", "Monto Neto", "Monto Exento", "Monto IVA", "Monto Total"]
+        schema = get_schema(functionality_number)
+        fields = schema.labels if schema else []
 
         for field in fields:
             label = ttk.Label(update_window, text=field)
@@ -353,51 +364,9 @@ class HookedDocsApp:
                 # Tomar el primer resultado (asumiendo que hay solo uno)
                 invoice_data = invoices[0]
 
-                # Crear un mapeo entre los nombres de los campos de la GUI y las claves del diccionario
-                if self.current_functionality_number == 1:
-                    key_mapping = {
-                        'Número Factura': 'invoice_number',
-                        'Nombre Proveedor': 'issuer_name',
-                        'RUT Proveedor': 'issuer_rut',
-                        'Subtotal': 'subtotal',
-                        'IVA': 'tax',
-                        'Total': 'total',
-                        'Método de Pago': 'pay_method'
-                    }
-                elif self.current_functionality_number == 2:
-                    key_mapping = {
-                        'Número Factura': 'invoice_number',
-                        'Nombre Comprador': 'buyer_name',
-                        'RUT Comprador': 'buyer_rut',
-                        'RUT Proveedor': 'issuer_rut',
-                        'Tipo de Factura': 'invoice_type',
-                        'Subtotal': 'subtotal',
-                        'IVA': 'tax',
-                        'Total': 'total',
-                        'Método de Pago': 'pay_method'
-                    }
-                elif self.current_functionality_number == 3:
-                    key_mapping = {
-                        'Folio': 'folio',
-                        'Neto': 'neto',
-                        'IVA': 'iva',
-                        'Total': 'total',
-                        'Fecha': 'fecha',
-                        'RUT Vendedor': 'rut_vendedor',
-                        'Sucursal': 'sucursal'  
-                    }
-                elif self.current_functionality_number == 4:
-                    key_mapping = {
-                        'Tipo Documento': 'tipo_documento',
-                        'Folio': 'folio',
-                        'Emisión': 'emision',
-                        'Monto Neto': 'monto_neto',
-                        'Monto Exento': 'monto_exento',
-                        'Monto IVA': 'monto_iva',
-                        'Monto Total': 'monto_total'
-                    }
-                else:
-                    key_mapping = {}
+                # Mapeo entre los nombres de los campos de la GUI y las claves del diccionario
+                schema = get_schema(self.current_functionality_number)
+                key_mapping = schema.column_by_label if schema else {}
 
                 # Rellenar los campos con los datos de la factura o boleta
                 for gui_field_name, entry in self.invoice_data_entries.items():
@@ -428,71 +397,18 @@ class HookedDocsApp:
             entry.delete(0, tk.END)
 
     def update_invoice(self):
-        # Obtener los datos actualizados desde la interfaz gráfica
-        updated_data = {key.lower().replace(" ", "_"): entry.get() for key, entry in self.invoice_data_entries.items()}
-
-        # Mapeo de claves ajustado para coincidir con updated_data
-        if self.current_functionality_number == 1:
-            key_mapping = {
-                'número_factura': 'invoice_number',
-                'nombre_proveedor': 'issuer_name',
-                'rut_proveedor': 'issuer_rut',
-                'subtotal': 'subtotal',
-                'iva': 'tax',
-                'total': 'total',
-                'método_de_pago': 'pay_method'
-            }
-        elif self.current_functionality_number == 2:
-            key_mapping = {
-                'número_factura': 'invoice_number',
-                'nombre_comprador': 'buyer_name',
-                'rut_comprador': 'buyer_rut',
-                'rut_proveedor': 'issuer_rut',
-                'tipo_de_factura': 'invoice_type',
-                'subtotal': 'subtotal',
-                'iva': 'tax',
-                'total': 'total',
-                'método_de_pago': 'pay_method'
-            }
-        elif self.current_functionality_number == 3:
-            # mapeo para boletas físicas
-            key_mapping = {
-                'folio': 'folio',
-                'neto': 'neto',
-                'iva': 'iva',
-                'total': 'total',
-                'fecha': 'fecha',
-                'rut_vendedor': 'rut_vendedor',
-                'sucursal': 'sucursal'
-            }
-        elif self.current_functionality_number == 4:
-            # mapeo para boletas electrónicas
-            key_mapping = {
-                'tipo_documento': 'tipo_documento',
-                'folio': 'folio',
-                'emisión': 'emision',
-                'monto_neto': 'monto_neto',
-                'monto_exento': 'monto_exento',
-                'monto_iva': 'monto_iva',
-                'monto_total': 'monto_total'
-            }
-        else:
+        schema = get_schema(self.current_functionality_number)
+        if not schema:
             messagebox.showerror("Error", "Funcionalidad no reconocida.")
             return
 
-        # Aplicar el mapeo a los datos actualizados
-        updated_data_mapped = {key_mapping.get(k, k): v for k, v in updated_data.items()}
+        # Obtener los datos actualizados desde la interfaz gráfica, con el nombre de columna de cada campo
+        updated_data_mapped = {
+            schema.column_by_label.get(label, label): entry.get() for label, entry in self.invoice_data_entries.items()
+        }
 
         # Obtener el número de factura o folio
-        if self.current_functionality_number in [1, 2]:
-            invoice_number = updated_data_mapped.get('invoice_number')
-        elif self.current_functionality_number == 3:
-            invoice_number = updated_data_mapped.get('folio')
-        elif self.current_functionality_number == 4:
-            invoice_number = updated_data_mapped.get('folio')
-        else:
-            messagebox.showerror("Error", "Funcionalidad no reconocida.")
-            return
+        invoice_number = updated_data_mapped.get(schema.id_field)
 
         if not invoice_number:
             messagebox.showwarning("Advertencia", "El número de factura o folio no está especificado.")
@@ -543,6 +459,9 @@ class HookedDocsApp:
 
 
 if __name__ == "__main__":
+    # Necesario para los procesos de extracción en paralelo en el ejecutable de Windows
+    multiprocessing.freeze_support()
+
     # Crear la ventana de splash
     splash_root = tk.Tk()
     splash_root.overrideredirect(True)  # Quitar la barra de título
@@ -0,0 +1,54 @@
+class StorageBackend:
+    """
+    Interfaz de almacenamiento usada por crud.py.
+
+    El SQL de crear/leer/actualizar/eliminar es común a todos los motores (binds
+    con nombre y la función to_date). Cada backend implementa solo las operaciones
+    que dependen del motor: carga en lote con errores por fila, traspaso de las
+    facturas JSON a las tablas planas, auditoría y depuración del log.
+    """
+
+    # Nombre del motor y clase base de errores del driver (equivalente a DB-API)
+    name = None
+    Error = Exception
+
+    def prepare_connection(self, connection):
+        """Preparar una conexión recién abierta (funciones, esquema, pragmas)."""
+        return connection
+
+    def executemany(self, cursor, sql, rows):
+        """
+        Ejecutar `sql` para cada fila sin abortar el lote completo. Las filas pueden ser
+        diccionarios (binds con nombre) o secuencias enlazadas en el orden de los binds.
+
+        Retorna una lista de tuplas (posición de la fila, mensaje de error).
+        """
+        raise NotImplementedError
+
+    def page_clause(self, offset=None, limit=None):
+        """
+        Cláusula de paginación del motor para agregar al final de una consulta ordenada.
+
+        Retorna una tupla (texto SQL, parámetros).
+        """
+        raise NotImplementedError
+
+    def process_invoices(self, cursor, table_name):
+        """Traspasar las facturas JSON de la tabla de paso a las tablas planas y auditarlas."""
+        raise NotImplementedError
+
+    def audit_invoices(self, cursor, functionality):
+        """Volver a auditar las facturas planas de la funcionalidad (1 recibidas, 2 emitidas)."""
+        raise NotImplementedError
+
+    def depurate_log(self, cursor, invoice_number):
+        """Depurar el log de auditoría de una factura eliminada. Retorna 0 si fue exitosa."""
+        raise NotImplementedError
+
+    def depurate_logs(self, cursor, invoice_numbers):
+        """
+        Depurar el log de auditoría de varias facturas eliminadas en un solo paso.
+
+        Retorna la cantidad de facturas cuya depuración no fue exitosa.
+        """
+        return sum(1 for number in invoice_numbers if self.depurate_log(cursor, number) != 0)
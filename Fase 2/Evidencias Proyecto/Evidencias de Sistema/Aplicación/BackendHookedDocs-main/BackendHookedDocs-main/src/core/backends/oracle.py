@@ -0,0 +1,78 @@
+import oracledb
+from .base import StorageBackend
+
+
+class OracleBackend(StorageBackend):
+    """
+    Backend de producción: delega el traspaso, la auditoría y la depuración
+    en los paquetes PL/SQL de HookedDocs_PKG.sql.
+    """
+
+    name = "oracle"
+    Error = oracledb.Error
+
+    # Procedimientos orquestadores y de auditoría por tabla / funcionalidad
+    process_procedures = {
+        'invoices_issued': 'pkg_issued.main',
+        'invoices_received': 'pkg_received.main'
+    }
+    audit_procedures = {
+        1: 'pkg_received.audit_invoice_received',
+        2: 'pkg_issued.audit_invoice_issued'
+    }
+
+    # Bloque que llama FN_LOG_DEPURATION por cada número de un arreglo enlazado (un solo round trip)
+    depuration_block = """
+    DECLARE
+        v_numbers DBMS_SQL.NUMBER_TABLE := :invoice_numbers;
+        v_index   PLS_INTEGER := v_numbers.FIRST;
+        v_failed  NUMBER := 0;
+    BEGIN
+        WHILE v_index IS NOT NULL LOOP
+            IF PKG_LOG_DEPURATION.FN_LOG_DEPURATION(v_numbers(v_index)) <> 0 THEN
+                v_failed := v_failed + 1;
+            END IF;
+            v_index := v_numbers.NEXT(v_index);
+        END LOOP;
+        :failed := v_failed;
+    END;
+    """
+
+    def executemany(self, cursor, sql, rows):
+        cursor.executemany(sql, rows, batcherrors=True)
+        return [(error.offset, error.message) for error in cursor.getbatcherrors()]
+
+    def page_clause(self, offset=None, limit=None):
+        clause = ""
+        params = {}
+        if offset is not None:
+            clause += " OFFSET :page_offset ROWS"
+            params["page_offset"] = offset
+        if limit is not None:
+            clause += " FETCH NEXT :page_limit ROWS ONLY"
+            params["page_limit"] = limit
+        return clause, params
+
+    def process_invoices(self, cursor, table_name):
+        procedure = self.process_procedures.get(table_name)
+        if procedure:
+            cursor.callproc(procedure)
+
+    def audit_invoices(self, cursor, functionality):
+        procedure = self.audit_procedures.get(functionality)
+        if procedure:
+            cursor.callproc(procedure)
+
+    def depurate_log(self, cursor, invoice_number):
+        return cursor.callfunc('PKG_LOG_DEPURATION.FN_LOG_DEPURATION', oracledb.NUMBER, [invoice_number])
+
+    def depurate_logs(self, cursor, invoice_numbers):
+        invoice_numbers = list(invoice_numbers)
+        if not invoice_numbers:
+            return 0
+        failed = cursor.var(oracledb.NUMBER)
+        cursor.execute(self.depuration_block, {
+            "invoice_numbers": cursor.arrayvar(oracledb.NUMBER, invoice_numbers),
+            "failed": failed
+        })
+        return int(failed.getvalue())
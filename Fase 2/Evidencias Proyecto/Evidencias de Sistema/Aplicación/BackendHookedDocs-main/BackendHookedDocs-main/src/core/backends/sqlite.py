@@ -0,0 +1,471 @@
+import re
+import json
+import sqlite3
+import datetime
+import logging
+from .base import StorageBackend
+
+# Esquema equivalente a HookedDocs_tables.sql (tipos de SQLite, fechas en texto ISO)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS invoices_issued (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    invoice_data TEXT,
+    create_date TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS invoices_received (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    invoice_data TEXT,
+    create_date TEXT DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS flat_invoices_issued (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    create_date TEXT,
+    pay_method TEXT,
+    subtotal NUMERIC NOT NULL,
+    tax NUMERIC NOT NULL,
+    total NUMERIC NOT NULL,
+    issuer_name TEXT,
+    issuer_rut TEXT,
+    issuer_economic_activity TEXT,
+    issuer_address TEXT,
+    issuer_email TEXT,
+    issuer_phone TEXT,
+    invoice_number INTEGER NOT NULL UNIQUE,
+    invoice_type TEXT,
+    issue_date TEXT,
+    buyer_name TEXT,
+    buyer_rut TEXT,
+    buyer_economic_activity TEXT,
+    buyer_address TEXT,
+    buyer_commune TEXT
+);
+CREATE TABLE IF NOT EXISTS flat_invoices_issued_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    item_description TEXT,
+    item_quantity TEXT NOT NULL,
+    item_unit_price NUMERIC NOT NULL,
+    item_total_price NUMERIC NOT NULL,
+    invoice_number_fk INTEGER REFERENCES flat_invoices_issued (invoice_number) ON DELETE CASCADE,
+    create_date TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS flat_invoices_received (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    create_date TEXT,
+    pay_method TEXT,
+    subtotal NUMERIC NOT NULL,
+    tax NUMERIC NOT NULL,
+    total NUMERIC NOT NULL,
+    invoice_number INTEGER NOT NULL UNIQUE,
+    issue_date TEXT,
+    issuer_name TEXT,
+    issuer_rut TEXT,
+    issuer_address TEXT,
+    issuer_email TEXT,
+    issuer_phone TEXT
+);
+CREATE TABLE IF NOT EXISTS flat_invoices_received_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    item_description TEXT,
+    item_quantity NUMERIC NOT NULL,
+    item_sku TEXT,
+    item_unit_price NUMERIC NOT NULL,
+    item_discount NUMERIC NOT NULL,
+    item_total_price NUMERIC NOT NULL,
+    invoice_number_fk INTEGER REFERENCES flat_invoices_received (invoice_number) ON DELETE CASCADE,
+    create_date TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS physical_tickets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    create_date TEXT DEFAULT CURRENT_TIMESTAMP,
+    folio INTEGER,
+    neto NUMERIC,
+    iva NUMERIC,
+    total NUMERIC,
+    dte INTEGER,
+    fecha TEXT,
+    rut_vendedor TEXT,
+    sucursal TEXT
+);
+CREATE TABLE IF NOT EXISTS electronic_tickets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    create_date TEXT DEFAULT CURRENT_TIMESTAMP,
+    tipo INTEGER,
+    tipo_documento TEXT,
+    folio INTEGER,
+    razon_social_receptor TEXT,
+    fecha_publicacion TEXT,
+    emision TEXT,
+    monto_neto TEXT,
+    monto_exento NUMERIC,
+    monto_iva NUMERIC,
+    monto_total NUMERIC,
+    fecha_sii TEXT,
+    estado_sii TEXT
+);
+CREATE INDEX IF NOT EXISTS physical_tickets_key ON physical_tickets (fecha, folio, dte);
+CREATE INDEX IF NOT EXISTS electronic_tickets_key ON electronic_tickets (emision, folio, tipo);
+CREATE TABLE IF NOT EXISTS invoice_audit_log (
+    audit_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    invoice_id INTEGER,
+    issue_date TEXT,
+    validation_message TEXT,
+    validation_timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+    process TEXT,
+    issuer_name TEXT
+);
+CREATE TABLE IF NOT EXISTS hd_log_debug (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    execution_date TEXT DEFAULT CURRENT_TIMESTAMP,
+    desc_log TEXT,
+    procedure_executed TEXT,
+    process TEXT
+);
+"""
+
+# Formatos de fecha de Oracle usados por crud.py y su equivalente en strptime
+DATE_FORMATS = {
+    'YYYYMMDD': '%Y%m%d',
+    'DDMMYYYY': '%d%m%Y',
+    'DD/MM/YYYY': '%d/%m/%Y',
+    'YYYY-MM-DD': '%Y-%m-%d'
+}
+
+# Traspaso JSON -> tabla plana, equivalente a los JSON_TABLE de SP_JSON_TO_FLAT_TABLE.
+# Cada columna indica la ruta dentro del JSON y si es numérica.
+FLAT_MAPPINGS = {
+    'invoices_issued': {
+        "table": "flat_invoices_issued",
+        "items_table": "flat_invoices_issued_items",
+        "number_path": ("issuer", "invoice_number"),
+        "date_path": ("issuer", "issue_date"),
+        "columns": {
+            "pay_method": (("pay_method",), False),
+            "subtotal": (("subtotal",), True),
+            "tax": (("tax",), True),
+            "total": (("total",), True),
+            "issuer_name": (("issuer", "name"), False),
+            "issuer_rut": (("issuer", "rut"), False),
+            "issuer_economic_activity": (("issuer", "economic_activity"), False),
+            "issuer_address": (("issuer", "address"), False),
+            "issuer_email": (("issuer", "email"), False),
+            "issuer_phone": (("issuer", "phone"), False),
+            "invoice_type": (("issuer", "invoice_type"), False),
+            "buyer_name": (("buyer", "name"), False),
+            "buyer_rut": (("buyer", "rut"), False),
+            "buyer_economic_activity": (("buyer", "economic_activity"), False),
+            "buyer_address": (("buyer", "address"), False),
+            "buyer_commune": (("buyer", "commune"), False)
+        },
+        "item_columns": {
+            "item_description": ("description", False),
+            "item_quantity": ("quantity", False),
+            "item_unit_price": ("unit_price", True),
+            "item_total_price": ("total_price", True)
+        }
+    },
+    'invoices_received': {
+        "table": "flat_invoices_received",
+        "items_table": "flat_invoices_received_items",
+        "number_path": ("invoice_number",),
+        "date_path": ("issue_date",),
+        "columns": {
+            "pay_method": (("pay_method",), False),
+            "subtotal": (("subtotal",), True),
+            "tax": (("tax",), True),
+            "total": (("total",), True),
+            "issuer_name": (("issuer", "name"), False),
+            "issuer_rut": (("issuer", "rut"), False),
+            "issuer_address": (("issuer", "address"), False),
+            "issuer_email": (("issuer", "email"), False),
+            "issuer_phone": (("issuer", "phone"), False)
+        },
+        "item_columns": {
+            "item_description": ("description", False),
+            "item_quantity": ("quantity", True),
+            "item_sku": ("sku", False),
+            "item_unit_price": ("unit_price", True),
+            "item_discount": ("discount", True),
+            "item_total_price": ("subtotal", True)
+        }
+    }
+}
+
+# Reglas de auditoría de AUDIT_INVOICE_ISSUED / AUDIT_INVOICE_RECEIVED: (columna, mensaje)
+AUDIT_RULES = {
+    1: {
+        "table": "flat_invoices_received",
+        "items_table": "flat_invoices_received_items",
+        "process": "Facturas recibidas",
+        "issuer_name": None,
+        "zero_checks": [
+            ("subtotal", "ERROR - Subtotal es nulo o cero"),
+            ("tax", "ERROR - Impuesto es nulo o cero"),
+            ("total", "ERROR - Total es nulo o cero")
+        ],
+        "null_checks": [
+            ("pay_method", "WARNING - Metodo de pago nulo"),
+            ("issuer_name", "WARNING - Nombre del remitente es nulo"),
+            ("issuer_rut", "ERROR - El rut del emisor es nulo"),
+            ("invoice_number", "ERROR - el numero de factura es nula")
+        ],
+        "item_checks": [
+            ("item_description", "WARNING - La descripcion del producto esta vacia"),
+            ("item_unit_price", "ERROR - El valor unitario del producto esta vacio"),
+            ("item_total_price", "ERROR - El subtotal de la suma de valores unitarios del producto esta vacio")
+        ]
+    },
+    2: {
+        "table": "flat_invoices_issued",
+        "items_table": None,
+        "process": "Facturas emitidas",
+        "issuer_name": "El Senuelo",
+        "zero_checks": [
+            ("subtotal", "ERROR - Subtotal es nulo o cero"),
+            ("tax", "ERROR - Impuesto es nulo o cero"),
+            ("total", "ERROR - Total es nulo o cero")
+        ],
+        "null_checks": [
+            ("pay_method", "WARNING - Metodo de pago nulo"),
+            ("issuer_rut", "ERROR - El rut del emisor es nulo"),
+            ("invoice_number", "ERROR - el numero de factura es nula"),
+            ("invoice_type", "WARNING - Tipo de documento es nulo"),
+            ("buyer_name", "WARNING - El nombre del comprador es nulo"),
+            ("buyer_rut", "WARNING - El rut del comprador es nulo")
+        ],
+        "item_checks": []
+    }
+}
+
+TOTAL_MISMATCH_MESSAGE = "ERROR - Total es diferente de la suma de valores neto+iva"
+
+# Fechas de Python enlazadas como texto ISO, igual que se guardan en las tablas
+sqlite3.register_adapter(datetime.date, lambda value: value.isoformat())
+sqlite3.register_adapter(datetime.datetime, lambda value: value.isoformat(" "))
+
+# Binds con nombre (:valor); con filas posicionales se reemplazan por '?' en orden de aparición
+NAMED_BIND = re.compile(r":(\w+)")
+
+
+def to_date(value, oracle_format):
+    """Equivalente a TO_DATE de Oracle: convierte el texto a fecha ISO 'YYYY-MM-DD'."""
+    if value is None or value == '':
+        return None
+    date_format = DATE_FORMATS.get(str(oracle_format).upper())
+    if date_format is None:
+        raise ValueError(f"Formato de fecha no soportado: {oracle_format}")
+    return datetime.datetime.strptime(str(value), date_format).strftime('%Y-%m-%d')
+
+def _json_value(document, path):
+    """Obtener el valor en `path` dentro del JSON, o None si no existe."""
+    value = document
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+def _column_value(value, numeric):
+    """Convertir un valor JSON como lo hace JSON_TABLE (NULL ON ERROR)."""
+    if value is None or isinstance(value, (dict, list)):
+        return None
+    if numeric:
+        try:
+            return float(value) if not isinstance(value, int) else value
+        except (TypeError, ValueError):
+            return None
+    return str(value)
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Backend local en SQLite. Reproduce las tablas de HookedDocs_tables.sql y ejecuta
+    en Python el traspaso JSON -> tablas planas y la auditoría de los paquetes PL/SQL,
+    para correr los ETL completos sin un servidor Oracle.
+    """
+
+    name = "sqlite"
+    Error = sqlite3.Error
+
+    def prepare_connection(self, connection):
+        connection.create_function("to_date", 2, to_date, deterministic=True)
+        connection.execute("PRAGMA foreign_keys = ON")
+        connection.executescript(SCHEMA)
+        return connection
+
+    def executemany(self, cursor, sql, rows):
+        rows = list(rows)
+        if rows and not isinstance(rows[0], dict):
+            sql = NAMED_BIND.sub("?", sql)
+        self._savepoint(cursor, "hd_executemany")
+        try:
+            cursor.executemany(sql, rows)
+            cursor.execute("RELEASE SAVEPOINT hd_executemany")
+            return []
+        except sqlite3.Error:
+            cursor.execute("ROLLBACK TO SAVEPOINT hd_executemany")
+            cursor.execute("RELEASE SAVEPOINT hd_executemany")
+
+        # Algún registro falló: se reintenta fila a fila para aislar los errores
+        errors = []
+        for offset, row in enumerate(rows):
+            try:
+                cursor.execute(sql, row)
+            except sqlite3.Error as e:
+                errors.append((offset, str(e)))
+        return errors
+
+    def _savepoint(self, cursor, name):
+        """
+        Abrir un savepoint dentro de la transacción de la conexión. El módulo sqlite3 no
+        inicia una transacción para SAVEPOINT, y sin una transacción abierta el RELEASE
+        confirma los cambios; por eso se inicia antes, para que el commit o rollback de
+        with_connection abarque todo el lote.
+        """
+        if not cursor.connection.in_transaction:
+            cursor.execute("BEGIN")
+        cursor.execute(f"SAVEPOINT {name}")
+
+    def page_clause(self, offset=None, limit=None):
+        if offset is None and limit is None:
+            return "", {}
+        # En SQLite OFFSET requiere LIMIT; -1 significa sin límite
+        params = {
+            "page_limit": limit if limit is not None else -1,
+            "page_offset": offset or 0
+        }
+        return " LIMIT :page_limit OFFSET :page_offset", params
+
+    def _log_debug(self, cursor, message, procedure):
+        cursor.execute(
+            "INSERT INTO hd_log_debug (desc_log, procedure_executed) VALUES (?, ?)",
+            (message, procedure)
+        )
+
+    def process_invoices(self, cursor, table_name):
+        mapping = FLAT_MAPPINGS.get(table_name)
+        if not mapping:
+            return
+        self._json_to_flat_table(cursor, table_name, mapping)
+        self.audit_invoices(cursor, 2 if table_name == 'invoices_issued' else 1)
+
+    def _json_to_flat_table(self, cursor, table_name, mapping):
+        """Equivalente a SP_JSON_TO_FLAT_TABLE: una fila plana por factura nueva y sus ítems."""
+        procedure = "SP_JSON_TO_FLAT_TABLE"
+        cursor.execute("DELETE FROM hd_log_debug WHERE UPPER(procedure_executed) = ?", (procedure,))
+
+        columns = list(mapping["columns"]) + ["invoice_number", "issue_date", "create_date"]
+        insert_sql = (
+            f"INSERT INTO {mapping['table']} ({', '.join(columns)}) "
+            f"VALUES ({', '.join(':' + column for column in columns)})"
+        )
+        item_columns = list(mapping["item_columns"]) + ["invoice_number_fk", "create_date"]
+        insert_item_sql = (
+            f"INSERT INTO {mapping['items_table']} ({', '.join(item_columns)}) "
+            f"VALUES ({', '.join(':' + column for column in item_columns)})"
+        )
+
+        existing = {row[0] for row in cursor.execute(f"SELECT invoice_number FROM {mapping['table']}")}
+        with_items = {row[0] for row in cursor.execute(f"SELECT DISTINCT invoice_number_fk FROM {mapping['items_table']}")}
+
+        staged = cursor.execute(f"SELECT invoice_data, create_date FROM {table_name} ORDER BY id").fetchall()
+        flat_count = 0
+        item_count = 0
+        for invoice_data, create_date in staged:
+            # Cada factura se traspasa completa (fila plana + ítems) o no se traspasa
+            self._savepoint(cursor, "hd_flat_invoice")
+            try:
+                document = json.loads(invoice_data)
+                raw_number = _json_value(document, mapping["number_path"])
+                invoice_number = int(raw_number) if raw_number not in (None, '') else None
+
+                if invoice_number not in existing:
+                    row = {
+                        column: _column_value(_json_value(document, path), numeric)
+                        for column, (path, numeric) in mapping["columns"].items()
+                    }
+                    row["invoice_number"] = invoice_number
+                    row["issue_date"] = to_date(_json_value(document, mapping["date_path"]), 'DDMMYYYY')
+                    row["create_date"] = create_date
+                    cursor.execute(insert_sql, row)
+                    existing.add(invoice_number)
+                    flat_count += 1
+
+                if invoice_number not in with_items:
+                    for item in _json_value(document, ("items",)) or []:
+                        item_row = {
+                            column: _column_value(item.get(key), numeric)
+                            for column, (key, numeric) in mapping["item_columns"].items()
+                        }
+                        item_row["invoice_number_fk"] = invoice_number
+                        item_row["create_date"] = create_date
+                        cursor.execute(insert_item_sql, item_row)
+                        item_count += 1
+                    with_items.add(invoice_number)
+                cursor.execute("RELEASE SAVEPOINT hd_flat_invoice")
+            except (sqlite3.Error, ValueError, TypeError) as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT hd_flat_invoice")
+                cursor.execute("RELEASE SAVEPOINT hd_flat_invoice")
+                logging.error(f"Error al traspasar factura de {table_name}: {e}")
+                self._log_debug(cursor, f"ERROR al procesar {mapping['table']} *** {e}", procedure)
+
+        # Limpieza de la tabla de paso
+        cursor.execute(f"DELETE FROM {table_name}")
+        self._log_debug(cursor, f"Fin, filas procesadas en {mapping['table']} = {flat_count}", procedure)
+        self._log_debug(cursor, f"Fin, filas procesadas en {mapping['items_table']} = {item_count}", procedure)
+
+    def audit_invoices(self, cursor, functionality):
+        """Equivalente a AUDIT_INVOICE_RECEIVED / AUDIT_INVOICE_ISSUED."""
+        rules = AUDIT_RULES.get(functionality)
+        if not rules:
+            return
+        procedure = f"AUDIT_{rules['table'].upper()}"
+        cursor.execute("DELETE FROM hd_log_debug WHERE UPPER(procedure_executed) = ?", (procedure,))
+        cursor.execute("DELETE FROM invoice_audit_log WHERE process = ?", (rules["process"],))
+        self._log_debug(cursor, "Inicio auditoria contabilidad", procedure)
+
+        items_by_invoice = {}
+        if rules["items_table"]:
+            item_fields = [field for field, _ in rules["item_checks"]]
+            cursor.execute(f"SELECT invoice_number_fk, {', '.join(item_fields)} FROM {rules['items_table']}")
+            for row in cursor.fetchall():
+                items_by_invoice.setdefault(row[0], []).append(dict(zip(item_fields, row[1:])))
+
+        fields = ["id", "create_date", "issuer_name"] + [field for field, _ in rules["zero_checks"] + rules["null_checks"]]
+        cursor.execute(f"SELECT {', '.join(dict.fromkeys(fields))} FROM {rules['table']} ORDER BY id")
+        columns = [description[0] for description in cursor.description]
+        invoices = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+        audit_rows = []
+        for invoice in invoices:
+            messages = [message for field, message in rules["zero_checks"] if not invoice[field]]
+            if None not in (invoice["subtotal"], invoice["tax"], invoice["total"]) \
+                    and invoice["subtotal"] + invoice["tax"] != invoice["total"]:
+                messages.append(TOTAL_MISMATCH_MESSAGE)
+            messages += [message for field, message in rules["null_checks"] if invoice[field] is None]
+            for item in items_by_invoice.get(invoice["invoice_number"], []):
+                messages += [message for field, message in rules["item_checks"] if item[field] is None]
+
+            invoice_id = invoice["invoice_number"] if invoice["invoice_number"] is not None else invoice["id"]
+            issuer_name = rules["issuer_name"] or invoice["issuer_name"]
+            audit_rows += [
+                (invoice_id, invoice["create_date"], message, rules["process"], issuer_name)
+                for message in messages
+            ]
+
+        cursor.executemany(
+            "INSERT INTO invoice_audit_log (invoice_id, issue_date, validation_message, process, issuer_name) "
+            "VALUES (?, ?, ?, ?, ?)",
+            audit_rows
+        )
+        self._log_debug(cursor, "Fin", procedure)
+
+    def depurate_log(self, cursor, invoice_number):
+        """Equivalente a FN_LOG_DEPURATION: elimina las validaciones pendientes de la factura."""
+        procedure = "FN_LOG_DEPURATION"
+        cursor.execute("DELETE FROM hd_log_debug WHERE UPPER(procedure_executed) = ?", (procedure,))
+        cursor.execute("DELETE FROM invoice_audit_log WHERE invoice_id = ?", (invoice_number,))
+        if cursor.rowcount:
+            self._log_debug(cursor, f"DELETE, EJECUTADO NUMERO: {invoice_number}", procedure)
+        else:
+            self._log_debug(cursor, f"REGISTRO ELIMINADO {invoice_number} NO POSEE VALIDACION PENDIENTE", procedure)
+        return 0
@@ -0,0 +1,56 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Caché en memoria LRU con expiración por tiempo (TTL).
+
+    Guarda como máximo `maxsize` entradas; al llenarse descarta la usada hace más
+    tiempo. Cada entrada vence `ttl` segundos después de guardarse.
+    """
+
+    def __init__(self, maxsize=256, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Devolver el valor guardado para `key`, o None si no existe o ya venció."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """Guardar `value` para `key`, descartando la entrada menos usada si no hay espacio."""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """Eliminar la entrada de `key` si existe."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Eliminar todas las entradas."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Devolver los contadores de aciertos, fallos y tamaño actual."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
@@ -1,30 +1,80 @@
 import json
+import time
 import datetime
 import logging
-import oracledb
-from .database import get_connection, close_connection
+import functools
+import numpy
+import pandas as pd
+from .database import get_connection, close_connection, get_backend
+from .cache import TTLCache
+from .schemas import get_schema
+from .metrics import CallRecorder
 
 # Configuración de logging para el seguimiento y depuración
 logging.basicConfig(level=logging.INFO)
 
+# Cantidad de filas enviadas por cada executemany en la carga de boletas
+TICKETS_CHUNK_SIZE = 5000
+
+# Clave de cada tabla de boletas como pares (columna de la tabla, columna del DataFrame): folio,
+# tipo de documento y fecha de emisión; la fecha acota la lectura de las claves ya cargadas
+PHYSICAL_TICKETS_KEY = [("folio", "numero_documento"), ("dte", "codigo_tributario"), ("fecha", "fecha_emision")]
+ELECTRONIC_TICKETS_KEY = [("folio", "folio"), ("tipo", "tipo"), ("emision", "fecha_emision")]
+
+# Tamaño de bloque (arraysize) para leer las claves de boletas ya cargadas
+TICKET_KEYS_ARRAYSIZE = 5000
+
+# Columnas y tamaño de bloque (arraysize) para las lecturas del log de validaciones
+LOG_COLUMNS = ["AUDIT_ID", "ISSUER_NAME", "PROCESS", "INVOICE_ID", "ISSUE_DATE", "VALIDATION_MESSAGE"]
+LOG_ARRAYSIZE = 500
+
+# Caché de lecturas de read_select_invoice: cantidad máxima de documentos y segundos de vigencia
+INVOICE_CACHE_SIZE = 256
+INVOICE_CACHE_TTL = 300
+_invoice_cache = TTLCache(INVOICE_CACHE_SIZE, INVOICE_CACHE_TTL)
+
+# Cantidad máxima de números por cláusula IN en las lecturas múltiples (Oracle admite hasta 1000)
+SELECT_IN_CHUNK_SIZE = 500
+
 
 #verificar conexion con la BD al llamar a funciones del crud
 def with_connection(func):
-    """Decorator para manejar la conexión a la base de datos."""
+    """
+    Decorator que toma prestada una conexión del pool y la devuelve al terminar.
+
+    Cada llamada se registra en src.core.metrics: tiempo total, espera de conexión,
+    viajes a la BD, filas y fallos.
+    """
+    recorder_name = func.__name__.lstrip("_")
+
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        connection = get_connection()
+        recorder = CallRecorder(recorder_name)
+        start = time.perf_counter()
+        failed = True
+        try:
+            connection = get_connection()
+        except Exception:
+            wait = time.perf_counter() - start
+            recorder.finish(wait, wait, failed)
+            raise
+        wait = time.perf_counter() - start
         if not connection:
             logging.error("No se pudo establecer la conexión con la base de datos.")
+            recorder.finish(wait, wait, failed)
             return None
         try:
-            result = func(connection, *args, **kwargs)
-            connection.commit()
+            instrumented = recorder.wrap(connection)
+            result = func(instrumented, *args, **kwargs)
+            instrumented.commit()
+            failed = False
             return result
         except Exception as e:
             logging.error(f"Error en la función {func.__name__}: {e}")
             connection.rollback()
         finally:
             close_connection(connection)
+            recorder.finish(time.perf_counter() - start, wait, failed)
     return wrapper
 
 
@@ -61,23 +111,166 @@ def create_invoice(connection, data, table_name):
     cursor = connection.cursor()
     invoice_json = json.dumps(data)
     insert_query = f"INSERT INTO {table_name} (invoice_data) VALUES (:invoice_data)"
-    cursor.execute(insert_query, invoice_data=invoice_json)
+    cursor.execute(insert_query, {"invoice_data": invoice_json})
 
-    if table_name == 'invoices_issued':
-        cursor.callproc('pkg_issued.main')
-    elif table_name == 'invoices_received':
-        cursor.callproc('pkg_received.main')
+    # Traspaso a tablas planas y auditoría (pkg_issued.main / pkg_received.main en Oracle)
+    get_backend().process_invoices(cursor, table_name)
     
     logging.info(f"Factura insertada correctamente en {table_name}.")
     cursor.close()
 
 
+# CREA nuevos registros en lote en facturas emitidas o recibidas
+@with_connection
+def create_invoices_bulk(connection, records, table_name):
+    """
+    Insertar varias facturas con un solo executemany y ejecutar el orquestador una vez por lote.
+    La inserción, el traspaso y la auditoría son una sola transacción: si alguna etapa falla
+    no queda ninguna factura del lote (retorna None) y el lote se puede reintentar completo.
+
+    Retorna una lista con el resultado de cada registro, en el mismo orden recibido:
+    {"ok": True/False, "error": mensaje de error o None}.
+    """
+    backend = get_backend()
+    cursor = connection.cursor()
+    records = list(records)
+    results = [{"ok": True, "error": None} for _ in records]
+
+    # Serializar cada factura; las que no se pueden convertir a JSON se marcan como fallidas
+    rows = []
+    row_index = []
+    for index, data in enumerate(records):
+        try:
+            rows.append({"invoice_data": json.dumps(data)})
+            row_index.append(index)
+        except (TypeError, ValueError) as e:
+            results[index] = {"ok": False, "error": str(e)}
+
+    if rows:
+        insert_query = f"INSERT INTO {table_name} (invoice_data) VALUES (:invoice_data)"
+        for offset, message in backend.executemany(cursor, insert_query, rows):
+            results[row_index[offset]] = {"ok": False, "error": message}
+
+        # El traspaso a tablas planas y la auditoría se ejecutan una sola vez por lote
+        backend.process_invoices(cursor, table_name)
+
+    inserted = sum(1 for result in results if result["ok"])
+    logging.info(f"{inserted} de {len(records)} facturas insertadas en {table_name}.")
+    cursor.close()
+    return results
+
+
+# CARGA por bloques columnas de un DataFrame sin convertirlo a lista de diccionarios
+def bind_columns(cursor, sql, data, columns, chunk_size=TICKETS_CHUNK_SIZE):
+    """
+    Ejecutar `sql` por bloques de `chunk_size` filas, enlazando por posición los valores
+    tomados directamente de las columnas del DataFrame (en el orden de los binds del SQL).
+    Las filas rechazadas por la BD se informan sin abortar el resto de la carga.
+
+    Retorna una tupla (filas insertadas, lista de (índice de la fila, mensaje de error)).
+    """
+    backend = get_backend()
+    series = [data[column] for column in columns]
+    inserted = 0
+    rejected = []
+    for start in range(0, len(data), chunk_size):
+        rows = list(zip(*(values.iloc[start:start + chunk_size].tolist() for values in series)))
+        errors = backend.executemany(cursor, sql, rows)
+        rejected += [(data.index[start + offset], message) for offset, message in errors]
+        inserted += len(rows) - len(errors)
+    return inserted, rejected
+
+
+# Fechas 'YYYYMMDD' (texto del DataFrame o fecha de la BD) como número YYYYMMDD
+def _date_numbers(values, from_database=False):
+    """
+    Convertir las fechas de una columna en números YYYYMMDD (float64, NaN si no hay fecha).
+
+    - values: fechas como texto 'YYYYMMDD' (DataFrame de carga) o como las devuelve la BD
+      (datetime en Oracle, texto 'YYYY-MM-DD' en SQLite) si `from_database` es True.
+    """
+    if from_database:
+        dates = pd.DatetimeIndex(pd.to_datetime(pd.Series(values, dtype=object)))
+        return (dates.year * 10000 + dates.month * 100 + dates.day).to_numpy(dtype=numpy.float64, na_value=numpy.nan)
+    return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").to_numpy(dtype=numpy.float64)
+
+
+# LEE una sola vez las claves de boletas ya cargadas en el rango de fechas de un DataFrame
+def _existing_ticket_keys(cursor, table_name, key, dates):
+    """
+    Leer las claves (folio, tipo, fecha) de `table_name` con fecha entre la menor y la mayor
+    de `dates`, en bloques de TICKET_KEYS_ARRAYSIZE filas.
+
+    Retorna un pd.MultiIndex de números (float64) con una entrada por fila de la tabla.
+    """
+    folio_column, type_column, date_column = [column for column, _ in key]
+    valid = dates[~numpy.isnan(dates)]
+    query = f"""
+    SELECT {folio_column}, {type_column}, {date_column} FROM {table_name}
+    WHERE {date_column} BETWEEN to_date(:date_from, 'YYYYMMDD') AND to_date(:date_to, 'YYYYMMDD')
+    """
+    cursor.arraysize = TICKET_KEYS_ARRAYSIZE
+    cursor.execute(query, {"date_from": str(int(valid.min())), "date_to": str(int(valid.max()))})
+    rows = []
+    while True:
+        block = cursor.fetchmany()
+        if not block:
+            break
+        rows.extend(block)
+    folios, types, stored_dates = zip(*rows) if rows else ((), (), ())
+    return pd.MultiIndex.from_arrays([
+        pd.to_numeric(pd.Series(folios, dtype=object), errors="coerce").to_numpy(dtype=numpy.float64),
+        pd.to_numeric(pd.Series(types, dtype=object), errors="coerce").to_numpy(dtype=numpy.float64),
+        _date_numbers(stored_dates, from_database=True)
+    ])
+
+
+# DESCARTA las boletas ya cargadas antes de enlazarlas
+def skip_existing_tickets(cursor, table_name, key, data):
+    """
+    Descartar las filas de `data` cuya clave (folio, tipo, fecha) ya está en `table_name` o
+    se repite dentro del mismo DataFrame. Las claves existentes se leen una sola vez, solo
+    para el rango de fechas del DataFrame, y se comparan en bloque con las del DataFrame.
+    Las filas con la clave incompleta se conservan (la BD decide si las acepta).
+
+    Retorna una tupla (DataFrame sin las filas repetidas, cantidad de filas omitidas).
+    """
+    if data.empty:
+        return data, 0
+    (_, folio), (_, doc_type), (_, date) = key
+    folios = pd.to_numeric(data[folio], errors="coerce").to_numpy(dtype=numpy.float64)
+    types = pd.to_numeric(data[doc_type], errors="coerce").to_numpy(dtype=numpy.float64)
+    dates = _date_numbers(data[date])
+    complete = ~(numpy.isnan(folios) | numpy.isnan(types) | numpy.isnan(dates))
+    if not complete.any():
+        return data, 0
+
+    existing = _existing_ticket_keys(cursor, table_name, key, dates[complete])
+    keys = pd.MultiIndex.from_arrays([folios, types, dates])
+    repeated = complete & (keys.isin(existing) | keys.duplicated())
+    skipped = int(repeated.sum())
+    if skipped:
+        data = data[~repeated]
+    return data, skipped
+
+
 # CREA nuevos registros en boletas fisicas
 @with_connection
-def create_physical_tickets(connection, data):
-    """Insertar datos en la tabla physical_tickets."""
+def create_physical_tickets(connection, data, chunk_size=TICKETS_CHUNK_SIZE, skip_existing=False):
+    """
+    Insertar datos en la tabla physical_tickets.
+
+    Con `skip_existing` se omiten las boletas cuya clave (folio, dte, fecha) ya está en la
+    tabla o se repite en `data` (ver skip_existing_tickets), de modo que volver a cargar
+    un archivo o exportaciones que se traslapan no duplica boletas.
+
+    Retorna un diccionario con la cantidad de filas insertadas, las filas omitidas por estar
+    repetidas y las filas rechazadas.
+    """
     cursor = connection.cursor()
-    data_to_insert = data.to_dict(orient='records')
+    skipped = 0
+    if skip_existing:
+        data, skipped = skip_existing_tickets(cursor, "physical_tickets", PHYSICAL_TICKETS_KEY, data)
     insert_sql = """
     INSERT INTO physical_tickets (
         folio, neto, iva, total, dte, fecha, rut_vendedor, sucursal
@@ -85,19 +278,37 @@ def create_physical_tickets(connection, data):
         :numero_documento, :monto_neto, :monto_impuestos, :monto_total, :codigo_tributario, to_date(:fecha_emision, 'YYYYMMDD'), :vendedor, :sucursal
     )
     """
-    #:folio, :neto, :iva, :total, :dte, to_date(:fecha, 'YYYYMMDD'), :vendedor, :sucursal
-    #:Nº Documento, :Monto Neto Documento, :Monto Impuestos Documento, :Monto Documento, :Código Tributario, to_date(:Fecha Emisión, 'YYYYMMDD'), :Vendedor, :Sucursal
-    cursor.executemany(insert_sql, data_to_insert)
-    logging.info(f"{cursor.rowcount} registros insertados en physical_tickets.")
+    columns = [
+        'numero_documento', 'monto_neto', 'monto_impuestos', 'monto_total',
+        'codigo_tributario', 'fecha_emision', 'vendedor', 'sucursal'
+    ]
+    inserted, rejected = bind_columns(cursor, insert_sql, data, columns, chunk_size)
+    logging.info(f"{inserted} registros insertados en physical_tickets ({skipped} repetidos omitidos).")
+    if inserted:
+        # Un folio repetido agrega filas a un documento que podría estar en caché
+        clear_invoice_cache()
+    for index, message in rejected:
+        logging.warning(f"Fila {index} rechazada en physical_tickets: {message}")
     cursor.close()
+    return {"inserted": inserted, "skipped": skipped, "rejected": rejected}
 
 
 # CREA nuevos registros en boletas electronicas
 @with_connection
-def create_electronic_tickets(connection, data):
-    """Insertar datos en la tabla electronic_tickets."""
+def create_electronic_tickets(connection, data, chunk_size=TICKETS_CHUNK_SIZE, skip_existing=False):
+    """
+    Insertar datos en la tabla electronic_tickets.
+
+    Con `skip_existing` se omiten las boletas cuya clave (folio, tipo, emision) ya está en
+    la tabla o se repite en `data` (ver skip_existing_tickets).
+
+    Retorna un diccionario con la cantidad de filas insertadas, las filas omitidas por estar
+    repetidas y las filas rechazadas.
+    """
     cursor = connection.cursor()
-    data_to_insert = data.to_dict(orient='records')
+    skipped = 0
+    if skip_existing:
+        data, skipped = skip_existing_tickets(cursor, "electronic_tickets", ELECTRONIC_TICKETS_KEY, data)
     insert_sql = """
     INSERT INTO electronic_tickets (
         tipo, tipo_documento, folio, razon_social_receptor, fecha_publicacion,
@@ -117,125 +328,298 @@ def create_electronic_tickets(connection, data):
         :estado_sii
     )
     """
-    cursor.executemany(insert_sql, data_to_insert)
-    logging.info(f"{cursor.rowcount} registros insertados en electronic_tickets.")
+    columns = [
+        'tipo', 'tipo_documento', 'folio', 'razon_social_receptor', 'publicacion',
+        'fecha_emision', 'monto_neto', 'monto_exento', 'monto_impuestos', 'monto_total',
+        'fecha_sii', 'estado_sii'
+    ]
+    inserted, rejected = bind_columns(cursor, insert_sql, data, columns, chunk_size)
+    logging.info(f"{inserted} registros insertados en electronic_tickets ({skipped} repetidos omitidos).")
+    if inserted:
+        # Un folio repetido agrega filas a un documento que podría estar en caché
+        clear_invoice_cache()
+    for index, message in rejected:
+        logging.warning(f"Fila {index} rechazada en electronic_tickets: {message}")
     cursor.close()
+    return {"inserted": inserted, "skipped": skipped, "rejected": rejected}
+
+
+# Filtros y paginación comunes a las lecturas del log de validaciones
+def _log_query(select_clause, process=None, issuer=None, date_from=None, date_to=None,
+               invoice_id=None, after_id=None, offset=None, limit=None):
+    """
+    Construir la consulta sobre invoice_audit_log con los filtros indicados.
+
+    - process / issuer / invoice_id: igualdad sobre PROCESS, ISSUER_NAME e INVOICE_ID.
+    - date_from / date_to: rango inclusivo sobre ISSUE_DATE (date o texto de fecha).
+    - after_id: paginación por llave (AUDIT_ID mayor al último leído).
+    - offset / limit: paginación por posición.
+
+    Retorna una tupla (consulta, parámetros).
+    """
+    conditions = []
+    params = {}
+    if process is not None:
+        conditions.append("PROCESS = :process")
+        params["process"] = process
+    if issuer is not None:
+        conditions.append("ISSUER_NAME = :issuer")
+        params["issuer"] = issuer
+    if invoice_id is not None:
+        conditions.append("INVOICE_ID = :invoice_id")
+        params["invoice_id"] = invoice_id
+    if date_from is not None:
+        conditions.append("ISSUE_DATE >= :date_from")
+        params["date_from"] = _as_date(date_from)
+    if date_to is not None:
+        # Fecha final inclusiva: se compara contra el inicio del día siguiente
+        conditions.append("ISSUE_DATE < :date_to")
+        params["date_to"] = _as_date(date_to) + datetime.timedelta(days=1)
+    if after_id is not None:
+        conditions.append("AUDIT_ID > :after_id")
+        params["after_id"] = after_id
+
+    query = f"SELECT {select_clause} FROM invoice_audit_log"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    if select_clause != "COUNT(*)":
+        query += " ORDER BY AUDIT_ID"
+        page_clause, page_params = get_backend().page_clause(offset, limit)
+        query += page_clause
+        params.update(page_params)
+    return query, params
+
+def _as_date(value):
+    """Convierte un date/datetime o un texto de fecha en un objeto date."""
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.datetime.strptime(format_date(value), "%d/%m/%Y").date()
 
 
 # LEE registro de validaciones en log
 @with_connection
-def read_log(connection):
-    """Leer todas las facturas desde la tabla invoice_audit_log."""
+def read_log(connection, process=None, issuer=None, date_from=None, date_to=None,
+             invoice_id=None, after_id=None, offset=None, limit=None):
+    """
+    Leer las validaciones de la tabla invoice_audit_log, con filtros y paginación opcionales.
+
+    Sin parámetros retorna todo el log. Para recorrer logs grandes sin cargarlos
+    en memoria usar iter_log.
+    """
     cursor = connection.cursor()
-    select_query = "SELECT ISSUER_NAME, PROCESS, INVOICE_ID, ISSUE_DATE, VALIDATION_MESSAGE FROM invoice_audit_log"
-    cursor.execute(select_query)
+    cursor.arraysize = LOG_ARRAYSIZE
+    select_query, params = _log_query(
+        ', '.join(LOG_COLUMNS), process, issuer, date_from, date_to, invoice_id, after_id, offset, limit
+    )
+    cursor.execute(select_query, params)
     rows = cursor.fetchall()
-    invoices = [
-        {"ISSUER_NAME": row[0],"PROCESS": row[1], "INVOICE_ID": row[2], "ISSUE_DATE": row[3], "VALIDATION_MESSAGE": row[4]} 
-        for row in rows
-    ]
+    invoices = [dict(zip(LOG_COLUMNS, row)) for row in rows]
     cursor.close()
     return invoices
 
 
+# CUENTA registros de validaciones en log
+@with_connection
+def count_log(connection, process=None, issuer=None, date_from=None, date_to=None, invoice_id=None):
+    """Contar las validaciones de invoice_audit_log que cumplen los filtros, sin traer las filas."""
+    cursor = connection.cursor()
+    select_query, params = _log_query("COUNT(*)", process, issuer, date_from, date_to, invoice_id)
+    cursor.execute(select_query, params)
+    total = cursor.fetchone()[0]
+    cursor.close()
+    return total
+
+
+# RECORRE registro de validaciones en log por bloques
+def iter_log(process=None, issuer=None, date_from=None, date_to=None, invoice_id=None,
+             after_id=None, offset=None, limit=None, arraysize=LOG_ARRAYSIZE):
+    """
+    Generador sobre invoice_audit_log: trae las filas en bloques de `arraysize` y las
+    entrega una a una, manteniendo la memoria constante sin importar el tamaño del log.
+    La conexión vuelve al pool al terminar (o cerrar) el recorrido.
+    """
+    select_query, params = _log_query(
+        ', '.join(LOG_COLUMNS), process, issuer, date_from, date_to, invoice_id, after_id, offset, limit
+    )
+    recorder = CallRecorder("iter_log")
+    start = time.perf_counter()
+    failed = True
+    connection = get_connection()
+    wait = time.perf_counter() - start
+    try:
+        cursor = recorder.wrap(connection).cursor()
+        cursor.arraysize = arraysize
+        cursor.execute(select_query, params)
+        while True:
+            rows = cursor.fetchmany()
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(LOG_COLUMNS, row))
+        cursor.close()
+        failed = False
+    finally:
+        close_connection(connection)
+        # El tiempo incluye el consumo del generador por quien lo recorre
+        recorder.finish(time.perf_counter() - start, wait, failed)
+
+
+# Llave de caché de un documento: funcionalidad y número normalizado (la GUI lo entrega como texto)
+def _cache_key(functionalitie, doc_number):
+    return (functionalitie, str(doc_number).strip())
+
+
+def invoice_cache_stats():
+    """Retorna los aciertos, fallos y tamaño actual de la caché de read_select_invoice."""
+    return _invoice_cache.stats()
+
+
+def clear_invoice_cache():
+    """Vaciar la caché de read_select_invoice."""
+    _invoice_cache.clear()
+
+
 # LEE campos validados segun funcionabilidad
+def read_select_invoice(doc_number, functionalitie):
+    """
+    Leer una factura o documento específico según la funcionalidad.
+
+    Las lecturas con resultado se guardan en caché por (funcionalidad, número de documento)
+    durante INVOICE_CACHE_TTL segundos; update_selected_invoice y delete_invoice las invalidan.
+    """
+    key = _cache_key(functionalitie, doc_number)
+    cached = _invoice_cache.get(key)
+    if cached is not None:
+        return [dict(row) for row in cached]
+
+    invoices = _read_select_invoice(doc_number, functionalitie)
+    # No se guardan errores (None) ni documentos inexistentes, que una carga posterior puede crear
+    if invoices:
+        _invoice_cache.put(key, [dict(row) for row in invoices])
+    return invoices
+
+
 @with_connection
-def read_select_invoice(connection, doc_number, functionalitie):
+def _read_select_invoice(connection, doc_number, functionalitie):
     """Leer una factura o documento específico desde la base de datos según la funcionalidad."""
-    cursor = connection.cursor()
-    # Consultas y campos por funcionalidad
-    queries = {
-        1: ("flat_invoices_received", "invoice_number", [
-            'subtotal', 'tax', 'total', 'pay_method', 'issuer_name', 'issuer_rut', 'invoice_number'
-        ]),
-        2: ("flat_invoices_issued", "invoice_number", [
-            'subtotal', 'tax', 'total', 'pay_method', 'issuer_rut', 'invoice_number', 'invoice_type', 'buyer_name', 'buyer_rut'
-        ]),
-        3: ("physical_tickets", "folio", [
-            'folio', 'neto', 'iva', 'total', 'fecha', 'rut_vendedor', 'sucursal'
-        ]),
-        4: ("electronic_tickets", "folio", [
-            'tipo_documento', 'folio', 'emision', 'monto_neto', 'monto_exento', 'monto_iva', 'monto_total'
-        ])
-    }
-    query, id_field, fields = queries.get(functionalitie, (None, None, None))
-    
-    if not query:
+    schema = get_schema(functionalitie)
+    if not schema:
         logging.error("Funcionalidad no reconocida.")
-        cursor.close()
         return []
-    
-    select_query = f"SELECT {', '.join(fields)} FROM {query} WHERE {id_field} = :doc_number"
-    cursor.execute(select_query, doc_number=doc_number)
-    #print(select_query)
+
+    cursor = connection.cursor()
+    cursor.execute(schema.select_sql, {"doc_number": doc_number})
     rows = cursor.fetchall()
-    invoices = [dict(zip(fields, row)) for row in rows]
+    invoices = [dict(zip(schema.columns, row)) for row in rows]
     cursor.close()
     return invoices
 
 
+# LEE varios documentos a la vez segun funcionabilidad
+def read_select_invoices(numbers, functionalitie, chunk_size=SELECT_IN_CHUNK_SIZE):
+    """
+    Leer muchos documentos de una funcionalidad con consultas IN de hasta `chunk_size` números.
+
+    Parámetros:
+    numbers: iterable de números de factura o folios.
+    functionalitie: 1 recibidas, 2 emitidas, 3 boletas físicas, 4 boletas electrónicas.
+
+    Retorna un diccionario {número: lista de registros} con una entrada por número pedido
+    (lista vacía si no existe), o None si falló la consulta. Usa la misma caché que
+    read_select_invoice.
+    """
+    result = {}
+    missing = {}
+    for number in numbers:
+        key = _cache_key(functionalitie, number)
+        cached = _invoice_cache.get(key)
+        if cached is not None:
+            result[number] = [dict(row) for row in cached]
+        else:
+            result[number] = []
+            missing.setdefault(key[1], []).append(number)
+
+    if missing:
+        rows_by_number = _read_select_invoices(list(missing), functionalitie, chunk_size)
+        if rows_by_number is None:
+            return None
+        for key_number, invoices in rows_by_number.items():
+            _invoice_cache.put(_cache_key(functionalitie, key_number), [dict(row) for row in invoices])
+            for number in missing.get(key_number, []):
+                result[number] = [dict(row) for row in invoices]
+    return result
+
+
+@with_connection
+def _read_select_invoices(connection, numbers, functionalitie, chunk_size):
+    """Consultar por bloques los números indicados y agrupar las filas por número normalizado."""
+    schema = get_schema(functionalitie)
+    if not schema:
+        logging.error("Funcionalidad no reconocida.")
+        return {}
+
+    id_position = schema.columns.index(schema.id_field)
+    cursor = connection.cursor()
+    cursor.arraysize = LOG_ARRAYSIZE
+    rows_by_number = {}
+    for start in range(0, len(numbers), chunk_size):
+        chunk = numbers[start:start + chunk_size]
+        params = {f"n{i}": number for i, number in enumerate(chunk)}
+        cursor.execute(schema.select_in_sql(len(chunk)), params)
+        for row in cursor.fetchall():
+            rows_by_number.setdefault(str(row[id_position]).strip(), []).append(dict(zip(schema.columns, row)))
+    cursor.close()
+    return rows_by_number
+
+
+# Invalida la lectura en caché de un documento actualizado, también bajo su nuevo número
+def _invalidate_updated(functionalitie, number, updated_fields):
+    _invoice_cache.invalidate(_cache_key(functionalitie, number))
+    schema = get_schema(functionalitie)
+    if schema and schema.id_field in updated_fields:
+        _invoice_cache.invalidate(_cache_key(functionalitie, updated_fields[schema.id_field]))
+
+
 # ACTUALIZA campos validados segun funcionabilidad
+def update_selected_invoice(invoice_number, updated_fields, functionalitie):
+    """Actualizar campos específicos de una factura existente e invalidar su lectura en caché."""
+    result = _update_selected_invoice(invoice_number, updated_fields, functionalitie)
+    # Se invalida después del commit para que una lectura concurrente no guarde datos antiguos
+    _invalidate_updated(functionalitie, invoice_number, updated_fields)
+    return result
+
+
 @with_connection
-def update_selected_invoice(connection, invoice_number, updated_fields, functionalitie):
+def _update_selected_invoice(connection, invoice_number, updated_fields, functionalitie):
     """Actualizar campos específicos de una factura existente."""
-    cursor = connection.cursor()
-    table_info = {
-        1: ("flat_invoices_received", "invoice_number", [
-            'subtotal', 'tax', 'total', 'pay_method', 'issuer_name', 'issuer_rut', 'invoice_number'
-        ]),
-        2: ("flat_invoices_issued", "invoice_number", [
-            'subtotal', 'tax', 'total', 'pay_method', 'issuer_rut', 'invoice_number', 'invoice_type', 'buyer_name', 'buyer_rut'
-        ]),
-        3: ("physical_tickets", "folio", [
-            'folio', 'neto', 'iva', 'total', 'fecha', 'rut_vendedor', 'sucursal'
-        ]),
-        4: ("electronic_tickets", "folio", [
-            'tipo_documento', 'folio', 'emision', 'monto_neto', 'monto_exento', 'monto_iva', 'monto_total'
-        ])
-    }
-    table_info = table_info.get(functionalitie)
-    if not table_info:
+    schema = get_schema(functionalitie)
+    if not schema:
         logging.error("Funcionalidad no reconocida.")
-        cursor.close()
         return
 
-    table_name, id_field, valid_fields = table_info
-    fields_to_update = {k: v for k, v in updated_fields.items() if k in valid_fields}
-
-    if not fields_to_update:
+    params = schema.valid_fields(updated_fields)
+    if not params:
         logging.warning("No hay campos válidos para actualizar.")
-        cursor.close()
         return
 
-    # Convertir campos de fecha y especificar el formato de fecha en la consulta SQL
-    date_fields = ['fecha', 'emision']
-    for date_field in date_fields:
-        if date_field in fields_to_update:
-            fields_to_update[date_field] = format_date(fields_to_update[date_field])
-            fields_to_update[date_field] = f"TO_DATE(:{date_field}, 'DD/MM/YYYY')"
-
-    # Construir cláusula SET, manejando fechas con TO_DATE
-    set_clause = ', '.join([
-        f"{field} = {fields_to_update[field]}" if field in date_fields else f"{field} = :{field}" 
-        for field in fields_to_update.keys()
-    ])
-    
-    # Eliminar TO_DATE para los parámetros de fecha en el diccionario params
-    params = {k: v for k, v in fields_to_update.items() if k not in date_fields}
-    params.update({date_field: format_date(updated_fields[date_field]) for date_field in date_fields if date_field in updated_fields})
+    # Las fechas se normalizan a 'DD/MM/YYYY'; la sentencia las convierte con TO_DATE
+    for date_field in schema.date_fields:
+        if date_field in params:
+            params[date_field] = format_date(params[date_field])
 
-    params[id_field] = invoice_number
-    update_query = f"UPDATE {table_name} SET {set_clause} WHERE {id_field} = :{id_field}"
+    update_query = schema.update_sql(sorted(params))
+    params["doc_number"] = invoice_number
 
+    cursor = connection.cursor()
     cursor.execute(update_query, params)
-    logging.info(f"Registro actualizado en {table_name}.")
+    logging.info(f"Registro actualizado en {schema.table}.")
 
     logging.info(functionalitie)
     #llamando a auditoria
-    if functionalitie == 1:
-        cursor.callproc('pkg_received.audit_invoice_received')
-    elif functionalitie == 2:
-        cursor.callproc('pkg_issued.audit_invoice_issued')
+    if functionalitie in [1, 2]:
+        get_backend().audit_invoices(cursor, functionalitie)
     elif functionalitie in [3,4]:
         logging.info(f"Documentos validados previamente.")
     else:
@@ -244,36 +628,102 @@ def update_selected_invoice(connection, invoice_number, updated_fields, function
     cursor.close()
 
 
+# ACTUALIZA varios documentos a la vez segun funcionabilidad
+def update_selected_invoices(changes, functionalitie):
+    """
+    Actualizar muchos documentos en una sola transacción y auditar una vez por lote.
+    Si falla la auditoría, no se aplica ninguna actualización.
+
+    Parámetros:
+    changes: diccionario {número de documento: campos a actualizar} (o pares equivalentes).
+    functionalitie: 1 recibidas, 2 emitidas, 3 boletas físicas, 4 boletas electrónicas.
+
+    Retorna {número: {"ok": True/False, "error": mensaje o None}}, o None si falló el lote.
+    """
+    changes = dict(changes)
+    results = _update_selected_invoices(changes, functionalitie)
+    for number, updated_fields in changes.items():
+        _invalidate_updated(functionalitie, number, updated_fields)
+    return results
+
+
+@with_connection
+def _update_selected_invoices(connection, changes, functionalitie):
+    """Agrupar los cambios por campos modificados y ejecutar un executemany por grupo."""
+    schema = get_schema(functionalitie)
+    if not schema:
+        logging.error("Funcionalidad no reconocida.")
+        return None
+
+    results = {}
+    groups = {}
+    for number, updated_fields in changes.items():
+        fields_to_update = schema.valid_fields(updated_fields)
+        if not fields_to_update:
+            results[number] = {"ok": False, "error": "No hay campos válidos para actualizar."}
+            continue
+        try:
+            for date_field in schema.date_fields:
+                if date_field in fields_to_update:
+                    fields_to_update[date_field] = format_date(fields_to_update[date_field])
+        except ValueError as e:
+            results[number] = {"ok": False, "error": str(e)}
+            continue
+
+        # Documentos con los mismos campos comparten la sentencia UPDATE
+        group = groups.setdefault(tuple(sorted(fields_to_update)), ([], []))
+        fields_to_update["doc_number"] = number
+        group[0].append(number)
+        group[1].append(fields_to_update)
+        results[number] = {"ok": True, "error": None}
+
+    backend = get_backend()
+    cursor = connection.cursor()
+    for field_names, (numbers, rows) in groups.items():
+        for offset, message in backend.executemany(cursor, schema.update_sql(field_names), rows):
+            results[numbers[offset]] = {"ok": False, "error": message}
+
+    updated = sum(1 for result in results.values() if result["ok"])
+    logging.info(f"{updated} de {len(changes)} registros actualizados en {schema.table}.")
+
+    # Una sola auditoría para todo el lote
+    if updated and functionalitie in [1, 2]:
+        backend.audit_invoices(cursor, functionalitie)
+
+    cursor.close()
+    return results
+
+
 # ELIMINA registros segun funcionabilidad
+def delete_invoice(functionalitie, invoice_number):
+    """Eliminar una factura o boleta según funcionalidad e invalidar su lectura en caché."""
+    result = _delete_invoice(functionalitie, invoice_number)
+    _invoice_cache.invalidate(_cache_key(functionalitie, invoice_number))
+    return result
+
+
 @with_connection
-def delete_invoice(connection, functionalitie, invoice_number):
+def _delete_invoice(connection, functionalitie, invoice_number):
     """Eliminar una factura o boleta según funcionalidad."""
-    cursor = connection.cursor()
-    delete_queries = {
-        1: "DELETE FROM flat_invoices_received WHERE invoice_number = :invoice_number",
-        2: "DELETE FROM flat_invoices_issued WHERE invoice_number = :invoice_number",
-        3: "DELETE FROM physical_tickets WHERE folio = :invoice_number",
-        4: "DELETE FROM electronic_tickets WHERE folio = :invoice_number"
-    }
-    delete_query = delete_queries.get(functionalitie, None)
-
-    if not delete_query:
+    schema = get_schema(functionalitie)
+    if not schema:
         logging.error("Funcionalidad no reconocida para eliminación.")
-        cursor.close()
         return
 
-    cursor.execute(delete_query, invoice_number=invoice_number)
+    cursor = connection.cursor()
+    cursor.execute(schema.delete_sql, {"invoice_number": invoice_number})
     logging.info(f"Registro eliminado en funcionalidad {functionalitie}.")
 
     insert_sql = "DELETE FROM invoice_audit_log WHERE invoice_ID = :invoice_number"
-    cursor.execute(insert_sql, invoice_number=invoice_number)
+    cursor.execute(insert_sql, {"invoice_number": invoice_number})
     logging.info(f"{cursor.rowcount} registros insertados en electronic_tickets.")
   
 
     """Llama a la función FN_LOG_DEPURATION y verifica el resultado."""
+    backend = get_backend()
     try:
-        # Llama a la función y espera un resultado de tipo NUMBER
-        result = cursor.callfunc('PKG_LOG_DEPURATION.FN_LOG_DEPURATION', oracledb.NUMBER, [invoice_number])
+        # Llama a la depuración del backend y espera un resultado numérico
+        result = backend.depurate_log(cursor, invoice_number)
         
         # Verifica el resultado
         if result == 0:
@@ -281,11 +731,68 @@ def delete_invoice(connection, functionalitie, invoice_number):
         else:
             logging.error(f"Error en depuración para la factura {invoice_number}: Resultado inesperado ({result}).")
     
-    except oracledb.Error as e:
-        # Captura errores de Oracle y los muestra en el log
+    except backend.Error as e:
+        # Captura errores del motor de base de datos y los muestra en el log
         logging.error(f"Error al ejecutar FN_LOG_DEPURATION para la factura {invoice_number}: {e}")
     except Exception as e:
         # Captura cualquier otro error y los muestra en el log
         logging.error(f"Error inesperado al ejecutar FN_LOG_DEPURATION para la factura {invoice_number}: {e}")
 
     cursor.close()
+
+
+# ELIMINA varios documentos a la vez segun funcionabilidad
+def delete_invoices(numbers, functionalitie):
+    """
+    Eliminar muchos documentos en una sola transacción y depurar el log una vez por lote.
+    Si falla la eliminación del log o la depuración, no se elimina ningún documento.
+
+    Retorna {número: {"ok": True/False, "error": mensaje o None}}, o None si falló el lote.
+    """
+    numbers = list(numbers)
+    results = _delete_invoices(numbers, functionalitie)
+    for number in numbers:
+        _invoice_cache.invalidate(_cache_key(functionalitie, number))
+    return results
+
+
+@with_connection
+def _delete_invoices(connection, numbers, functionalitie):
+    """Eliminar con executemany los documentos y sus validaciones, y depurar el log."""
+    schema = get_schema(functionalitie)
+    if not schema:
+        logging.error("Funcionalidad no reconocida para eliminación.")
+        return None
+
+    backend = get_backend()
+    cursor = connection.cursor()
+    results = {number: {"ok": True, "error": None} for number in numbers}
+    for offset, message in backend.executemany(cursor, schema.delete_sql, [{"invoice_number": n} for n in numbers]):
+        results[numbers[offset]] = {"ok": False, "error": message}
+
+    deleted = [number for number, result in results.items() if result["ok"]]
+    logging.info(f"{len(deleted)} de {len(results)} registros eliminados en funcionalidad {functionalitie}.")
+    if deleted:
+        log_errors = backend.executemany(
+            cursor, "DELETE FROM invoice_audit_log WHERE invoice_ID = :invoice_number",
+            [{"invoice_number": number} for number in deleted]
+        )
+        # Si falla la limpieza del log o la depuración no se confirma el lote: with_connection
+        # revierte también las eliminaciones
+        if log_errors:
+            offset, message = log_errors[0]
+            raise RuntimeError(
+                f"Error al eliminar las validaciones de {len(log_errors)} de {len(deleted)} facturas "
+                f"(factura {deleted[offset]}: {message})"
+            )
+        try:
+            failed = backend.depurate_logs(cursor, deleted)
+        except backend.Error as e:
+            logging.error(f"Error al ejecutar FN_LOG_DEPURATION para el lote: {e}")
+            raise
+        if failed:
+            raise RuntimeError(f"Error en depuración para {failed} de {len(deleted)} facturas.")
+        logging.info(f"Depuración exitosa para {len(deleted)} facturas.")
+
+    cursor.close()
+    return results
@@ -1,6 +1,13 @@
 import oracledb
 import os
+import time
+import queue
+import atexit
+import sqlite3
+import threading
 from dotenv import load_dotenv
+from .backends.oracle import OracleBackend
+from .backends.sqlite import SQLiteBackend
 
 # Cargar variables de entorno desde el archivo .env
 load_dotenv()
@@ -11,28 +18,216 @@ DB_CONFIG = {
     "password": os.getenv("DB_PASSWORD"),
     "host": os.getenv("DB_HOST"),
     "port": os.getenv("DB_PORT"),
-    "sid": os.getenv("DB_SID")
+    "sid": os.getenv("DB_SID"),
+    # Motor de base de datos: "oracle" (producción) o "sqlite" (backend local sin servidor)
+    "engine": os.getenv("DB_ENGINE", "oracle").lower(),
+    "sqlite_path": os.getenv("DB_SQLITE_PATH", "hookeddocs.db")
 }
 
+# Configuración del pool de sesiones
+POOL_CONFIG = {
+    "min": int(os.getenv("DB_POOL_MIN", "1")),
+    "max": int(os.getenv("DB_POOL_MAX", "4")),
+    "increment": int(os.getenv("DB_POOL_INCREMENT", "1")),
+    # Segundos máximos de espera para obtener una conexión del pool
+    "timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+    # Verificar la conexión (ping) cada vez que se entrega desde el pool
+    "ping": os.getenv("DB_POOL_PING", "1") == "1",
+    # Sentencias preparadas que cada conexión mantiene en caché para reutilizarlas
+    "stmtcache": int(os.getenv("DB_STMT_CACHE", "64"))
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+_backend = None
+
+# Contadores del pool para comparar conexiones abiertas versus viajes a la BD
+_pool_stats = {
+    "acquires": 0,
+    "releases": 0,
+    "wait_time": 0.0
+}
+
+
+class SQLitePool:
+    """
+    Pool de conexiones SQLite con la misma interfaz que oracledb.ConnectionPool
+    (acquire, release, close, opened, busy). Permite medir localmente cuántas
+    conexiones se abren por ejecución sin depender del servidor Oracle.
+    """
+
+    def __init__(self, path, min=1, max=4, timeout=10, ping=True, on_connect=None, stmtcache=128):
+        self.path = path
+        self.stmtcache = stmtcache
+        self.on_connect = on_connect
+        self.min = min
+        self.max = max
+        self.timeout = timeout
+        self.ping = ping
+        self.opened = 0
+        self.busy = 0
+        self.connects = 0
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max)
+        self._lock = threading.Lock()
+        for _ in range(min):
+            self._idle.put(self._connect())
+
+    def _connect(self):
+        connection = sqlite3.connect(
+            self.path, check_same_thread=False, uri=True, cached_statements=self.stmtcache
+        )
+        if self.on_connect:
+            self.on_connect(connection)
+        with self._lock:
+            self.opened += 1
+            self.connects += 1
+        return connection
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self.opened -= 1
+
+    def _is_alive(self, connection):
+        try:
+            connection.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self):
+        """Entregar una conexión del pool, esperando como máximo `timeout` segundos."""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"No hay conexiones disponibles en el pool tras {self.timeout} segundos.")
+        try:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                connection = self._connect()
+
+            # Ping al entregar: si la conexión no responde se reemplaza por una nueva
+            if self.ping and not self._is_alive(connection):
+                self._discard(connection)
+                connection = self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.busy += 1
+        return connection
+
+    def release(self, connection):
+        """Devolver una conexión al pool."""
+        with self._lock:
+            self.busy -= 1
+        self._idle.put(connection)
+        self._slots.release()
+
+    def close(self):
+        """Cerrar todas las conexiones inactivas del pool."""
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(connection)
+
+
+def _create_pool():
+    """
+    Crear el pool de sesiones según el motor configurado.
+    """
+    if DB_CONFIG["engine"] == "sqlite":
+        return SQLitePool(
+            DB_CONFIG["sqlite_path"],
+            min=POOL_CONFIG["min"],
+            max=POOL_CONFIG["max"],
+            timeout=POOL_CONFIG["timeout"],
+            ping=POOL_CONFIG["ping"],
+            stmtcache=POOL_CONFIG["stmtcache"],
+            on_connect=get_backend().prepare_connection
+        )
+
+    dsn = f"{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['sid']}"
+    return oracledb.create_pool(
+        user=DB_CONFIG['username'],
+        password=DB_CONFIG['password'],
+        dsn=dsn,
+        min=POOL_CONFIG["min"],
+        max=POOL_CONFIG["max"],
+        increment=POOL_CONFIG["increment"],
+        getmode=oracledb.POOL_GETMODE_TIMEDWAIT,
+        wait_timeout=int(POOL_CONFIG["timeout"] * 1000),
+        # 0 = ping en cada entrega, negativo = sin ping
+        ping_interval=0 if POOL_CONFIG["ping"] else -1,
+        stmtcachesize=POOL_CONFIG["stmtcache"]
+    )
+
+def get_backend():
+    """
+    Devolver el backend de almacenamiento del motor configurado (ver src/core/backends).
+    """
+    global _backend
+    if _backend is None:
+        _backend = SQLiteBackend() if DB_CONFIG["engine"] == "sqlite" else OracleBackend()
+    return _backend
+
+def get_pool():
+    """
+    Devolver el pool de sesiones del proceso, creándolo en el primer uso.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = _create_pool()
+        return _pool
+
 def get_connection():
     """
-    Crear y devolver una conexión a la base de datos.
+    Obtener una conexión desde el pool de sesiones.
     """
     try:
-        dsn = f"{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['sid']}"
-        connection = oracledb.connect(
-            user=DB_CONFIG['username'],
-            password=DB_CONFIG['password'],
-            dsn=dsn
-        )
+        start = time.perf_counter()
+        connection = get_pool().acquire()
+        _pool_stats["acquires"] += 1
+        _pool_stats["wait_time"] += time.perf_counter() - start
         return connection
-    except oracledb.DatabaseError as e:
+    except (oracledb.DatabaseError, sqlite3.Error, TimeoutError) as e:
         print(f"Error al conectarse a la base de datos: {e}")
         raise e
 
 def close_connection(connection):
     """
-    Cerrar la conexión a la base de datos.
+    Devolver la conexión al pool de sesiones.
     """
     if connection:
-        connection.close()
+        get_pool().release(connection)
+        _pool_stats["releases"] += 1
+
+def close_pool():
+    """
+    Cerrar el pool de sesiones y todas sus conexiones.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+def pool_stats():
+    """
+    Devolver las estadísticas del pool (conexiones abiertas, en uso, préstamos y tiempo de espera).
+    """
+    stats = dict(_pool_stats, engine=DB_CONFIG["engine"], opened=0, busy=0, connects=0)
+    if _pool is not None:
+        stats["opened"] = _pool.opened
+        stats["busy"] = _pool.busy
+        stats["connects"] = getattr(_pool, "connects", _pool.opened)
+    return stats
+
+atexit.register(close_pool)
@@ -0,0 +1,229 @@
+import os
+import json
+import atexit
+import threading
+
+# Archivo donde se vuelcan las métricas al terminar el proceso (.prom = texto Prometheus, otro = JSON)
+METRICS_FILE = os.getenv("DB_METRICS_FILE")
+
+# Límites superiores de los buckets de cada histograma
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (1, 2, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000)
+
+# Histogramas registrados por llamada: (nombre, descripción, buckets)
+HISTOGRAMS = (
+    ("call_seconds", "Tiempo total de la función crud, incluida la espera de conexión", SECONDS_BUCKETS),
+    ("wait_seconds", "Tiempo de espera para obtener una conexión del pool", SECONDS_BUCKETS),
+    ("round_trips", "Sentencias y lecturas enviadas a la base de datos por llamada", COUNT_BUCKETS),
+    ("rows", "Filas afectadas o leídas por llamada", COUNT_BUCKETS)
+)
+
+_metrics = {}
+_lock = threading.Lock()
+
+
+class Histogram:
+    """Histograma acumulativo al estilo Prometheus (conteo, suma y buckets)."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": {str(bound): count for bound, count in zip(self.buckets, self.counts)}
+        }
+
+
+class _CountingCursor:
+    """Cursor que delega en el del driver contando viajes a la BD y filas."""
+
+    def __init__(self, cursor, call):
+        object.__setattr__(self, "_cursor", cursor)
+        object.__setattr__(self, "_call", call)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _affected(self):
+        rowcount = getattr(self._cursor, "rowcount", -1)
+        if rowcount and rowcount > 0:
+            self._call.rows += rowcount
+
+    def execute(self, *args, **kwargs):
+        self._call.round_trips += 1
+        result = self._cursor.execute(*args, **kwargs)
+        if getattr(self._cursor, "description", None) is None:
+            self._affected()
+        return self if result is self._cursor else result
+
+    def executemany(self, *args, **kwargs):
+        self._call.round_trips += 1
+        result = self._cursor.executemany(*args, **kwargs)
+        self._affected()
+        return result
+
+    def callproc(self, *args, **kwargs):
+        self._call.round_trips += 1
+        return self._cursor.callproc(*args, **kwargs)
+
+    def callfunc(self, *args, **kwargs):
+        self._call.round_trips += 1
+        return self._cursor.callfunc(*args, **kwargs)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._call.rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        self._call.round_trips += 1
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._call.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._call.rows += len(rows)
+        return rows
+
+
+class _CountingConnection:
+    """Conexión que entrega cursores con conteo; el resto se delega en la conexión real."""
+
+    def __init__(self, connection, call):
+        self._connection = connection
+        self._call = call
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def cursor(self, *args, **kwargs):
+        return _CountingCursor(self._connection.cursor(*args, **kwargs), self._call)
+
+    def commit(self):
+        self._call.round_trips += 1
+        return self._connection.commit()
+
+    def rollback(self):
+        self._call.round_trips += 1
+        return self._connection.rollback()
+
+
+class CallRecorder:
+    """
+    Acumula las mediciones de una llamada crud. `wrap` entrega la conexión con
+    conteo de viajes y filas; `finish` registra la llamada en los histogramas.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.round_trips = 0
+        self.rows = 0
+
+    def wrap(self, connection):
+        return _CountingConnection(connection, self)
+
+    def finish(self, call_seconds, wait_seconds, failed=False):
+        observe(self.name, call_seconds, wait_seconds, self.round_trips, self.rows, failed)
+
+
+def observe(name, call_seconds, wait_seconds, round_trips, rows, failed=False):
+    """Registrar una llamada de la función `name`."""
+    with _lock:
+        entry = _metrics.get(name)
+        if entry is None:
+            entry = {"calls": 0, "failures": 0}
+            entry.update({key: Histogram(buckets) for key, _, buckets in HISTOGRAMS})
+            _metrics[name] = entry
+        entry["calls"] += 1
+        if failed:
+            entry["failures"] += 1
+        entry["call_seconds"].observe(call_seconds)
+        entry["wait_seconds"].observe(wait_seconds)
+        entry["round_trips"].observe(round_trips)
+        entry["rows"].observe(rows)
+
+
+def snapshot():
+    """Retorna las métricas acumuladas como diccionario {función: métricas}."""
+    with _lock:
+        return {
+            name: {
+                key: value.as_dict() if isinstance(value, Histogram) else value
+                for key, value in entry.items()
+            }
+            for name, entry in _metrics.items()
+        }
+
+
+def reset():
+    """Borrar las métricas acumuladas."""
+    with _lock:
+        _metrics.clear()
+
+
+def to_json():
+    """Métricas acumuladas en formato JSON."""
+    return json.dumps(snapshot(), indent=2)
+
+
+def to_prometheus():
+    """Métricas acumuladas en formato de texto de Prometheus."""
+    data = snapshot()
+    lines = [
+        "# HELP hookeddocs_db_calls_total Llamadas a funciones crud",
+        "# TYPE hookeddocs_db_calls_total counter"
+    ]
+    lines += [f'hookeddocs_db_calls_total{{function="{name}"}} {entry["calls"]}' for name, entry in data.items()]
+    lines += [
+        "# HELP hookeddocs_db_failures_total Llamadas a funciones crud que fallaron",
+        "# TYPE hookeddocs_db_failures_total counter"
+    ]
+    lines += [f'hookeddocs_db_failures_total{{function="{name}"}} {entry["failures"]}' for name, entry in data.items()]
+    for key, description, _ in HISTOGRAMS:
+        metric = f"hookeddocs_db_{key}"
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} histogram")
+        for name, entry in data.items():
+            histogram = entry[key]
+            for bound, count in histogram["buckets"].items():
+                lines.append(f'{metric}_bucket{{function="{name}",le="{bound}"}} {count}')
+            lines.append(f'{metric}_bucket{{function="{name}",le="+Inf"}} {histogram["count"]}')
+            lines.append(f'{metric}_sum{{function="{name}"}} {histogram["sum"]}')
+            lines.append(f'{metric}_count{{function="{name}"}} {histogram["count"]}')
+    return "\n".join(lines) + "\n"
+
+
+def dump(path):
+    """Escribir las métricas en `path`: texto Prometheus si termina en .prom, JSON en otro caso."""
+    content = to_prometheus() if path.endswith(".prom") else to_json()
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(content)
+    return path
+
+
+def _dump_at_exit():
+    if METRICS_FILE and _metrics:
+        dump(METRICS_FILE)
+
+
+atexit.register(_dump_at_exit)
@@ -0,0 +1,108 @@
+import threading
+
+
+class DocumentSchema:
+    """
+    Definición única de un tipo de documento: tabla, campo identificador, campos
+    editables con su etiqueta en la GUI y sentencias SQL precompiladas.
+
+    El texto de cada sentencia se arma una sola vez, de modo que el caché de
+    sentencias del driver la reutiliza y en cada llamada solo se enlazan valores.
+    """
+
+    def __init__(self, functionality, title, table, id_field, fields, date_fields=()):
+        self.functionality = functionality
+        self.title = title
+        self.table = table
+        self.id_field = id_field
+        # Pares (etiqueta GUI, columna) en el orden en que se muestran en la GUI
+        self.fields = fields
+        self.labels = [label for label, _ in fields]
+        self.columns = [column for _, column in fields]
+        self.column_by_label = dict(fields)
+        self.date_fields = list(date_fields)
+
+        self.select_sql = f"SELECT {', '.join(self.columns)} FROM {table} WHERE {id_field} = :doc_number"
+        self.delete_sql = f"DELETE FROM {table} WHERE {id_field} = :invoice_number"
+        self._select_in = {}
+        self._update = {}
+        self._lock = threading.Lock()
+
+    def select_in_sql(self, count):
+        """SELECT de los campos para `count` números enlazados como :n0, :n1, ..."""
+        sql = self._select_in.get(count)
+        if sql is None:
+            binds = ', '.join(f":n{i}" for i in range(count))
+            sql = f"SELECT {', '.join(self.columns)} FROM {self.table} WHERE {self.id_field} IN ({binds})"
+            with self._lock:
+                self._select_in[count] = sql
+        return sql
+
+    def update_sql(self, field_names):
+        """
+        UPDATE de los campos indicados (en orden) para el documento :doc_number.
+        Los campos de fecha se reciben como texto 'DD/MM/YYYY' y se convierten con TO_DATE.
+        """
+        field_names = tuple(field_names)
+        sql = self._update.get(field_names)
+        if sql is None:
+            set_clause = ', '.join(
+                f"{field} = TO_DATE(:{field}, 'DD/MM/YYYY')" if field in self.date_fields else f"{field} = :{field}"
+                for field in field_names
+            )
+            sql = f"UPDATE {self.table} SET {set_clause} WHERE {self.id_field} = :doc_number"
+            with self._lock:
+                self._update[field_names] = sql
+        return sql
+
+    def valid_fields(self, updated_fields):
+        """Filtrar de `updated_fields` solo las columnas del documento."""
+        return {k: v for k, v in updated_fields.items() if k in self.columns}
+
+
+# Tipos de documento por funcionalidad (1 recibidas, 2 emitidas, 3 boletas físicas, 4 boletas electrónicas)
+SCHEMAS = {
+    1: DocumentSchema(1, "Facturas Recibidas", "flat_invoices_received", "invoice_number", [
+        ("Número Factura", "invoice_number"),
+        ("Nombre Proveedor", "issuer_name"),
+        ("RUT Proveedor", "issuer_rut"),
+        ("Subtotal", "subtotal"),
+        ("IVA", "tax"),
+        ("Total", "total"),
+        ("Método de Pago", "pay_method")
+    ]),
+    2: DocumentSchema(2, "Facturas Emitidas", "flat_invoices_issued", "invoice_number", [
+        ("Número Factura", "invoice_number"),
+        ("Nombre Comprador", "buyer_name"),
+        ("RUT Comprador", "buyer_rut"),
+        ("RUT Proveedor", "issuer_rut"),
+        ("Tipo de Factura", "invoice_type"),
+        ("Subtotal", "subtotal"),
+        ("IVA", "tax"),
+        ("Total", "total"),
+        ("Método de Pago", "pay_method")
+    ]),
+    3: DocumentSchema(3, "Boletas Físicas", "physical_tickets", "folio", [
+        ("Folio", "folio"),
+        ("RUT Vendedor", "rut_vendedor"),
+        ("Sucursal", "sucursal"),
+        ("Fecha", "fecha"),
+        ("Neto", "neto"),
+        ("IVA", "iva"),
+        ("Total", "total")
+    ], date_fields=["fecha"]),
+    4: DocumentSchema(4, "Boletas Electrónicas", "electronic_tickets", "folio", [
+        ("Folio", "folio"),
+        ("Tipo Documento", "tipo_documento"),
+        ("Emisión", "emision"),
+        ("Monto Neto", "monto_neto"),
+        ("Monto Exento", "monto_exento"),
+        ("Monto IVA", "monto_iva"),
+        ("Monto Total", "monto_total")
+    ], date_fields=["emision"])
+}
+
+
+def get_schema(functionality):
+    """Retorna el DocumentSchema de la funcionalidad, o None si no existe."""
+    return SCHEMAS.get(functionality)
@@ -1,8 +1,13 @@
 import os
 import sys
 import shutil
+import numpy
 import pandas as pd
 from src.core.crud import *
+from src.etl.pipeline import WORKERS, parallel_map, stage
+from src.etl.excel_reader import read_bytes_estimate, read_excel_cached
+from src.etl.extraction_cache import ExtractionCache
+from src.etl.ticket_columns import apply_columns, frame_bytes, reader_types
 
 # Configuración de rutas para agregar el directorio src al path de Python
 route = os.path.abspath(__file__)
@@ -12,79 +17,95 @@ global_route = os.path.join(local_path, "src")
 
 sys.path.append(global_route)
 
-def extract(tickets_path):
+# Columnas de medios de pago del Excel y nombre del medio en tipo_documento
+PAYMENT_COLUMNS = {
+    'TARJETA CREDITO': 'credito',
+    'TARJETA DEBITO': 'debito',
+    'TRANSFERENCIA BANCARIA': 'transferencia',
+    'WEBPAY': 'webpay'
+}
+
+# Columnas del Excel: nombre de origen, nombre en la base de datos y tipo (ver ticket_columns.apply_columns).
+# tipo_documento se calcula a partir de PAYMENT_COLUMNS, que solo se leen para eso.
+COLUMNS = [
+    {"source": "Código Tributario", "target": "tipo", "dtype": "int32"},
+    {"source": "Nº Documento", "target": "folio", "dtype": "int64"},
+    {"source": "Cliente", "target": "razon_social_receptor", "dtype": "object"},
+    {"source": "Fecha de generacion", "target": "publicacion", "dtype": "date"},
+    {"source": "Fecha Emisión", "target": "fecha_emision", "dtype": "date"},
+    {"source": "Monto Neto Documento", "target": "monto_neto", "dtype": "int32"},
+    {"source": "Monto Exento Documento", "target": "monto_exento", "dtype": "int32"},
+    {"source": "Monto Impuestos Documento", "target": "monto_impuestos", "dtype": "int32"},
+    {"source": "Monto Documento", "target": "monto_total", "dtype": "int32"},
+    {"source": "Fecha de declaracion", "target": "fecha_sii", "dtype": "date"},
+    {"source": "Informado SII", "target": "estado_sii", "dtype": "category"},
+    {"source": None, "target": "tipo_documento", "dtype": "category"}
+] + [{"source": source, "target": None, "dtype": "int64"} for source in PAYMENT_COLUMNS]
+
+# Tipos con que se leen las columnas de origen del Excel; las demás columnas del archivo no se leen
+READ_TYPES = reader_types(COLUMNS)
+
+# Omitir al cargar las boletas que ya están en la base de datos (misma clave folio, tipo y
+# fecha); "0" para insertar todas las filas
+SKIP_EXISTING = os.getenv("ETL_TICKETS_SKIP_EXISTING", "1") != "0"
+
+# Caché en disco de las hojas ya leídas de cada Excel, para reintentos y reprocesos
+cache = ExtractionCache("electronic_tickets")
+
+def extract(tickets_path, workers=WORKERS):
     """
-    Extrae los datos de cada archivo Excel en la carpeta especificada.
-    
+    Extrae y transforma los archivos Excel de la carpeta en un pool de procesos.
+
+    Los archivos se envían al pool a medida que se cargan los anteriores: ETL_MAX_IN_FLIGHT
+    y ETL_MEMORY_MB acotan cuántos DataFrames (en lectura o esperando su carga) existen a
+    la vez, de modo que la memoria no depende de la cantidad de archivos de la carpeta.
+
     Parámetros:
     - tickets_path: Ruta de la carpeta que contiene los archivos de Excel.
-    
+    - workers: Cantidad de procesos (1 = secuencial).
+
     Retorna:
-    - Una lista de tuplas (dataframe, archivo) con los datos extraídos y el nombre del archivo.
+    - Un generador de tuplas (archivo, dataframe transformado, error) en el orden de la carpeta.
     """
-    extracted_data = []
+    files = [
+        os.path.join(tickets_path, file) for file in os.listdir(tickets_path)
+        if file.endswith(".xls") or file.endswith(".xlsx")
+    ]
+    # Mientras un archivo se lee se estima su memoria a partir del tamaño del archivo
+    return parallel_map(extract_file, files, workers, size=frame_bytes, estimate=read_bytes_estimate)
+
+def extract_file(file_path):
+    """
+    Lee un archivo Excel y lo transforma; se ejecuta en los procesos del pool.
 
-    for file in os.listdir(tickets_path):
-        if file.endswith(".xls") or file.endswith(".xlsx"):
-            file_path = os.path.join(tickets_path, file)
-            try:
-                # Leer archivo Excel
-                data = pd.read_excel(file_path)
-                extracted_data.append((data, file_path))
-            except Exception as e:
-                print(f"Error al leer el archivo {file_path}: {e}")
+    Parámetros:
+    - file_path: Ruta del archivo Excel.
 
-    return extracted_data
+    Retorna:
+    - DataFrame transformado.
+    """
+    # Leer solo las columnas usadas, con sus tipos declarados (o su copia en caché)
+    data = read_excel_cached(file_path, list(READ_TYPES), READ_TYPES, cache)
+    return transform(data)
 
 def transform(data):
     """
-    Transforma el DataFrame, eliminando las columnas innecesarias.
-    
+    Transforma el DataFrame según COLUMNS. tipo_documento es el medio de pago con mayor
+    monto de cada boleta (el primero de PAYMENT_COLUMNS si empatan); las boletas sin
+    ningún pago se descartan.
+
     Parámetros:
     - data: DataFrame con los datos extraídos.
 
     Retorna:
     - DataFrame transformado con los datos necesarios.
     """
-    
-    # Renombrar columnas para evitar caracteres especiales
-    column_mapping = {
-        'Código Tributario': 'tipo', 
-        'Nº Documento': 'folio',
-        'Cliente': 'razon_social_receptor',
-        'Fecha de generacion': 'publicacion',
-        'Fecha Emisión': 'fecha_emision',
-        'Monto Neto Documento': 'monto_neto',
-        'Monto Exento Documento': 'monto_exento',
-        'Monto Impuestos Documento': 'monto_impuestos',
-        'Monto Documento': 'monto_total',
-        'Fecha de declaracion': 'fecha_sii',
-        'Informado SII': 'estado_sii',
-        'TARJETA CREDITO' : 'credito',	
-        'TARJETA DEBITO': 'debito',	
-        'TRANSFERENCIA BANCARIA' : 'transferencia',	
-        'WEBPAY' : 'webpay'
-    }
-    data.rename(columns=column_mapping, inplace=True)
-
-    # Seleccionar solo las columnas requeridas
-    required_columns = list(column_mapping.values())
-    data = data[[col for col in required_columns if col in data.columns]]
-
-    # Asignar 'tipo_documento' basado en valores de columnas específicas
-    payment_columns = ['credito', 'debito', 'transferencia', 'webpay']
-
-    # Crear nueva columna 'tipo_documento' donde sea diferente de 0
-    data['tipo_documento'] = data[payment_columns].idxmax(axis=1).where(data[payment_columns].any(axis=1), other=None)
-
-    data['publicacion'] = pd.to_datetime(data['publicacion']).dt.strftime('%Y%m%d')
-    data['fecha_emision'] = pd.to_datetime(data['fecha_emision']).dt.strftime('%Y%m%d')
-    data['fecha_sii'] = pd.to_datetime(data['fecha_sii']).dt.strftime('%Y%m%d')
-    
-    data = data.drop(['credito', 'debito', 'transferencia', 'webpay'],axis=1,errors='ignore')
-    # Dropear filas donde 'tipo_documento' sea None
-    data = data[pd.notna(data['tipo_documento'])]
-    return data
+    payments = data[list(PAYMENT_COLUMNS)].to_numpy(dtype=numpy.float64)
+    rows = (numpy.nan_to_num(payments) != 0).any(axis=1)
+    choice = numpy.nan_to_num(payments, nan=-numpy.inf).argmax(axis=1)
+    tipo_documento = pd.Categorical.from_codes(choice[rows], categories=list(PAYMENT_COLUMNS.values()))
+    return apply_columns(data, COLUMNS, rows, {"tipo_documento": tipo_documento})
+
 
 def load(data):
     """
@@ -92,9 +113,17 @@ def load(data):
     
     Parámetros:
     - data: El DataFrame con los datos procesados de la factura.
+
+    Retorna:
+    - El resultado de la carga, o None si no se pudo cargar en la base de datos.
     """
-    create_electronic_tickets(data)
+    result = create_electronic_tickets(data, skip_existing=SKIP_EXISTING)
     print(data.head())
+    if result and result["skipped"]:
+        print(f"{result['skipped']} filas omitidas por repetir una boleta ya cargada (mismo folio, tipo y fecha)")
+    if result and result["rejected"]:
+        print(f"{len(result['rejected'])} filas rechazadas por la base de datos: {[index for index, _ in result['rejected']]}")
+    return result
 
 def move_to_processed(file_path, base_path):
     """
@@ -111,24 +140,36 @@ def move_to_processed(file_path, base_path):
 
     shutil.move(file_path, processed_folder)
 
-def main(electronic_tickets_path):
+def main(electronic_tickets_path, workers=WORKERS):
     """
     Función principal que coordina las etapas de extracción, transformación y carga de datos.
+
+    Los archivos se leen y transforman en paralelo en un pool de procesos mientras se
+    cargan los anteriores, en el orden de la carpeta. La extracción corre en su propia
+    etapa (ver pipeline.stage), por lo que sigue enviando archivos al pool durante la carga;
+    la cola entre ambas etapas guarda un solo resultado, que queda fuera del presupuesto
+    de memoria de parallel_map.
+
+    Parámetros:
+    - electronic_tickets_path: Ruta de la carpeta que contiene los archivos de Excel.
+    - workers: Cantidad de procesos para leer y transformar los archivos (1 = secuencial).
+    Retorna el número de archivos procesados
     """
-    # Etapa de extracción: leer todos los archivos Excel de la carpeta
-    extracted_data_list = extract(electronic_tickets_path)
     processed_count = 0  # Inicializa el contador
 
-    for data, file_path in extracted_data_list:
-        # Etapa de transformación: normaliza el DataFrame
-        data_final = transform(data)
+    for file_path, data_final, error in stage(extract(electronic_tickets_path, workers), maxsize=1):
+        if error:
+            print(f"Error al procesar el archivo {file_path}: {error}")
+            continue
 
-        # Etapa de carga: inserta o muestra los datos en la base de datos
-        load(data_final)
+        # Etapa de carga: inserta los datos en la base de datos
+        if load(data_final) is None:
+            print(f"Error al cargar el archivo {os.path.basename(file_path)}; se mantiene en la carpeta.")
+            continue
 
-        # Mover el archivo a la carpeta "PROCESADOS" después de procesarlo
+        # Mover el archivo a la carpeta "PROCESADOS" solo después de cargarlo
         move_to_processed(file_path, electronic_tickets_path)
         processed_count += 1  # Incrementa el contador por cada archivo movido
 
+    cache.evict()
     return processed_count
-    
\ No newline at end of file
@@ -0,0 +1,402 @@
+import os
+import json
+import hashlib
+import tempfile
+import zipfile
+import posixpath
+import xml.parsers.expat
+import xml.etree.ElementTree as ET
+
+import numpy
+import pandas as pd
+
+from src.etl.extraction_cache import file_hash
+
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    # Sin pyarrow (ver requirements.txt) las hojas leídas no se guardan en caché
+    feather = None
+
+# Filas que se acumulan en listas de Python antes de convertirlas en un bloque del DataFrame
+EXCEL_CHUNK_ROWS = int(os.getenv("EXCEL_CHUNK_ROWS", "50000"))
+
+# Memoria que ocupa la lectura de un Excel como múltiplo del tamaño del archivo (comprimido);
+# con ella se estiman, dentro de ETL_MEMORY_MB, los archivos que aún se están leyendo
+EXCEL_EXPANSION_FACTOR = float(os.getenv("ETL_EXCEL_EXPANSION", "10"))
+
+# Versión del lector; al cambiarla se descartan las hojas guardadas en caché
+READER_VERSION = "2"
+
+# Espacios de nombres de los archivos .xlsx
+MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PACKAGE_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# Origen de las fechas seriales de Excel (sistema 1900 y sistema 1904)
+EXCEL_EPOCH = pd.Timestamp("1899-12-30")
+EXCEL_EPOCH_1904 = pd.Timestamp("1904-01-01")
+
+
+def read_excel(file_path, columns, dtypes=None, chunk_rows=EXCEL_CHUNK_ROWS):
+    """
+    Lee la primera hoja de un Excel (.xlsx o .xls) cargando solo las columnas pedidas.
+
+    A diferencia de pd.read_excel, las demás columnas no se convierten ni se infieren sus
+    tipos, y las filas se leen en forma secuencial y se convierten por bloques.
+
+    Parámetros:
+    - file_path: Ruta del archivo Excel.
+    - columns: Nombres de las columnas (encabezados de la primera fila) que se leen; si
+      alguna no está en el archivo es un error (ValueError), igual que si la hoja tiene filas
+      con datos pero ninguna con valores en esas columnas.
+    - dtypes: Diccionario {columna: tipo}; ver convert_column. Por defecto "object".
+    - chunk_rows: Filas por bloque.
+
+    Retorna:
+    - Un DataFrame con las columnas pedidas, en el orden de `columns`.
+    """
+    chunks = list(iter_excel_chunks(file_path, columns, dtypes, chunk_rows))
+    if len(chunks) == 1:
+        return chunks[0]
+    return pd.concat(chunks, ignore_index=True)
+
+
+def read_bytes_estimate(file_path):
+    """Memoria estimada para leer un Excel: el tamaño del archivo por EXCEL_EXPANSION_FACTOR."""
+    return int(os.path.getsize(file_path) * EXCEL_EXPANSION_FACTOR)
+
+
+def read_excel_cached(file_path, columns, dtypes=None, cache=None):
+    """
+    Igual que read_excel, pero guarda una copia columnar de la hoja leída en la caché
+    (ExtractionCache), indexada por el hash del archivo, la versión del lector y las
+    columnas pedidas. Al volver a procesar el mismo archivo (por ejemplo tras un error de
+    carga o al corregir transform) se lee la copia en lugar del Excel.
+
+    La copia se guarda en formato Feather (pyarrow) y se lee con memory-map. Si pyarrow no
+    está instalado, o la hoja tiene columnas que Feather no admite (por ejemplo textos y
+    números mezclados), la hoja se lee del Excel cada vez. Las copias se eliminan por
+    antigüedad con cache.evict().
+
+    Parámetros:
+    - file_path: Ruta del archivo Excel.
+    - columns / dtypes: Ver read_excel.
+    - cache: ExtractionCache del ETL (None para no usar caché).
+
+    Retorna:
+    - Un DataFrame con las columnas pedidas.
+    """
+    if cache is None or not cache.enabled or feather is None:
+        return read_excel(file_path, columns, dtypes)
+    digest = file_hash(file_path)
+    feather_path = cache.artifact_path(digest, f"sheet-{sheet_version(columns, dtypes)}.feather")
+    if feather_path is None:
+        return read_excel(file_path, columns, dtypes)
+
+    if os.path.exists(feather_path):
+        try:
+            data = feather.read_table(feather_path, memory_map=True).to_pandas()
+            # Marca de uso para la eliminación por antigüedad de la caché
+            os.utime(feather_path)
+            return data
+        except Exception as e:
+            print(f"No se pudo leer la copia en caché de {os.path.basename(file_path)}: {e}")
+
+    data = read_excel(file_path, columns, dtypes)
+    _save_frame(data, feather_path)
+    return data
+
+
+def sheet_version(columns, dtypes=None):
+    """Versión de una hoja en caché: versión del lector y huella de las columnas y tipos pedidos."""
+    spec = json.dumps([list(columns), dtypes or {}], sort_keys=True, ensure_ascii=False)
+    return f"{READER_VERSION}-{hashlib.sha256(spec.encode('utf-8')).hexdigest()[:12]}"
+
+
+def _save_frame(data, path):
+    """Guarda el DataFrame en formato Feather en forma atómica; si no se puede, solo lo informa."""
+    temp_path = None
+    try:
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(handle, "wb") as file:
+            # Sin compresión, para que la lectura con memory-map no copie las columnas numéricas
+            feather.write_feather(data, file, compression="uncompressed")
+        os.replace(temp_path, path)
+    except Exception as e:
+        print(f"No se pudo guardar en caché la hoja {os.path.basename(path)}: {e}")
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def iter_excel_chunks(file_path, columns, dtypes=None, chunk_rows=EXCEL_CHUNK_ROWS):
+    """
+    Igual que read_excel, pero entrega el contenido en DataFrames de a lo más `chunk_rows`
+    filas, para procesar exportaciones grandes sin mantener todas las filas como objetos
+    de Python. Siempre entrega al menos un bloque (vacío si la hoja no tiene filas).
+    """
+    dtypes = dtypes or {}
+    if file_path.lower().endswith(".xls"):
+        raw_chunks = _xls_chunks(file_path, columns, chunk_rows)
+    else:
+        raw_chunks = _xlsx_chunks(file_path, columns, chunk_rows)
+
+    empty = True
+    for names, values, epoch in raw_chunks:
+        empty = False
+        yield pd.DataFrame({
+            name: convert_column(column, dtypes.get(name, "object"), epoch)
+            for name, column in zip(names, values)
+        })
+    if empty:
+        yield pd.DataFrame({name: pd.Series(dtype=_empty_dtype(dtypes.get(name, "object"))) for name in columns})
+
+
+def convert_column(values, dtype, epoch=EXCEL_EPOCH):
+    """
+    Convierte los valores leídos de una columna (números como float, textos como str y
+    celdas vacías como None) al tipo declarado:
+    - "int64": números enteros; si hay celdas vacías o decimales queda en float64, igual que pd.read_excel.
+    - "float64": números; un texto no numérico es un error.
+    - "datetime": fechas seriales de Excel; los textos se conservan para convertirlos después.
+    - "object": valores tal cual, con los números enteros como int (igual que pd.read_excel).
+
+    Parámetros:
+    - values: Lista de valores de la columna.
+    - dtype: Tipo declarado.
+    - epoch: Origen de las fechas seriales del libro.
+
+    Retorna:
+    - Una pd.Series.
+    """
+    if dtype in ("int64", "float64"):
+        numbers = numpy.array(values, dtype=numpy.float64)
+        if dtype == "int64" and numpy.isfinite(numbers).all() and (numbers == numpy.floor(numbers)).all():
+            numbers = numbers.astype(numpy.int64)
+        return pd.Series(numbers)
+    if dtype == "datetime":
+        if all(value is None or isinstance(value, float) for value in values):
+            serials = numpy.array(values, dtype=numpy.float64)
+            return pd.Series(pd.to_datetime(serials, unit="D", origin=epoch))
+        return pd.Series([
+            epoch + pd.to_timedelta(value, unit="D") if isinstance(value, float) else value
+            for value in values
+        ], dtype=object)
+    return pd.Series([
+        int(value) if isinstance(value, float) and value.is_integer() else value
+        for value in values
+    ], dtype=object)
+
+
+def _empty_dtype(dtype):
+    return {"int64": "int64", "float64": "float64", "datetime": "datetime64[ns]"}.get(dtype, object)
+
+
+def _xlsx_chunks(file_path, columns, chunk_rows):
+    """
+    Lee la primera hoja de un .xlsx recorriendo su XML con expat, sin construir celdas para
+    las columnas que no se piden. Entrega tuplas (nombres, listas de valores, origen de fechas).
+
+    La columna de cada celda se toma de su referencia (r="B7"); si el archivo la omite
+    (el atributo es opcional), la celda va en la columna siguiente a la anterior de su fila.
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        sheet_path, epoch = _first_sheet(archive)
+        shared_strings = _shared_strings(archive)
+
+        # Columnas (índice desde 0) que se leen; None mientras no se lee el encabezado (se leen todas)
+        wanted = {"columns": None}
+        finished = []  # Filas terminadas en la última lectura, como ({columna: valor}, tiene datos)
+        cell = {"row": None, "next": 0, "column": None, "type": None, "text": [], "capture": False, "data": False}
+
+        def start(name, attrs):
+            if name == "c":
+                reference = attrs.get("r")
+                column = _column_index(reference) if reference else cell["next"]
+                cell["next"] = column + 1
+                if wanted["columns"] is None or column in wanted["columns"]:
+                    cell["column"] = column
+                    cell["type"] = attrs.get("t")
+                    cell["text"] = []
+            elif name in ("v", "t"):
+                # Solo el valor (<v>) o el texto en línea (<t>); no la fórmula (<f>)
+                cell["data"] = True
+                cell["capture"] = cell["column"] is not None
+            elif name == "row":
+                cell["row"] = {}
+                cell["next"] = 0
+                cell["data"] = False
+
+        def characters(data):
+            if cell["capture"]:
+                cell["text"].append(data)
+
+        def end(name):
+            if name in ("v", "t"):
+                cell["capture"] = False
+            elif name == "c" and cell["column"] is not None:
+                cell["row"][cell["column"]] = _cell_value(''.join(cell["text"]), cell["type"], shared_strings)
+                cell["column"] = None
+            elif name == "row":
+                finished.append((cell["row"], cell["data"]))
+
+        parser = xml.parsers.expat.ParserCreate()
+        parser.StartElementHandler = start
+        parser.EndElementHandler = end
+        parser.CharacterDataHandler = characters
+        parser.buffer_text = True
+
+        names = []
+        indexes = []
+        values = []
+        data_rows = 0  # Filas con algún valor después del encabezado
+        read_rows = 0  # Filas con algún valor en las columnas pedidas
+        with archive.open(sheet_path) as sheet:
+            for block in iter(lambda: sheet.read(1024 * 1024), b""):
+                parser.Parse(block, False)
+                for row, has_data in finished:
+                    if wanted["columns"] is None:
+                        # Encabezado: primera fila de la hoja
+                        header = {}
+                        for column, value in sorted(row.items()):
+                            header.setdefault(value.strip() if isinstance(value, str) else value, column)
+                        _check_header(columns, header, file_path)
+                        names = list(columns)
+                        indexes = [header[name] for name in names]
+                        wanted["columns"] = set(indexes)
+                        values = [[] for _ in names]
+                        continue
+                    data_rows += has_data
+                    # Filas sin ningún valor en las columnas pedidas se omiten, igual que las filas en blanco
+                    row_values = [row.get(column) for column in indexes]
+                    if all(value is None for value in row_values):
+                        continue
+                    read_rows += 1
+                    for column, value in zip(values, row_values):
+                        column.append(value)
+                    if len(values[0]) >= chunk_rows:
+                        yield names, values, epoch
+                        values = [[] for _ in names]
+                finished.clear()
+            parser.Parse(b"", True)
+        if data_rows and not read_rows:
+            raise ValueError(
+                f"{os.path.basename(file_path)}: la hoja tiene {data_rows} filas con datos, "
+                "pero ninguna con valores en las columnas pedidas."
+            )
+        if names and values[0]:
+            yield names, values, epoch
+
+
+def _column_index(reference):
+    """Índice (desde 0) de la columna de una referencia de celda, por ejemplo "AB12" -> 27."""
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - ord("A") + 1
+    return index - 1
+
+
+def _check_header(columns, header, file_path):
+    """Error si alguna de las columnas pedidas no está en el encabezado de la hoja."""
+    missing = [name for name in columns if name not in header]
+    if missing:
+        raise ValueError(f"{os.path.basename(file_path)}: columnas no encontradas en el encabezado: {', '.join(missing)}")
+
+
+def _cell_value(text, cell_type, shared_strings):
+    """Valor de una celda según su tipo: texto compartido, texto en línea, booleano, error o número."""
+    if text == "" or cell_type == "e":
+        # Celda sin valor (por ejemplo <c t="inlineStr"/>) o con un error de fórmula
+        return None
+    if cell_type == "s":
+        return shared_strings[int(text)]
+    if cell_type in ("inlineStr", "str"):
+        return text
+    if cell_type == "b":
+        return text == "1"
+    return float(text)
+
+
+def _first_sheet(archive):
+    """Ruta del XML de la primera hoja del libro y origen de sus fechas seriales."""
+    workbook = ET.fromstring(archive.read("xl/workbook.xml"))
+    properties = workbook.find(f"{MAIN_NS}workbookPr")
+    date1904 = properties is not None and properties.get("date1904") in ("1", "true")
+    epoch = EXCEL_EPOCH_1904 if date1904 else EXCEL_EPOCH
+
+    sheet = workbook.find(f"{MAIN_NS}sheets/{MAIN_NS}sheet")
+    relation_id = sheet.get(f"{REL_NS}id")
+    relations = ET.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    for relation in relations.iter(f"{PACKAGE_REL_NS}Relationship"):
+        if relation.get("Id") == relation_id:
+            target = relation.get("Target")
+            if target.startswith("/"):
+                return target.lstrip("/"), epoch
+            return posixpath.normpath(posixpath.join("xl", target)), epoch
+    raise ValueError("El libro no tiene hojas.")
+
+
+def _shared_strings(archive):
+    """Tabla de textos compartidos del libro (vacía si el libro usa solo textos en línea)."""
+    if "xl/sharedStrings.xml" not in archive.namelist():
+        return []
+    strings = []
+    with archive.open("xl/sharedStrings.xml") as file:
+        for _, element in ET.iterparse(file):
+            if element.tag == f"{MAIN_NS}si":
+                # Texto simple o con formato (varios <r><t>); se omiten las guías fonéticas
+                strings.append(''.join(
+                    text.text or '' for text in element.iter(f"{MAIN_NS}t")
+                    if text not in _phonetic_texts(element)
+                ))
+                element.clear()
+    return strings
+
+
+def _phonetic_texts(element):
+    return {text for phonetic in element.iter(f"{MAIN_NS}rPh") for text in phonetic.iter(f"{MAIN_NS}t")}
+
+
+def _xls_chunks(file_path, columns, chunk_rows):
+    """
+    Lee la primera hoja de un .xls con xlrd, columna por columna y solo las columnas pedidas.
+    Entrega tuplas (nombres, listas de valores, origen de fechas) como _xlsx_chunks.
+    """
+    import xlrd
+
+    book = xlrd.open_workbook(file_path, on_demand=True)
+    try:
+        sheet = book.sheet_by_index(0)
+        if sheet.nrows == 0:
+            return
+        epoch = EXCEL_EPOCH_1904 if book.datemode == 1 else EXCEL_EPOCH
+        header = {}
+        for index, value in enumerate(sheet.row_values(0)):
+            header.setdefault(value.strip() if isinstance(value, str) else value, index)
+        _check_header(columns, header, file_path)
+        names = list(columns)
+
+        values = []
+        for name in names:
+            index = header[name]
+            cells = []
+            for cell_type, value in zip(sheet.col_types(index, 1), sheet.col_values(index, 1)):
+                if cell_type in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK, xlrd.XL_CELL_ERROR):
+                    cells.append(None)
+                elif cell_type == xlrd.XL_CELL_BOOLEAN:
+                    cells.append(bool(value))
+                elif cell_type in (xlrd.XL_CELL_NUMBER, xlrd.XL_CELL_DATE):
+                    cells.append(float(value))
+                else:
+                    cells.append(value)
+            values.append(cells)
+
+        # Filas sin ningún valor en las columnas pedidas se omiten, igual que las filas en blanco
+        rows = [row for row in range(sheet.nrows - 1) if any(column[row] is not None for column in values)]
+        for start in range(0, len(rows), chunk_rows):
+            selected = rows[start:start + chunk_rows]
+            yield names, [[column[row] for row in selected] for column in values], epoch
+    finally:
+        book.release_resources()
@@ -0,0 +1,154 @@
+import os
+import json
+import hashlib
+import tempfile
+
+# Carpeta de la caché de extracción; vacía para desactivarla
+CACHE_DIR = os.getenv("ETL_CACHE_DIR", "etl_cache")
+
+# Tamaño máximo de la caché en disco (MB); al superarlo se eliminan las entradas usadas hace más tiempo
+CACHE_MAX_MB = int(os.getenv("ETL_CACHE_MAX_MB", "512"))
+
+# Tamaño de lectura para calcular el hash de los archivos
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_hash(file_path):
+    """Retorna el SHA-256 (hexadecimal) del contenido de un archivo."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """
+    Caché en disco del texto extraído y del diccionario transformado de cada documento,
+    indexada por el SHA-256 del archivo.
+
+    Cada entrada es un JSON con:
+    - extractor / text: versión del extractor y texto crudo (PDF u OCR).
+    - parser / data: versión del parser y diccionario retornado por transform.
+    - source: nombre del archivo de origen.
+
+    Si cambia la versión del parser solo se vuelve a transformar el texto guardado; si
+    cambia la del extractor se vuelve a extraer. Las escrituras son atómicas, por lo que
+    varios procesos pueden compartir la misma carpeta.
+
+    Junto a cada entrada se pueden guardar archivos auxiliares del mismo documento (por
+    ejemplo la imagen preprocesada para el OCR); se eliminan por antigüedad igual que las entradas.
+    """
+
+    def __init__(self, namespace, directory=CACHE_DIR, max_mb=CACHE_MAX_MB):
+        self.enabled = bool(directory)
+        self.directory = os.path.join(directory, namespace) if self.enabled else None
+        self.max_bytes = max_mb * 1024 * 1024
+
+    def _path(self, digest):
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def get(self, digest):
+        """Retorna la entrada completa de `digest`, o None si no existe."""
+        if not self.enabled:
+            return None
+        path = self._path(digest)
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        # Marca de uso para la eliminación por antigüedad
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def get_text(self, digest, extractor_version):
+        """Texto extraído con la versión de extractor indicada, o None."""
+        entry = self.get(digest)
+        if entry and entry.get("extractor") == extractor_version:
+            return entry.get("text")
+        return None
+
+    def get_data(self, digest, parser_version, extractor_version):
+        """Diccionario transformado con las versiones indicadas, o None."""
+        entry = self.get(digest)
+        if entry and entry.get("parser") == parser_version and entry.get("extractor") == extractor_version:
+            return entry.get("data")
+        return None
+
+    def put(self, digest, extractor_version, text, parser_version=None, data=None, source=None):
+        """Guardar el texto (y el diccionario, si existe) de un documento."""
+        if not self.enabled:
+            return
+        entry = {
+            "extractor": extractor_version, "text": text,
+            "parser": parser_version, "data": data, "source": source
+        }
+        temp_path = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(handle, "w", encoding="utf-8") as file:
+                json.dump(entry, file, ensure_ascii=False)
+            os.replace(temp_path, self._path(digest))
+        except (OSError, TypeError, ValueError) as e:
+            print(f"No se pudo guardar en caché el documento {digest}: {e}")
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def artifact_path(self, digest, suffix):
+        """
+        Ruta de un archivo auxiliar del documento `digest`, por ejemplo "ocr-1-300.png".
+        Retorna None si la caché está desactivada o no se puede crear la carpeta.
+        """
+        if not self.enabled:
+            return None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+        except OSError as e:
+            print(f"No se pudo crear la carpeta de caché {self.directory}: {e}")
+            return None
+        return os.path.join(self.directory, f"{digest}.{suffix}")
+
+    def entries(self):
+        """Generador de tuplas (digest, entrada) de todas las entradas guardadas."""
+        if not self.enabled or not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                digest = name[:-len(".json")]
+                entry = self.get(digest)
+                if entry is not None:
+                    yield digest, entry
+
+    def evict(self):
+        """
+        Eliminar las entradas y archivos auxiliares usados hace más tiempo hasta quedar bajo
+        el tamaño máximo.
+
+        Retorna la cantidad de archivos eliminados.
+        """
+        if not self.enabled or not os.path.isdir(self.directory):
+            return 0
+        files = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        removed = 0
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+        return removed
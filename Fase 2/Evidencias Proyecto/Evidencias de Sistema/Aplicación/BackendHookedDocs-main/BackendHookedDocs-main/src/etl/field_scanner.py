@@ -0,0 +1,59 @@
+import re
+
+
+class FieldScanner:
+    """
+    Busca varios campos de un documento recorriendo el texto una sola vez desde Python.
+
+    Las expresiones de todos los campos se compilan una sola vez (al crear el scanner,
+    normalmente a nivel de módulo) y se combinan en un único patrón que solo se detiene
+    en las posiciones donde comienza algún campo. En esas posiciones se evalúan los
+    campos que aún no se han encontrado: para cada campo gana la primera coincidencia
+    del texto, igual que con re.search, y la recorrida termina apenas están todos.
+
+    El motor de re prueba igualmente cada alternativa del patrón combinado en cada
+    posición, por lo que el costo sigue siendo proporcional a campos × largo del texto,
+    como con un re.search por campo. La ganancia está en compilar una vez, en no volver a
+    recorrer el texto por cada campo desde Python y en detenerse en el último campo hallado.
+
+    Los patrones pueden usar grupos de captura sin nombre y flags en línea acotados,
+    por ejemplo (?s:...) para que el punto también coincida con saltos de línea.
+    """
+
+    def __init__(self, fields, flags=0):
+        """
+        Parámetros:
+        - fields: Lista de tuplas (nombre del campo, expresión regular).
+        - flags: Flags de re comunes a todos los campos (por ejemplo re.MULTILINE).
+        """
+        self.names = [name for name, _ in fields]
+        self.patterns = [re.compile(pattern, flags) for _, pattern in fields]
+        self.matcher = re.compile(
+            '(?=' + '|'.join(f"(?:{pattern})" for _, pattern in fields) + ')', flags
+        )
+
+    def scan(self, text):
+        """
+        Recorre el texto una vez y retorna la primera coincidencia de cada campo.
+
+        Parámetros:
+        - text: Texto del documento.
+
+        Retorna:
+        - Un diccionario {nombre del campo: re.Match}; los campos sin coincidencia no aparecen.
+        """
+        found = {}
+        pending = list(zip(self.names, self.patterns))
+        for position in self.matcher.finditer(text):
+            start = position.start()
+            remaining = []
+            for name, pattern in pending:
+                match = pattern.match(text, start)
+                if match:
+                    found[name] = match
+                else:
+                    remaining.append((name, pattern))
+            pending = remaining
+            if not pending:
+                break
+        return found
@@ -0,0 +1,338 @@
+import os
+import re
+import json
+import hashlib
+import threading
+import unicodedata
+
+from src.etl.field_scanner import FieldScanner
+
+# Carpeta con las plantillas de facturas (una subcarpeta por ETL, un archivo JSON por formato)
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+# Meses en español para las fechas escritas con el nombre del mes
+MONTHS = {
+    'ENERO': '01', 'FEBRERO': '02', 'MARZO': '03', 'ABRIL': '04',
+    'MAYO': '05', 'JUNIO': '06', 'JULIO': '07', 'AGOSTO': '08',
+    'SEPTIEMBRE': '09', 'OCTUBRE': '10', 'NOVIEMBRE': '11', 'DICIEMBRE': '12'
+}
+
+# Formato de salida de las fechas y separadores de los números si la plantilla no indica otros
+DEFAULT_DATE_FORMAT = "{day}{month}{year}"
+DEFAULT_NUMBERS = {"thousands": ".", "decimal": ","}
+
+# Prioridad de las plantillas que no la indican (se evalúan después de las que sí)
+DEFAULT_PRIORITY = 1000
+
+# Plantillas ya compiladas, por ruta de archivo
+_compiled = {}
+_lock = threading.Lock()
+
+
+def remove_accents(input_str):
+    """
+    Elimina los acentos del texto para facilitar las coincidencias en las expresiones regulares.
+    """
+    nfkd_form = unicodedata.normalize('NFKD', input_str)
+    return ''.join([c for c in nfkd_form if not unicodedata.combining(c)])
+
+
+class InvoiceTemplate:
+    """
+    Plantilla compilada de un formato de factura.
+
+    La plantilla (JSON) describe:
+    - name / match / layout: nombre del proveedor, RUTs y razones sociales que lo identifican y
+      campos requeridos para dejar de leer páginas (ver invoices_received.register_vendor).
+    - priority: orden en que se evalúa el proveedor (menor primero; ver load_templates).
+    - normalize: eliminación de acentos, mayúsculas y reemplazos de texto, en ese orden.
+    - ocr: regiones del documento escaneado que se leen con OCR por regiones (ver ocr.ocr_regions).
+    - data: diccionario inicial del resultado (campos en null y valores fijos del proveedor).
+    - multiline: si ^ y $ coinciden en cada línea.
+    - date_format / numbers: formato de salida de las fechas y separadores de miles y decimales.
+    - fields: campos a extraer, por nombre. Cada campo tiene:
+      - pattern: expresión regular (gana la primera coincidencia del documento).
+      - to: ruta o lista de rutas de destino en el resultado ("issuer.rut"); por defecto el nombre.
+      - group: grupo a usar (número o nombre; una lista usa el primero que no quede vacío).
+      - type: "text" (por defecto), "int", "float", "digits" o "date".
+      - remove / replace / lines / last / range / constant / default: ver _value.
+      - fields: subcampos que se buscan dentro del grupo capturado (secciones del documento).
+    - items: tabla de ítems, delimitada por líneas de inicio y fin (start / end) o por un
+      bloque (block); cada línea (o cada ítem, si item_start une líneas de continuación) se
+      lee con la expresión line y sus grupos se convierten según fields.
+
+    Todas las expresiones se compilan una sola vez al cargar la plantilla.
+    """
+
+    def __init__(self, spec, source=None):
+        self.spec = spec
+        self.source = source
+        self.name = spec["name"]
+        self.priority = spec.get("priority", DEFAULT_PRIORITY)
+        match = spec.get("match", {})
+        self.ruts = match.get("ruts", [])
+        self.names = match.get("names", [])
+        layout = spec.get("layout", {})
+        self.required = layout.get("required", [])
+        self.ocr_regions = spec.get("ocr", {}).get("regions", [])
+
+        normalize = spec.get("normalize", {})
+        self.remove_accents = normalize.get("remove_accents", False)
+        self.upper = normalize.get("upper", True)
+        self.replacements = list(normalize.get("replacements", {}).items())
+
+        self.data = spec.get("data", {})
+        self.date_format = spec.get("date_format", DEFAULT_DATE_FORMAT)
+        self.numbers = dict(DEFAULT_NUMBERS, **spec.get("numbers", {}))
+        self.flags = re.MULTILINE if spec.get("multiline") else 0
+        self.fields = self._compile_fields(spec.get("fields", {}))
+        self.items = self._compile_items(spec.get("items"))
+
+    def _compile_fields(self, fields):
+        """Retorna (FieldScanner, especificaciones) para los campos y sus secciones."""
+        specs = {}
+        for name, field in fields.items():
+            field = dict(field)
+            if "fields" in field:
+                field["section"] = self._compile_fields(field["fields"])
+            specs[name] = field
+        scanner = FieldScanner([(name, field["pattern"]) for name, field in fields.items()], self.flags)
+        return scanner, specs
+
+    def _compile_items(self, items):
+        if not items:
+            return None
+        items = dict(items)
+        for key in ("start", "end", "block", "line", "item_start"):
+            if key in items:
+                items[key] = re.compile(items[key], self.flags)
+        return items
+
+    def normalize(self, text):
+        """Aplica la normalización de la plantilla al texto."""
+        if self.remove_accents:
+            text = remove_accents(text)
+        if self.upper:
+            text = text.upper()
+        for old, new in self.replacements:
+            text = text.replace(old, new)
+        return text
+
+    def parse(self, text):
+        """
+        Extrae los datos de una factura con esta plantilla.
+
+        Parámetros:
+        - text: Texto extraído de la factura.
+
+        Retorna:
+        - Un diccionario con los datos estructurados.
+        """
+        text = self.normalize(text)
+        data = copy_data(self.data)
+        self._fill(data, self.fields, text)
+        if self.items:
+            data.setdefault("items", []).extend(self._items(text))
+        return data
+
+    def _fill(self, data, fields, text):
+        scanner, specs = fields
+        for name, match in scanner.scan(text).items():
+            field = specs[name]
+            if "section" in field:
+                self._fill(data, field["section"], match.group(field.get("group", 1)) or '')
+                continue
+            value = self._value(match, field)
+            targets = field.get("to", name)
+            for target in targets if isinstance(targets, list) else [targets]:
+                set_path(data, target, value)
+
+    def _value(self, match, field):
+        """
+        Convierte un campo capturado al valor de salida:
+        - constant: valor fijo cuando el campo aparece.
+        - remove: caracteres que se eliminan; replace: reemplazos {texto: nuevo}.
+        - lines: une las líneas no vacías con un espacio.
+        - last / range: conserva los últimos N caracteres y los descarta si quedan fuera del rango.
+        - default: valor usado cuando el grupo no participó en la coincidencia.
+        """
+        if "constant" in field:
+            return field["constant"]
+        value = self._group(match, field.get("group", 1))
+        if value is None:
+            value = field.get("default")
+            if value is None:
+                return None
+        kind = field.get("type", "text")
+        if kind == "date":
+            return self._date(match, field)
+        value = value.strip()
+        for char in field.get("remove", ""):
+            value = value.replace(char, '')
+        if field.get("lines"):
+            value = ' '.join(line.strip() for line in value.split('\n') if line.strip())
+        for old, new in field.get("replace", {}).items():
+            value = value.replace(old, new)
+        if "last" in field:
+            value = value[-field["last"]:]
+        if "range" in field:
+            low, high = field["range"]
+            if not low <= int(value) <= high:
+                return None
+        if kind == "digits":
+            return re.sub(r'\D', '', value)
+        if kind in ("int", "float"):
+            return self._number(value, kind, field)
+        return value
+
+    @staticmethod
+    def _group(match, group):
+        if isinstance(group, list):
+            values = [match.group(g) for g in group]
+            return next((v for v in values if v and v.strip()), values[0])
+        return match.group(group)
+
+    def _number(self, value, kind, field):
+        """
+        Convierte un número con separadores. Los montos enteros ("int") ignoran ambos
+        separadores; los decimales ("float") usan el separador decimal indicado.
+        """
+        thousands = field.get("thousands", self.numbers["thousands"])
+        decimal = field.get("decimal", self.numbers["decimal"])
+        for char in thousands:
+            value = value.replace(char, '')
+        if kind == "int":
+            return int(value.replace(decimal, '') if decimal else value)
+        return float(value.replace(decimal, '.') if decimal else value)
+
+    def _date(self, match, field):
+        """Fecha a partir de los grupos (día, mes, año); el mes puede ser número o nombre."""
+        day, month, year = (match.group(g) for g in field.get("groups", (1, 2, 3)))
+        month = month.zfill(2) if month.isdigit() else MONTHS.get(month.upper(), '00')
+        return field.get("format", self.date_format).format(day=day.zfill(2), month=month, year=year)
+
+    def _items(self, text):
+        """Lista de ítems de la tabla de la factura."""
+        items = self.items
+        if "block" in items:
+            block = items["block"].search(text)
+            if not block:
+                return []
+            content = block.group(items.get("block_group", 1)).strip()
+            sections = [content.split('\n') if items.get("split_lines", True) else [content]]
+        else:
+            sections = self._sections(text.split('\n'), items["start"], items.get("end"))
+
+        result = []
+        seen = set()
+        for lines in sections:
+            for item_line in self._item_lines(lines, items.get("item_start")):
+                if items.get("unique"):
+                    if item_line in seen:
+                        continue
+                    seen.add(item_line)
+                item_match = items["line"].match(item_line)
+                if item_match:
+                    result.append({
+                        name: self._value(item_match, field) for name, field in items["fields"].items()
+                    })
+                elif items.get("report_unmatched"):
+                    print(f"No se pudo procesar la línea de ítem: {item_line}")
+        return result
+
+    @staticmethod
+    def _sections(lines, start, end):
+        """Grupos de líneas entre cada línea de inicio y la siguiente línea de fin."""
+        sections = []
+        i = 0
+        while i < len(lines):
+            if start.search(lines[i]):
+                j = i + 1
+                while j < len(lines) and not (end and end.search(lines[j])):
+                    j += 1
+                sections.append(lines[i + 1:j])
+                i = j
+            else:
+                i += 1
+        return sections
+
+    @staticmethod
+    def _item_lines(lines, item_start):
+        """Líneas de ítems sin espacios ni líneas vacías; con item_start une las líneas de continuación."""
+        item_lines = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            if item_start and item_lines and not item_start.match(line):
+                item_lines[-1] += ' ' + line
+            else:
+                item_lines.append(line)
+        return item_lines
+
+
+def copy_data(value):
+    """Copia el diccionario inicial de una plantilla (solo dicts, listas y valores JSON)."""
+    if isinstance(value, dict):
+        return {key: copy_data(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [copy_data(item) for item in value]
+    return value
+
+
+def set_path(data, path, value):
+    """Asigna `value` en la ruta con puntos `path` ("issuer.rut") del diccionario."""
+    *parents, key = path.split('.')
+    for parent in parents:
+        data = data.setdefault(parent, {})
+    data[key] = value
+
+
+def load_template(path):
+    """
+    Carga y compila una plantilla JSON. Cada archivo se compila una sola vez por proceso.
+
+    Parámetros:
+    - path: Ruta del archivo de la plantilla.
+
+    Retorna:
+    - El InvoiceTemplate compilado.
+    """
+    path = os.path.abspath(path)
+    template = _compiled.get(path)
+    if template is None:
+        with open(path, "r", encoding="utf-8") as file:
+            template = InvoiceTemplate(json.load(file), source=path)
+        with _lock:
+            _compiled[path] = template
+    return template
+
+
+def load_templates(directory):
+    """
+    Carga todas las plantillas (*.json) de una carpeta, ordenadas por su clave priority
+    (menor primero) y, a igual prioridad o sin ella, por nombre de archivo.
+
+    Retorna:
+    - Lista de InvoiceTemplate; una plantilla inválida se informa y se omite.
+    """
+    templates = []
+    if not os.path.isdir(directory):
+        return templates
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".json"):
+            continue
+        try:
+            templates.append(load_template(os.path.join(directory, name)))
+        except (OSError, ValueError, KeyError, re.error) as e:
+            print(f"Error al cargar la plantilla {name}: {e}")
+    templates.sort(key=lambda template: template.priority)
+    return templates
+
+
+def templates_version(templates):
+    """Huella corta del contenido de las plantillas; cambia al editar cualquiera de ellas."""
+    digest = hashlib.sha256()
+    for template in templates:
+        digest.update(json.dumps(template.spec, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()[:12]
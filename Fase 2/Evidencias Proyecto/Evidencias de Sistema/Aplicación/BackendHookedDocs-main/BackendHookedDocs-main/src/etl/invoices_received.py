@@ -3,7 +3,8 @@ import re
 import os
 import sys
 import shutil
-import unicodedata
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 # Configuración de rutas para agregar el directorio src al path de Python
 route = os.path.abspath(__file__)
@@ -13,544 +14,312 @@ global_route = os.path.join(local_path, "src")
 
 sys.path.append(global_route)
 
-from core.crud import create_invoice
+from src.core.crud import create_invoice, create_invoices_bulk
+from src.etl.extraction_cache import ExtractionCache, file_hash
+from src.etl.pipeline import WORKERS, parallel_map, stage
+from src.etl.invoice_templates import TEMPLATES_DIR, load_templates, remove_accents, templates_version
+from src.etl.ocr import OCR_DPI, ocr_image
 
-def extract(path_invoices):
+# Cantidad de facturas que se acumulan antes de cargarlas en la base de datos
+BATCH_SIZE = 50
+
+# Archivos adelantados por proceso mientras se cargan los anteriores
+PDF_QUEUE_FACTOR = 2
+
+# Hilos de OCR por proceso para las páginas escaneadas; por defecto se reparten los núcleos entre los procesos
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(max(1, (os.cpu_count() or 1) // max(1, WORKERS)))))
+
+# Páginas escaneadas adelantadas por hilo de OCR; acota las imágenes rasterizadas en memoria
+OCR_QUEUE_FACTOR = 2
+
+# Caracteres mínimos para considerar que una página tiene capa de texto
+TEXT_LAYER_MIN_CHARS = 10
+
+# Modo de extracción de los PDF: "layout" deja de leer páginas cuando ya encontró todos los campos
+# requeridos del proveedor; "full" lee todas las páginas
+EXTRACTION_MODE = os.getenv("ETL_PDF_MODE", "layout")
+
+# Separador de páginas en el texto extraído; permite clasificar usando solo la primera página
+PAGE_BREAK = '\f'
+
+# Carpeta donde quedan los documentos de proveedores no reconocidos
+QUARANTINE_FOLDER = "CUARENTENA"
+
+# Registro de parsers por proveedor (ver register_vendor) y matcher combinado construido a partir de él
+VENDORS = []
+_vendor_matcher = None
+
+# Plantillas de los proveedores conocidos, compiladas una sola vez por proceso
+TEMPLATES = load_templates(os.path.join(TEMPLATES_DIR, "invoices_received"))
+
+# Versiones del extractor de texto y de los parsers; al cambiarlas se invalida la parte de la caché que corresponde.
+# La versión de los parsers incluye la huella de las plantillas, por lo que editar una basta para volver a transformar.
+EXTRACTOR_VERSION = f"pdfplumber-3-{EXTRACTION_MODE}"
+PARSER_VERSION = f"3-{templates_version(TEMPLATES)}"
+
+# Caché en disco del texto y de los datos transformados de cada PDF
+cache = ExtractionCache("invoices_received")
+
+def extract(path_invoices, workers=WORKERS):
     """
-    Extrae el texto de facturas en formato PDF utilizando pdfplumber.
+    Etapa de extracción: extrae el texto de las facturas PDF de la carpeta con pdfplumber
+    y lo transforma según el proveedor.
     
     Parámetros:
     - path_invoices: Ruta de la carpeta que contiene los archivos de facturas.
-    """
-    processed_count = 0  # Inicializa el contador
+    - workers: Cantidad de procesos para extraer y transformar los PDF en paralelo.
 
-    for file in os.listdir(path_invoices):
-        if file.endswith(".pdf"):
-            file_path = os.path.join(path_invoices, file)
-            try:
-                # Utiliza pdfplumber para extraer el texto del PDF
-                with pdfplumber.open(file_path) as pdf:
-                    extracted_text = ''
-                    for page in pdf.pages:
-                        page_text = page.extract_text()
-                        if page_text:
-                            extracted_text += page_text + '\n'
-
-                # Procesar el archivo PDF según el proveedor
-                data = transform(extracted_text)
-                load(data)
-
-                # Mover archivo a la carpeta "PROCESADOS" después de procesarlo
-                move_to_processed(file_path, path_invoices)
-                processed_count += 1  # Incrementa el contador tras mover el archivo
-            except Exception as e:
-                print(f"Error al procesar el archivo {file}: {e}")
-
-    return processed_count  # Retorna el número de archivos procesados
+    Retorna:
+    - Un generador de tuplas (file_path, data, error) en el orden de la carpeta.
+    """
+    files = [os.path.join(path_invoices, file) for file in os.listdir(path_invoices) if file.endswith(".pdf")]
+    return extract_files(files, workers)
 
-def transform(extracted_text):
+def extract_files(files, workers=WORKERS):
     """
-    Transforma el texto extraído y extrae los datos estructurados según el proveedor.
-    
+    Extrae y transforma los PDF indicados, en paralelo si workers > 1 (ver pipeline.parallel_map).
+
+    Se adelantan como máximo workers * PDF_QUEUE_FACTOR archivos, de modo que los
+    resultados pendientes no crecen con el tamaño de la carpeta.
+
     Parámetros:
-    - extracted_text: El texto extraído del PDF de la factura.
+    - files: Lista de rutas de archivos PDF.
+    - workers: Cantidad de procesos a utilizar.
 
     Retorna:
-    - Un diccionario con los datos estructurados de la factura.
+    - Un generador de tuplas (file_path, data, error) en el mismo orden de `files`.
     """
-    transformed_text = extracted_text.upper()
-
-    # Verificar el proveedor
-    if "PROFESSIONAL FISHING SPA" in transformed_text:
-        return transform_professional_fishing(transformed_text)
-    elif "MI TIENDA SPA" in transformed_text:
-        return transform_mi_tienda(transformed_text)
-    elif "76.214.117-5" in transformed_text:
-        return transform_rapala(transformed_text)
-    else:
-        raise ValueError("Proveedor no reconocido en el documento.")
+    for file_path, result, error in parallel_map(extract_file, files, workers,
+                                                 max_in_flight=workers * PDF_QUEUE_FACTOR):
+        if error:
+            # Un proceso caído no detiene el lote: el archivo queda sin mover para reprocesarlo
+            yield file_path, None, error
+        else:
+            yield result
+
+def extract_file(file_path):
+    """
+    Extrae el texto de un PDF y lo transforma según el proveedor, reutilizando la
+    caché en disco cuando el mismo contenido ya fue extraído o transformado.
 
+    Parámetros:
+    - file_path: Ruta del archivo PDF.
 
-def remove_accents(input_str):
+    Retorna:
+    - Una tupla (file_path, data, error); data es None y error el mensaje si el archivo falla.
+      Si el proveedor no es reconocido, data y error son None.
     """
-    Elimina los acentos del texto para facilitar las coincidencias en las expresiones regulares.
+    try:
+        digest = file_hash(file_path)
+        data = cache.get_data(digest, PARSER_VERSION, EXTRACTOR_VERSION)
+        if data is not None:
+            return file_path, data, None
+
+        extracted_text = cache.get_text(digest, EXTRACTOR_VERSION)
+        if extracted_text is None:
+            extracted_text = extract_text(file_path)
+
+        # Procesar el archivo PDF según el proveedor; el texto se guarda aunque falle la transformación
+        try:
+            data = transform(extracted_text)
+        except Exception:
+            cache.put(digest, EXTRACTOR_VERSION, extracted_text, source=os.path.basename(file_path))
+            raise
+        cache.put(digest, EXTRACTOR_VERSION, extracted_text, PARSER_VERSION, data, os.path.basename(file_path))
+        return file_path, data, None
+    except Exception as e:
+        return file_path, None, str(e)
+
+def extract_text(file_path, mode=EXTRACTION_MODE):
     """
-    nfkd_form = unicodedata.normalize('NFKD', input_str)
-    return ''.join([c for c in nfkd_form if not unicodedata.combining(c)])
+    Extrae el texto de un PDF con pdfplumber.
 
-def transform_professional_fishing(text):
-    """
-    Extrae los datos de la factura de PROFESSIONAL FISHING SPA.
+    Las páginas se separan con PAGE_BREAK. En modo "layout" la primera página identifica al
+    proveedor y se deja de leer páginas apenas aparecen todos sus campos requeridos. Los
+    documentos de proveedores no reconocidos se leen completos.
+
+    Las páginas sin capa de texto (escaneadas) se rasterizan y se leen con OCR en un pool de
+    OCR_WORKERS hilos mientras se siguen leyendo las demás; las páginas con texto no pasan por
+    el OCR. Si la primera página es escaneada el documento se lee completo.
 
     Parámetros:
-    - text: Texto extraído de la factura.
+    - file_path: Ruta del archivo PDF.
+    - mode: "layout" o "full".
 
     Retorna:
-    - Un diccionario con los datos estructurados.
+    - Texto extraído del PDF.
     """
-    # Eliminar acentos y convertir a mayúsculas
-    text = remove_accents(text)
-    text = text.upper()
-
-    # Inicializar el diccionario de datos
-    data = {
-        "invoice_number": None,
-        "issue_date": None,
-        "pay_method": None,
-        "items": [],
-        "subtotal": None,
-        "tax": None,
-        "total": None,
-        "issuer": {
-            "name": "PROFESSIONAL FISHING SPA",
-            "rut": None,
-            "address": None,
-            "email": None,
-            "phone": None
-        }
-    }
-
-    months = {
-        'ENERO': '01',
-        'FEBRERO': '02',
-        'MARZO': '03',
-        'ABRIL': '04',
-        'MAYO': '05',
-        'JUNIO': '06',
-        'JULIO': '07',
-        'AGOSTO': '08',
-        'SEPTIEMBRE': '09',
-        'OCTUBRE': '10',
-        'NOVIEMBRE': '11',
-        'DICIEMBRE': '12'
-    }
-
-    def parse_int(num_str):
-        return int(num_str.replace('.', '').replace(',', '').strip())
-
-    def parse_float(num_str):
-        return float(num_str.replace('.', '').replace(',', '.').strip())
-
-    # Dividir el texto en líneas para facilitar el procesamiento
-    lines = text.split('\n')
-
-    # Añadir una lista para rastrear los ítems procesados
-    processed_items = set()
-
-    # Procesar líneas
-    for i, line in enumerate(lines):
-        line = line.strip()
-
-        # Extracción del RUT del emisor
-        if 'R.U.T' in line and data["issuer"]["rut"] is None:
-            rut_match = re.search(r'R\.U\.T\:?\s*([\d\.\-]+)', line)
-            if rut_match:
-                data["issuer"]["rut"] = rut_match.group(1).replace('.', '').replace('-', '').strip()
-
-        # Extracción de la dirección del emisor
-        if line.startswith('DIRECCION:') and 'COMUNA:' not in line:
-            data["issuer"]["address"] = line.split(':',1)[1].strip()
-
-        # Extracción del email del emisor
-        if 'EMAIL:' in line:
-            email_match = re.search(r'EMAIL:\s*(\S+@\S+)', line)
-            if email_match:
-                data["issuer"]["email"] = email_match.group(1).strip()
-
-        # Extracción del teléfono del emisor
-        if 'TELEFONO(S):' in line:
-            phone_match = re.search(r'TELEFONO\(S\):\s*([^\n]+)', line)
-            if phone_match:
-                data["issuer"]["phone"] = phone_match.group(1).replace(' ', '').strip()
-
-        # Extracción del número de factura
-        if line.startswith('N°') or line.startswith('Nº') or line.startswith('NO'):
-            invoice_number_match = re.search(r'NO?\s*(\d+)', line)
-            if invoice_number_match and data["invoice_number"] is None:
-                data["invoice_number"] = invoice_number_match.group(1).strip()
-
-        # Extracción de la fecha de emisión
-        if 'FECHA EMISION' in line and data["issue_date"] is None:
-            issue_date_match = re.search(r'FECHA EMISION:\s*(\d{1,2})\s+DE\s+(\w+)\s+DE\s+(\d{4})', line)
-            if issue_date_match:
-                day = issue_date_match.group(1).zfill(2)
-                month_name = issue_date_match.group(2).upper()
-                year = issue_date_match.group(3)
-                month = months.get(month_name, '00')
-                data["issue_date"] = f"{day}{month}{year}"
-
-        # Extracción del método de pago
-        if 'FORMA PAGO:' in line and data["pay_method"] is None:
-            pay_method_match = re.search(r'FORMA PAGO:\s*(.+)', line)
-            if pay_method_match:
-                data["pay_method"] = pay_method_match.group(1).strip()
-
-        # Extracción de los ítems
-        if 'CODIGO DESCRIPCION' in line:
-            # Los ítems empiezan en la siguiente línea
-            items_start = i + 1
-            # Encontrar el final de los ítems
-            for j in range(items_start, len(lines)):
-                if 'N° LINEAS' in lines[j] or 'Nº LINEAS' in lines[j] or 'NO LINEAS' in lines[j]:
-                    items_end = j
-                    break
-            else:
-                items_end = len(lines)
-            # Procesar los ítems
-            for item_line in lines[items_start:items_end]:
-                item_line = item_line.strip()
-                if not item_line:
-                    continue
-                # Verificar si ya hemos procesado este ítem
-                if item_line in processed_items:
-                    continue
+    pages = []  # Texto de cada página, o el futuro de su OCR
+    window = deque()  # OCR pendientes, para acotar las imágenes en memoria
+    executor = None
+    try:
+        # Utiliza pdfplumber para extraer el texto del PDF
+        with pdfplumber.open(file_path) as pdf:
+            normalized_text = ''
+            layout = None
+            for index, page in enumerate(pdf.pages):
+                if needs_ocr(page):
+                    if executor is None:
+                        executor = ThreadPoolExecutor(max_workers=max(1, OCR_WORKERS))
+                    if len(window) >= max(1, OCR_WORKERS) * OCR_QUEUE_FACTOR:
+                        window.popleft().result()
+                    future = executor.submit(ocr_image, rasterize(page))
+                    window.append(future)
+                    pages.append(future)
+                    page_text = None
                 else:
-                    processed_items.add(item_line)
-                # Expresión regular para extraer los detalles del ítem
-                line_regex = r'(?P<code>\S+)\s+(?P<description>.+?)\s+(?P<quantity>\d+)\s+(?P<unit_price>[\d.,]+)(?:\s+(?P<discount>[\d.,]+)\s*%)?\s*(AFECTO|EXENTO)?\s+(?P<total_price>[\d.,]+)'
-                line_match = re.match(line_regex, item_line)
-                if line_match:
-                    code = line_match.group('code')
-                    description = line_match.group('description')
-                    quantity = line_match.group('quantity')
-                    unit_price = line_match.group('unit_price')
-                    discount = line_match.group('discount') or '0'
-                    total_price = line_match.group('total_price')
-                    item = {
-                        'quantity': int(quantity),
-                        'sku': code.strip(),
-                        'description': description.strip(),
-                        'unit_price': parse_int(unit_price),
-                        'discount': parse_float(discount),
-                        'subtotal': parse_int(total_price)
-                    }
-                    data["items"].append(item)
-
-    # Extracción del subtotal (Monto neto)
-    subtotal_match = re.search(r'MONTO NETO:\s*\$\s*([\d.,]+)', text)
-    if subtotal_match:
-        data['subtotal'] = parse_int(subtotal_match.group(1))
-
-    # Extracción del IVA
-    tax_match = re.search(r'IVA\s*\(19%\):\s*\$\s*([\d.,]+)', text)
-    if tax_match:
-        data['tax'] = parse_int(tax_match.group(1))
-
-    # Extracción del total
-    total_match = re.search(r'TOTAL:\s*\$\s*([\d.,]+)', text)
-    if total_match:
-        data['total'] = parse_int(total_match.group(1))
-
-    return data
-
-def transform_mi_tienda(text):
+                    page_text = page.extract_text()
+                    pages.append(page_text)
+                if mode != "layout":
+                    continue
+
+                normalized_text += remove_accents(page_text or '').upper() + '\n'
+                if index == 0:
+                    vendor = classify_vendor(normalized_text)
+                    layout = vendor["layout"] if vendor else None
+                if layout and all(pattern.search(normalized_text) for pattern in layout["required"]):
+                    break
+
+        extracted_text = ''
+        for index, page_text in enumerate(pages):
+            if index > 0:
+                extracted_text += PAGE_BREAK + '\n'
+            if not isinstance(page_text, str) and page_text is not None:
+                page_text = page_text.result()
+            if page_text:
+                extracted_text += page_text + '\n'
+        return extracted_text
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+def needs_ocr(page):
+    """
+    Indica si una página de pdfplumber requiere OCR: no tiene capa de texto (menos de
+    TEXT_LAYER_MIN_CHARS caracteres) pero sí imágenes. Las páginas en blanco no se leen.
+    """
+    return len(page.chars) < TEXT_LAYER_MIN_CHARS and bool(page.images)
+
+def rasterize(page):
+    """Rasteriza una página de pdfplumber a OCR_DPI para el OCR."""
+    image = page.to_image(resolution=OCR_DPI).original
+    image.info["dpi"] = (OCR_DPI, OCR_DPI)
+    return image
+
+def retransform_cache():
+    """
+    Vuelve a transformar con el parser actual el texto guardado en caché, sin volver
+    a extraer los PDF. Útil al corregir las expresiones regulares de un proveedor.
+
+    Retorna:
+    - Una tupla (documentos transformados, documentos con error).
     """
-    Extrae los datos de la factura de MI TIENDA SPA.
+    transformed = 0
+    failed = 0
+    for digest, entry in cache.entries():
+        if entry.get("extractor") != EXTRACTOR_VERSION or entry.get("parser") == PARSER_VERSION:
+            continue
+        try:
+            data = transform(entry["text"])
+            if data is None:
+                raise ValueError("Proveedor no reconocido en el documento.")
+        except Exception as e:
+            print(f"Error al transformar {entry.get('source') or digest} desde la caché: {e}")
+            failed += 1
+            continue
+        cache.put(digest, EXTRACTOR_VERSION, entry["text"], PARSER_VERSION, data, entry.get("source"))
+        transformed += 1
+    return transformed, failed
+
+def transform(extracted_text):
+    """
+    Transforma el texto extraído y extrae los datos estructurados según el proveedor.
     
     Parámetros:
-    - text: Texto extraído de la factura.
-    
+    - extracted_text: El texto extraído del PDF de la factura.
+
     Retorna:
-    - Un diccionario con los datos estructurados.
+    - Un diccionario con los datos estructurados de la factura, o None si el proveedor
+      no está registrado.
+    """
+    # El proveedor se identifica solo con la primera página
+    vendor = classify_vendor(extracted_text.split(PAGE_BREAK, 1)[0])
+    if vendor is None:
+        return None
+    return vendor["parser"](extracted_text.upper())
+
+def register_vendor(name, parser, ruts=(), names=(), required=()):
     """
-    # Eliminar acentos y convertir a mayúsculas
-    text = remove_accents(text)
-    text = text.upper()
-
-    data = {
-        "invoice_number": None,
-        "issue_date": None,
-        "pay_method": None,
-        "items": [],
-        "subtotal": None,
-        "tax": None,
-        "total": None,
-        "issuer": {
-            "name": "MI TIENDA SPA",
-            "rut": None,
-            "address": None,
-            "email": None,
-            "phone": None
+    Registra el parser de un proveedor.
+
+    Parámetros:
+    - name: Nombre del proveedor.
+    - parser: Función que recibe el texto de la factura y retorna el diccionario de datos.
+    - ruts: RUTs que lo identifican (con o sin puntos y guion).
+    - names: Expresiones regulares de su razón social (texto sin acentos y en mayúsculas).
+    - required: Campos que deben aparecer antes de dejar de leer páginas en modo "layout".
+      El total va después de la tabla de ítems, por lo que las páginas siguientes ya no se necesitan.
+    """
+    global _vendor_matcher
+    VENDORS.append({
+        "name": name,
+        "parser": parser,
+        "patterns": [rut_pattern(rut) for rut in ruts] + list(names),
+        "layout": {
+            "required": [re.compile(pattern, re.DOTALL) for pattern in required]
         }
-    }
-
-    # Dividir el texto en líneas para facilitar el procesamiento
-    lines = text.split('\n')
-
-    # Procesar líneas
-    i = 0
-    while i < len(lines):
-        line = lines[i].strip()
-
-        # Extracción del RUT del emisor
-        if 'RUT:' in line and data['issuer']['rut'] is None and 'SENOR' not in line:
-            rut_match = re.search(r'RUT:\s*([\d\.\-Kk]+)', line)
-            if rut_match:
-                data["issuer"]["rut"] = rut_match.group(1).replace('.', '').replace('-', '').strip()
-
-        # Extracción de la dirección del emisor
-        if line.startswith('AV '):
-            data['issuer']['address'] = line.strip()
-
-        # Extracción del email del emisor
-        if 'MAIL:' in line:
-            email_match = re.search(r'MAIL:\s*(\S+@\S+)', line)
-            if email_match:
-                data['issuer']['email'] = email_match.group(1).strip()
-
-        # Extracción del teléfono del emisor
-        if ('TELEFONO:' in line or 'TELEFONO:+' in line) and data['issuer']['phone'] is None and 'SENOR' not in line:
-            phone_match = re.search(r'TELEFONO:\s*([^\n]+)', line)
-            if phone_match:
-                data["issuer"]["phone"] = phone_match.group(1).replace(' ', '').strip()
-
-        # Extracción del número de factura
-        if ('N°' in line or 'Nº' in line or 'NO ' in line) and data['invoice_number'] is None:
-            invoice_number_match = re.search(r'N[O°º\s]*\s*(\d+)', line)
-            if invoice_number_match:
-                data["invoice_number"] = invoice_number_match.group(1).strip()
-
-        # Extracción de la fecha de emisión
-        if 'FECHA EMISION:' in line and data['issue_date'] is None:
-            issue_date_match = re.search(r'FECHA EMISION:\s*(\d{2}/\d{2}/\d{4})', line)
-            if issue_date_match:
-                date_str = issue_date_match.group(1)
-                day, month, year = date_str.split('/')
-                data["issue_date"] = day + month + year
-
-        # Extracción del método de pago
-        if 'FORMA DE PAGO:' in line and data['pay_method'] is None:
-            pay_method_match = re.search(r'FORMA DE PAGO:\s*(.*)', line)
-            if pay_method_match:
-                pay_method = pay_method_match.group(1).strip()
-                # Verificar si el método de pago continúa en la siguiente línea
-                if not pay_method and i + 1 < len(lines):
-                    i += 1
-                    pay_method = lines[i].strip()
-                data['pay_method'] = pay_method
-
-        # Extracción de los ítems
-        if 'CANTIDAD SKU ITEM VALOR UNITARIO % DESCT. SUBTOTAL' in line:
-            # Los ítems empiezan en la siguiente línea
-            items_start = i + 1
-            # Encontrar el final de los ítems
-            for j in range(items_start, len(lines)):
-                if 'NOTA:' in lines[j].upper() or 'SON:' in lines[j].upper() or '_____' in lines[j]:
-                    items_end = j
-                    break
-            else:
-                items_end = len(lines)
-            # Unir líneas de ítems considerando descripciones en múltiples líneas
-            item_lines = []
-            current_item_lines = []
-            for k in range(items_start, items_end):
-                item_line = lines[k].strip()
-                if not item_line:
-                    continue
-                # Verificar si es el inicio de un nuevo ítem
-                if re.match(r'^\d+\s+\S+', item_line):
-                    if current_item_lines:
-                        current_item = ' '.join(current_item_lines)
-                        item_lines.append(current_item)
-                        current_item_lines = []
-                    current_item_lines.append(item_line)
-                else:
-                    # Línea de continuación de descripción
-                    current_item_lines.append(item_line)
-            # Agregar el último ítem
-            if current_item_lines:
-                current_item = ' '.join(current_item_lines)
-                item_lines.append(current_item)
-            # Procesar cada ítem
-            for item_line in item_lines:
-                # Expresión regular para extraer los campos
-                item_regex = r'^(?P<quantity>\d+)\s+(?P<sku>\S+)\s+(?P<description>.+?)\s+\$\s*(?P<unit_price>[\d.,]+)\s+(?P<discount>[\d.,]+)\s*%\s+\$\s*(?P<subtotal>[\d.,]+)(?:\s+.*)?$'
-                item_match = re.match(item_regex, item_line)
-                if item_match:
-                    quantity = int(item_match.group('quantity'))
-                    sku = item_match.group('sku').strip()
-                    description = item_match.group('description').strip()
-                    unit_price = float(item_match.group('unit_price').replace('.', '').strip())
-                    discount = float(item_match.group('discount').replace(',', '.').strip())
-                    subtotal = float(item_match.group('subtotal').replace('.', '').strip())
-                    item = {
-                        "quantity": quantity,
-                        "sku": sku,
-                        "description": description,
-                        "unit_price": unit_price,
-                        "discount": discount,
-                        "subtotal": subtotal
-                    }
-                    data["items"].append(item)
-                else:
-                    print(f"No se pudo procesar la línea de ítem: {item_line}")
-            # Saltar a la línea después de los ítems
-            i = items_end - 1  # -1 porque el bucle incrementará i
-        # Extracción del subtotal
-        if ('NETO ($)' in line or 'NETO($)' in line) and data['subtotal'] is None:
-            subtotal_match = re.search(r'NETO\s*\(\$\)\s*\$\s*([\d.,]+)', line)
-            if subtotal_match:
-                data["subtotal"] = int(subtotal_match.group(1).replace('.', '').replace(',', '').strip())
-
-        # Extracción del IVA
-        if ('I.V.A. 19%' in line or 'IVA 19%' in line) and data['tax'] is None:
-            tax_match = re.search(r'I\.?V\.?A\.?\s*19%\s*\$\s*([\d.,]+)', line)
-            if tax_match:
-                data["tax"] = int(tax_match.group(1).replace('.', '').replace(',', '').strip())
-
-        # Extracción del total
-        if ('TOTAL ($)' in line or 'TOTAL($)' in line) and data['total'] is None:
-            total_match = re.search(r'TOTAL\s*\(\$\)\s*\$\s*([\d.,]+)', line)
-            if total_match:
-                data["total"] = int(total_match.group(1).replace('.', '').replace(',', '').strip())
-
-        i += 1
-
-    return data
-def transform_rapala(text):
+    })
+    _vendor_matcher = None
+
+def vendor_parser(name, ruts=(), names=(), required=()):
     """
-    Extrae los datos de la factura de RAPALA.
-    
+    Decorador que registra como parser de un proveedor una función escrita a mano, para
+    formatos que no se pueden describir con una plantilla (ver register_vendor).
+    """
+    def register(parser):
+        register_vendor(name, parser, ruts, names, required)
+        return parser
+    return register
+
+def rut_pattern(rut):
+    """Expresión regular que reconoce un RUT con o sin puntos y guion."""
+    body, _, check_digit = rut.upper().replace('.', '').partition('-')
+    return r'(?<![\d.])' + r'\.?'.join(body) + r'\s*-?\s*' + re.escape(check_digit) + r'(?![\dK])'
+
+def classify_vendor(text):
+    """
+    Identifica el proveedor con una sola pasada de un matcher que combina los RUTs y
+    razones sociales de todos los proveedores registrados. Si aparecen varios, gana el
+    primero registrado.
+
     Parámetros:
-    - text: Texto extraído de la factura.
-    
+    - text: Texto a clasificar (normalmente la primera página).
+
     Retorna:
-    - Un diccionario con los datos estructurados.
+    - La entrada del registro VENDORS, o None si ningún proveedor coincide.
     """
-    # Convertir el texto a mayúsculas
-    text = text.upper()
-
-    # Diccionario de reemplazos para normalizar el texto
-    replacements = {
-        'Á': 'A', 
-        'É': 'E', 
-        'Í': 'I', 
-        'Ó': 'O', 
-        'Ú': 'U',
-        'N*': 'N°', 
-        'N?': 'N°', 
-        'S.I.1': 'S.I.I.',
-        '#$': '#',
-        # Añadir más reemplazos si es necesario
-    }
-
-    # Aplica los reemplazos al texto
-    for old, new in replacements.items():
-        text = text.replace(old, new)
-
-    data = {
-        "invoice_number": None,
-        "issue_date": None,
-        "pay_method": None,
-        "items": [],
-        "subtotal": None,
-        "tax": None,
-        "total": None,
-        "issuer": {
-            "name": "RAPALA",
-            "rut": None,
-            "address": "EL ROBRE 731, RECOLETA, SANTIAGO",
-            "email": None,
-            "phone": "+56224017467"
-        }
-    }
-
-    months = {
-        'ENERO': '01',
-        'FEBRERO': '02',
-        'MARZO': '03',
-        'ABRIL': '04',
-        'MAYO': '05',
-        'JUNIO': '06',
-        'JULIO': '07',
-        'AGOSTO': '08',
-        'SEPTIEMBRE': '09',
-        'OCTUBRE': '10',
-        'NOVIEMBRE': '11',
-        'DICIEMBRE': '12'
-    }
-
-    def parse_int(num_str):
-        return int(num_str.replace('.', '').replace(',', '').strip())
-
-    def parse_float(num_str):
-        return float(num_str.replace('.', '').replace(',', '.').strip())
-
-    # Extraer RUT del emisor
-    rut_match = re.search(r'R\.U\.T\.?:\s*([\d\.\-]+)', text)
-    if rut_match:
-        data["issuer"]["rut"] = rut_match.group(1).replace('.', '').replace('-', '')
-
-    # Extraer el número de factura
-    invoice_number_match = re.search(r'N[°º]?\s*(\d+)', text)
-    if invoice_number_match:
-        data["invoice_number"] = invoice_number_match.group(1)
-
-    # Extraer fecha de emisión
-    issue_date_match = re.search(r'FECHA EMISION\s*:\s*(\d{1,2})\s*-\s*(\w+)\s+DE\s+(\d{4})', text)
-    if issue_date_match:
-        day = issue_date_match.group(1).zfill(2)
-        month_name = issue_date_match.group(2).upper()
-        year = issue_date_match.group(3)
-        month = months.get(month_name, '00')
-        data["issue_date"] = f"{day}{month}{year}"
-
-    # Extraer método de pago
-    pay_method_match = re.search(r'PAGO\s*:\s*(.+)', text)
-    if pay_method_match:
-        data["pay_method"] = pay_method_match.group(1).strip()
-
-    # Extraer ítems
-    items_section_match = re.search(
-        r'CODIGO DESCRIPCION CANTIDAD.*?\n(.*?)(?:DOCUMENTO REFERENCIA|NETO|SON:)', 
-        text, 
-        re.DOTALL
-    )
-    if items_section_match:
-        items_text = items_section_match.group(1).strip()
-        item_lines = items_text.split('\n')
-        line_regex = r'(?P<code>\S+)\s+(?P<description>.+?)\s+(?P<quantity>\d+)\s+\w+\s+(?P<unit_price>[\d.,]+)\s+(?P<discount>[\d.,]+)\s*%\s+(?P<desc_amount>[\d.,]+)\s+(?P<total_price>[\d.,]+)'
-        for line in item_lines:
-            line = line.strip()
-            if not line:
-                continue
-            line_match = re.match(line_regex, line)
-            if line_match:
-                code = line_match.group('code')
-                description = line_match.group('description')
-                quantity = line_match.group('quantity')
-                unit_price = line_match.group('unit_price')
-                discount = line_match.group('discount')
-                total_price = line_match.group('total_price')
-                # Build the item dict
-                item = {
-                    'quantity': int(quantity),
-                    'sku': code.strip(),
-                    'description': description.strip(),
-                    'unit_price': parse_float(unit_price),
-                    'discount': parse_float(discount),
-                    'subtotal': parse_float(total_price)
-                }
-                data["items"].append(item)
-            else:
-                print(f"No match for line: {line}")
-
-    # Extraer el subtotal
-    subtotal_match = re.search(r'NETO\s*([\d.,]+)', text)
-    if subtotal_match:
-        data['subtotal'] = parse_int(subtotal_match.group(1))
-
-    # Extraer el IVA
-    tax_match = re.search(r'I\.V\.A\. 19%\s*([\d.,]+)', text)
-    if tax_match:
-        data['tax'] = parse_int(tax_match.group(1))
-
-    # Extraer el total
-    total_match = re.search(r'TOTAL\s*([\d.,]+)', text)
-    if total_match:
-        data['total'] = parse_int(total_match.group(1))
-
-    return data
+    global _vendor_matcher
+    if not any(vendor["patterns"] for vendor in VENDORS):
+        return None
+    if _vendor_matcher is None:
+        _vendor_matcher = re.compile('|'.join(
+            f"(?P<v{index}>{'|'.join(vendor['patterns'])})"
+            for index, vendor in enumerate(VENDORS) if vendor["patterns"]
+        ))
+    normalized_text = remove_accents(text).upper()
+    best = None
+    for match in _vendor_matcher.finditer(normalized_text):
+        index = int(match.lastgroup[1:])
+        if best is None or index < best:
+            best = index
+            if best == 0:
+                break
+    return VENDORS[best] if best is not None else None
+
+
+# Proveedores definidos por plantilla; agregar un proveedor solo requiere agregar su plantilla
+for template in TEMPLATES:
+    register_vendor(template.name, template.parse, template.ruts, template.names, template.required)
 
 def load(data):
     """
@@ -562,15 +331,52 @@ def load(data):
     # Ejemplo de carga de datos en la base de datos (crear una nueva factura)
     create_invoice(data, 'invoices_received')
     
-def move_to_processed(file_path, path_invoices):
+def load_batch(batch, path_invoices):
+    """
+    Carga un lote de facturas con una sola llamada a la base de datos y mueve
+    a "PROCESADOS" solo los archivos cuya factura se insertó correctamente.
+    
+    Parámetros:
+    - batch: Lista de tuplas (data, file_path) con las facturas transformadas.
+    - path_invoices: Ruta de la carpeta que contiene los archivos de facturas.
+
+    Retorna:
+    - La cantidad de archivos cargados y movidos.
+    """
+    results = create_invoices_bulk([data for data, _ in batch], 'invoices_received')
+    if results is None:
+        print(f"Error al cargar el lote de {len(batch)} facturas.")
+        return 0
+
+    loaded_count = 0
+    for (data, file_path), result in zip(batch, results):
+        if result["ok"]:
+            move_to_processed(file_path, path_invoices)
+            loaded_count += 1
+        else:
+            print(f"Error al cargar el archivo {os.path.basename(file_path)}: {result['error']}")
+    return loaded_count
+
+def move_to_quarantine(file_path, path_invoices):
+    """
+    Mueve un archivo de proveedor no reconocido a la carpeta de cuarentena.
+    
+    Parámetros:
+    - file_path: Ruta del archivo.
+    - path_invoices: Ruta de la carpeta que contiene los archivos de facturas.
+    """
+    move_to_processed(file_path, path_invoices, QUARANTINE_FOLDER)
+
+def move_to_processed(file_path, path_invoices, folder="PROCESADOS"):
     """
     Mueve el archivo procesado a la carpeta "PROCESADOS".
     
     Parámetros:
     - file_path: Ruta del archivo procesado.
     - path_invoices: Ruta de la carpeta que contiene los archivos de facturas.
+    - folder: Carpeta de destino dentro de path_invoices.
     """
-    processed_folder = os.path.join(path_invoices, "PROCESADOS")
+    processed_folder = os.path.join(path_invoices, folder)
     if not os.path.exists(processed_folder):
         os.makedirs(processed_folder)
 
@@ -580,15 +386,39 @@ def move_to_processed(file_path, path_invoices):
 
     print(f"Archivo {file_path} movido a {processed_path}")
 
-def main(invoices_received_path):
+def main(invoices_received_path, batch_size=BATCH_SIZE, workers=WORKERS):
     """
     Función principal que coordina las etapas de extracción, transformación y carga de datos.
+
+    La extracción y transformación (en procesos) avanza en paralelo con la carga, unidas
+    por una cola acotada. Cada archivo se mueve solo después de que su factura se cargó.
     
     Parámetros:
     - invoices_received_path: Ruta de la carpeta que contiene los archivos de facturas.
+    - batch_size: Cantidad de facturas que se cargan juntas en la base de datos.
+    - workers: Cantidad de procesos para extraer y transformar los PDF en paralelo.
     Retorna el número de archivos procesados
     """
-    
-    processed_count = extract(invoices_received_path)
+    processed_count = 0  # Inicializa el contador
+    pending = []  # Facturas transformadas pendientes de carga: (data, file_path)
+
+    # Los resultados llegan en el orden de la carpeta
+    for file_path, data, error in stage(extract(invoices_received_path, workers)):
+        if error:
+            print(f"Error al procesar el archivo {os.path.basename(file_path)}: {error}")
+        elif data is None:
+            print(f"Proveedor no reconocido en el archivo {os.path.basename(file_path)}.")
+            move_to_quarantine(file_path, invoices_received_path)
+        else:
+            pending.append((data, file_path))
+
+        # Etapa de carga: cargar el lote cuando alcanza el tamaño configurado
+        if len(pending) >= batch_size:
+            processed_count += load_batch(pending, invoices_received_path)
+            pending = []
+
+    if pending:
+        processed_count += load_batch(pending, invoices_received_path)
+
+    cache.evict()
     return processed_count
-    
\ No newline at end of file
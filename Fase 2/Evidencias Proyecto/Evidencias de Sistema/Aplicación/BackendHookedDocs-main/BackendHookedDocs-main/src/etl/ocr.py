@@ -0,0 +1,232 @@
+import os
+import json
+import hashlib
+import tempfile
+
+import numpy
+import pytesseract
+from PIL import Image
+
+# Resolución (DPI) a la que se reducen las imágenes antes del OCR; tesseract no gana precisión sobre ~300 DPI
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+
+# Idioma de tesseract
+OCR_LANG = "spa"
+
+# Ancho de página (pulgadas) usado para estimar la resolución de las imágenes que no la informan
+PAGE_WIDTH_INCHES = 8.5
+
+# Inclinación máxima (grados) que se corrige y paso de la búsqueda del ángulo
+MAX_SKEW_DEGREES = 5.0
+SKEW_STEP_DEGREES = 0.25
+
+# Ancho de la miniatura usada para estimar la inclinación
+SKEW_SAMPLE_WIDTH = 800
+
+# Versión del preprocesamiento; al cambiarla se descartan las imágenes preprocesadas en caché
+PREPROCESS_VERSION = "1"
+
+
+def otsu_threshold(image):
+    """
+    Umbral de binarización de Otsu calculado sobre el histograma de una imagen en escala de grises.
+
+    Parámetros:
+    - image: Imagen PIL en modo "L".
+
+    Retorna:
+    - El nivel de gris (0-255) que separa mejor el texto del fondo.
+    """
+    histogram = numpy.array(image.histogram()[:256], dtype=numpy.float64)
+    levels = numpy.arange(256)
+    weight_back = numpy.cumsum(histogram)
+    weight_fore = weight_back[-1] - weight_back
+    sum_back = numpy.cumsum(histogram * levels)
+    sum_total = sum_back[-1]
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        mean_back = sum_back / weight_back
+        mean_fore = (sum_total - sum_back) / weight_fore
+        variance = weight_back * weight_fore * (mean_back - mean_fore) ** 2
+    variance = numpy.nan_to_num(variance)
+    return int(numpy.argmax(variance))
+
+
+def image_dpi(image):
+    """Resolución horizontal de la imagen; si no la informa, se estima con el ancho de una página."""
+    dpi = image.info.get("dpi")
+    if dpi and dpi[0]:
+        return float(dpi[0])
+    return image.width / PAGE_WIDTH_INCHES
+
+
+def downscale(image, target_dpi=OCR_DPI):
+    """Reduce la imagen a `target_dpi` si tiene una resolución mayor; nunca la amplía."""
+    scale = target_dpi / image_dpi(image)
+    if scale >= 0.95:
+        return image
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.LANCZOS)
+
+
+def skew_angle(image):
+    """
+    Estima la inclinación del texto por perfiles de proyección: se rota una miniatura
+    binarizada y se elige el ángulo en que las filas de texto quedan más marcadas.
+
+    Parámetros:
+    - image: Imagen PIL en modo "L".
+
+    Retorna:
+    - El ángulo (grados, antihorario) que endereza la imagen.
+    """
+    sample = image.copy()
+    sample.thumbnail((SKEW_SAMPLE_WIDTH, SKEW_SAMPLE_WIDTH * 2))
+    threshold = otsu_threshold(sample)
+    ink = sample.point(lambda value: 255 if value < threshold else 0)
+
+    best_angle, best_score = 0.0, -1.0
+    steps = int(MAX_SKEW_DEGREES / SKEW_STEP_DEGREES)
+    for step in range(-steps, steps + 1):
+        angle = step * SKEW_STEP_DEGREES
+        rotated = ink.rotate(angle, resample=Image.NEAREST, fillcolor=0)
+        profile = numpy.asarray(rotated, dtype=numpy.float64).sum(axis=1)
+        score = numpy.square(numpy.diff(profile)).sum()
+        if score > best_score:
+            best_angle, best_score = angle, score
+    return best_angle
+
+
+def preprocess(image, target_dpi=OCR_DPI):
+    """
+    Prepara una imagen escaneada para el OCR: escala de grises, reducción a `target_dpi`,
+    corrección de la inclinación y binarización con el umbral de Otsu.
+
+    Parámetros:
+    - image: Imagen PIL.
+    - target_dpi: Resolución de salida.
+
+    Retorna:
+    - Imagen PIL en modo "L" con solo blanco y negro.
+    """
+    gray = downscale(image.convert("L"), target_dpi)
+    angle = skew_angle(gray)
+    if angle:
+        gray = gray.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+    threshold = otsu_threshold(gray)
+    return gray.point(lambda value: 0 if value < threshold else 255)
+
+
+def load_preprocessed(image_path, cache_path=None, target_dpi=OCR_DPI):
+    """
+    Retorna la imagen preprocesada de `image_path`. Si `cache_path` existe se usa la imagen
+    guardada; si no, se preprocesa y se guarda ahí (PNG de 1 bit) para las próximas lecturas.
+
+    Parámetros:
+    - image_path: Ruta de la imagen original.
+    - cache_path: Ruta de la imagen preprocesada en caché (None para no usar caché).
+    - target_dpi: Resolución de salida.
+
+    Retorna:
+    - Imagen PIL en modo "L".
+    """
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with Image.open(cache_path) as cached:
+                image = cached.convert("L")
+            # Marca de uso para la eliminación por antigüedad de la caché
+            os.utime(cache_path)
+            return image
+        except OSError:
+            pass
+
+    with Image.open(image_path) as original:
+        image = preprocess(original, target_dpi)
+
+    if cache_path:
+        temp_path = None
+        try:
+            handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), suffix=".tmp")
+            with os.fdopen(handle, "wb") as file:
+                image.convert("1").save(file, format="PNG")
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            print(f"No se pudo guardar en caché la imagen preprocesada de {os.path.basename(image_path)}: {e}")
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+    return image
+
+
+def ocr_image(image, target_dpi=OCR_DPI):
+    """
+    Preprocesa una imagen (ver preprocess) y aplica OCR a la página completa.
+
+    Parámetros:
+    - image: Imagen PIL, por ejemplo una página de PDF rasterizada.
+    - target_dpi: Resolución a la que se reduce la imagen.
+
+    Retorna:
+    - Texto reconocido.
+    """
+    return pytesseract.image_to_string(preprocess(image, target_dpi), lang=OCR_LANG)
+
+
+def crop(image, box):
+    """Recorta la región `box` (x0, y0, x1, y1 como fracciones del ancho y alto) de la imagen."""
+    x0, y0, x1, y1 = box
+    return image.crop((
+        int(x0 * image.width), int(y0 * image.height),
+        int(x1 * image.width), int(y1 * image.height)
+    ))
+
+
+def ocr_config(region):
+    """Opciones de tesseract para una región: modo de segmentación y caracteres permitidos."""
+    config = f"--psm {region.get('psm', 6)}"
+    if region.get("whitelist"):
+        config += f" -c tessedit_char_whitelist={region['whitelist']}"
+    return config
+
+
+def ocr_lines(image, region):
+    """Líneas no vacías del OCR de una región de la imagen."""
+    text = pytesseract.image_to_string(crop(image, region["box"]), lang=OCR_LANG, config=ocr_config(region))
+    return [line.strip() for line in text.split('\n') if line.strip()]
+
+
+def ocr_regions(image, regions):
+    """
+    Aplica OCR solo a las regiones conocidas del documento, en el orden indicado.
+
+    Cada región es un diccionario con:
+    - name: nombre de la región (solo informativo).
+    - box: (x0, y0, x1, y1) como fracciones del ancho y alto de la imagen.
+    - whitelist: caracteres permitidos (por ejemplo solo dígitos para los montos).
+    - psm: modo de segmentación de tesseract (por defecto 6, un bloque de texto).
+    - values: región opcional con su propio box / whitelist, alineada a la derecha de la
+      anterior (por ejemplo la columna de montos junto a la de etiquetas); cada línea de
+      la región se une con la línea correspondiente de values.
+
+    Parámetros:
+    - image: Imagen PIL preprocesada.
+    - regions: Lista de regiones.
+
+    Retorna:
+    - El texto de las regiones, una línea por línea reconocida.
+    """
+    lines = []
+    for region in regions:
+        labels = ocr_lines(image, region)
+        if "values" in region:
+            values = ocr_lines(image, region["values"])
+            count = max(len(labels), len(values))
+            labels += [''] * (count - len(labels))
+            values += [''] * (count - len(values))
+            labels = [f"{label} {value}".strip() for label, value in zip(labels, values)]
+        lines.extend(labels)
+    return '\n'.join(lines) + '\n'
+
+
+def regions_version(regions, target_dpi=OCR_DPI):
+    """Huella corta de la configuración del OCR por regiones; cambia al editar las regiones o la resolución."""
+    spec = {"regions": regions, "dpi": target_dpi, "preprocess": PREPROCESS_VERSION}
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()[:12]
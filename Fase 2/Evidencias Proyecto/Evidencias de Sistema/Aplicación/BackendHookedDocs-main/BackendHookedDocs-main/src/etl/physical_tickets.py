@@ -1,8 +1,11 @@
 import os
 import sys
 import shutil
-import pandas as pd
 from src.core.crud import *
+from src.etl.pipeline import WORKERS, parallel_map, stage
+from src.etl.excel_reader import read_bytes_estimate, read_excel_cached
+from src.etl.extraction_cache import ExtractionCache
+from src.etl.ticket_columns import apply_columns, frame_bytes, reader_types, required_mask
 
 # Configuración de rutas para agregar el directorio src al path de Python
 route = os.path.abspath(__file__)
@@ -12,59 +15,79 @@ global_route = os.path.join(local_path, "src")
 
 sys.path.append(global_route)
 
-def extract(tickets_path):
+# Columnas del Excel: nombre de origen, nombre en la base de datos y tipo (ver ticket_columns.apply_columns).
+# Las filas con alguna columna requerida vacía se descartan; EFECTIVO solo se lee para filtrar.
+COLUMNS = [
+    {"source": "Nº Documento", "target": "numero_documento", "dtype": "int64", "required": True},
+    {"source": "Fecha Emisión", "target": "fecha_emision", "dtype": "date", "required": True},
+    {"source": "Código Tributario", "target": "codigo_tributario", "dtype": "int32", "required": True},
+    {"source": "Monto Neto Documento", "target": "monto_neto", "dtype": "int32", "required": True},
+    {"source": "Monto Impuestos Documento", "target": "monto_impuestos", "dtype": "int32", "required": True},
+    {"source": "Monto Documento", "target": "monto_total", "dtype": "int32", "required": True},
+    {"source": "Vendedor", "target": "vendedor", "dtype": "category", "required": True},
+    {"source": "Sucursal", "target": "sucursal", "dtype": "category", "required": True},
+    {"source": "EFECTIVO", "target": None, "dtype": "int64"}
+]
+
+# Tipos con que se leen las columnas de origen del Excel; las demás columnas del archivo no se leen
+READ_TYPES = reader_types(COLUMNS)
+
+# Omitir al cargar las boletas que ya están en la base de datos (misma clave folio, tipo y
+# fecha); "0" para insertar todas las filas
+SKIP_EXISTING = os.getenv("ETL_TICKETS_SKIP_EXISTING", "1") != "0"
+
+# Caché en disco de las hojas ya leídas de cada Excel, para reintentos y reprocesos
+cache = ExtractionCache("physical_tickets")
+
+def extract(tickets_path, workers=WORKERS):
     """
-    Extrae los datos de cada archivo Excel en la carpeta especificada.
-    
+    Extrae y transforma los archivos Excel de la carpeta en un pool de procesos.
+
+    Los archivos se envían al pool a medida que se cargan los anteriores: ETL_MAX_IN_FLIGHT
+    y ETL_MEMORY_MB acotan cuántos DataFrames (en lectura o esperando su carga) existen a
+    la vez, de modo que la memoria no depende de la cantidad de archivos de la carpeta.
+
     Parámetros:
     - tickets_path: Ruta de la carpeta que contiene los archivos de Excel.
-    
+    - workers: Cantidad de procesos (1 = secuencial).
+
     Retorna:
-    - Una lista de tuplas (dataframe, archivo) con los datos extraídos y el nombre del archivo.
+    - Un generador de tuplas (archivo, dataframe transformado, error) en el orden de la carpeta.
+    """
+    files = [
+        os.path.join(tickets_path, file) for file in os.listdir(tickets_path)
+        if file.endswith(".xls") or file.endswith(".xlsx")
+    ]
+    # Mientras un archivo se lee se estima su memoria a partir del tamaño del archivo
+    return parallel_map(extract_file, files, workers, size=frame_bytes, estimate=read_bytes_estimate)
+
+def extract_file(file_path):
     """
-    extracted_data = []
+    Lee un archivo Excel y lo transforma; se ejecuta en los procesos del pool.
 
-    for file in os.listdir(tickets_path):
-        if file.endswith(".xls") or file.endswith(".xlsx"):
-            file_path = os.path.join(tickets_path, file)
-            try:
-                # Leer archivo Excel
-                data = pd.read_excel(file_path)
-                extracted_data.append((data, file_path))
-            except Exception as e:
-                print(f"Error al leer el archivo {file_path}: {e}")
+    Parámetros:
+    - file_path: Ruta del archivo Excel.
 
-    return extracted_data
+    Retorna:
+    - DataFrame transformado.
+    """
+    # Leer solo las columnas usadas, con sus tipos declarados (o su copia en caché)
+    data = read_excel_cached(file_path, list(READ_TYPES), READ_TYPES, cache)
+    return transform(data)
 
 def transform(data):
+    """
+    Transforma el DataFrame según COLUMNS: conserva las boletas pagadas en efectivo con
+    todas las columnas requeridas y convierte cada columna a su nombre y tipo de salida.
 
-    data = data[data['EFECTIVO'] != 0]
-
-    # Renombrar columnas para evitar caracteres especiales
-    column_mapping = {
-        'Nº Documento': 'numero_documento',
-        'Fecha Emisión': 'fecha_emision',
-        'Código Tributario': 'codigo_tributario',
-        'Monto Neto Documento': 'monto_neto',
-        'Monto Impuestos Documento': 'monto_impuestos',
-        'Monto Documento': 'monto_total',
-        'Vendedor': 'vendedor',
-        'Sucursal': 'sucursal'
-    }
-    data.rename(columns=column_mapping, inplace=True)
-    
-    # Seleccionar solo las columnas requeridas
-    required_columns = list(column_mapping.values())
-    data = data[[col for col in required_columns if col in data.columns]]
-
-    # Eliminar filas con valores nulos
-    data.dropna(inplace=True)
+    Parámetros:
+    - data: DataFrame con los datos extraídos.
 
-    # Convertir la columna 'fecha_emision' al formato deseado
-    if 'fecha_emision' in data.columns:
-        data['fecha_emision'] = pd.to_datetime(data['fecha_emision']).dt.strftime('%Y%m%d')
-    
-    return data
+    Retorna:
+    - DataFrame transformado con los datos necesarios.
+    """
+    rows = (data['EFECTIVO'] != 0).to_numpy() & required_mask(data, COLUMNS)
+    return apply_columns(data, COLUMNS, rows)
 
 
 def load(data):
@@ -73,9 +96,17 @@ def load(data):
     
     Parámetros:
     - data: El DataFrame con los datos procesados de la factura.
+
+    Retorna:
+    - El resultado de la carga, o None si no se pudo cargar en la base de datos.
     """
     print (data.head())
-    create_physical_tickets(data)
+    result = create_physical_tickets(data, skip_existing=SKIP_EXISTING)
+    if result and result["skipped"]:
+        print(f"{result['skipped']} filas omitidas por repetir una boleta ya cargada (mismo folio, tipo y fecha)")
+    if result and result["rejected"]:
+        print(f"{len(result['rejected'])} filas rechazadas por la base de datos: {[index for index, _ in result['rejected']]}")
+    return result
 
 def move_to_processed(file_path, base_path):
     """
@@ -92,24 +123,36 @@ def move_to_processed(file_path, base_path):
 
     shutil.move(file_path, processed_folder)
 
-def main(physical_tickets_path):
+def main(physical_tickets_path, workers=WORKERS):
     """
     Función principal que coordina las etapas de extracción, transformación y carga de datos.
+
+    Los archivos se leen y transforman en paralelo en un pool de procesos mientras se
+    cargan los anteriores, en el orden de la carpeta. La extracción corre en su propia
+    etapa (ver pipeline.stage), por lo que sigue enviando archivos al pool durante la carga;
+    la cola entre ambas etapas guarda un solo resultado, que queda fuera del presupuesto
+    de memoria de parallel_map.
+
+    Parámetros:
+    - physical_tickets_path: Ruta de la carpeta que contiene los archivos de Excel.
+    - workers: Cantidad de procesos para leer y transformar los archivos (1 = secuencial).
+    Retorna el número de archivos procesados
     """
-    
-    # Etapa de extracción: leer todos los archivos Excel de la carpeta
-    extracted_data_list = extract(physical_tickets_path)
     processed_count = 0  # Inicializa el contador
 
-    for data, file_path in extracted_data_list:
-        # Etapa de transformación: normaliza el DataFrame
-        data_final = transform(data)
+    for file_path, data_final, error in stage(extract(physical_tickets_path, workers), maxsize=1):
+        if error:
+            print(f"Error al procesar el archivo {file_path}: {error}")
+            continue
 
-        # Etapa de carga: inserta o muestra los datos en la base de datos
-        load(data_final)
+        # Etapa de carga: inserta los datos en la base de datos
+        if load(data_final) is None:
+            print(f"Error al cargar el archivo {os.path.basename(file_path)}; se mantiene en la carpeta.")
+            continue
 
-        # Mover el archivo a la carpeta "PROCESADOS" después de procesarlo
+        # Mover el archivo a la carpeta "PROCESADOS" solo después de cargarlo
         move_to_processed(file_path, physical_tickets_path)
         processed_count += 1  # Incrementa el contador por cada archivo movido
 
+    cache.evict()
     return processed_count
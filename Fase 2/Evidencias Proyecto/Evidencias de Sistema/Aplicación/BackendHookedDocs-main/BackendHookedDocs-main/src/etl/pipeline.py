@@ -0,0 +1,154 @@
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Elementos que cada etapa del ETL puede adelantar a la siguiente; acota la memoria usada
+QUEUE_SIZE = int(os.getenv("ETL_QUEUE_SIZE", "4"))
+
+# Procesos de las etapas que se ejecutan en un pool (ver parallel_map); 1 = secuencial
+WORKERS = int(os.getenv("ETL_WORKERS", str(os.cpu_count() or 1)))
+
+# Resultados que pueden existir a la vez entre los que se están procesando y los que esperan
+# a la etapa siguiente (por defecto, dos por proceso)
+MAX_IN_FLIGHT = int(os.getenv("ETL_MAX_IN_FLIGHT", "0"))
+
+# Memoria (MB) que pueden ocupar a la vez esos resultados
+MEMORY_BUDGET_MB = int(os.getenv("ETL_MEMORY_MB", "1024"))
+
+# Marca de fin de una etapa
+_DONE = object()
+
+
+class _StageError:
+    """Excepción de una etapa, para relanzarla en la etapa que la consume."""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def stage(items, maxsize=QUEUE_SIZE):
+    """
+    Ejecuta el generador `items` en un hilo propio y entrega sus elementos a través de
+    una cola acotada. La etapa productora avanza mientras la consumidora procesa los
+    elementos anteriores y se detiene cuando la cola está llena, por lo que la memoria
+    depende del tamaño de la cola y no de la cantidad de archivos.
+
+    Las etapas se encadenan anidando llamadas: stage(transformar(stage(extraer()))).
+    Una excepción de la etapa productora se relanza en la consumidora.
+
+    Parámetros:
+    - items: Iterable o generador de la etapa productora.
+    - maxsize: Cantidad máxima de elementos en espera entre ambas etapas.
+
+    Retorna:
+    - Un generador con los mismos elementos, en el mismo orden.
+    """
+    buffer = queue.Queue(maxsize=max(1, maxsize))
+    stop = threading.Event()
+
+    def put(item):
+        # Espera espacio en la cola salvo que la etapa consumidora haya terminado antes
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put(item):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(_StageError(e))
+        finally:
+            close = getattr(items, "close", None)
+            if close:
+                close()
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _StageError):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def parallel_map(function, items, workers=WORKERS, max_in_flight=MAX_IN_FLIGHT,
+                 memory_mb=MEMORY_BUDGET_MB, size=None, estimate=None, executor=None):
+    """
+    Aplica `function` a cada elemento en un pool (de procesos por defecto) y entrega los resultados en el
+    orden de `items`, a medida que la etapa consumidora los pide.
+
+    Solo se envía un elemento nuevo al pool si hay menos de `max_in_flight` elementos entre
+    los que se están procesando y los terminados que la etapa consumidora aún no recibe, y
+    si la memoria de esos elementos está bajo `memory_mb`. La memoria de un resultado
+    terminado se mide con `size`; la de uno en proceso se estima con `estimate`. Siempre
+    se procesa al menos un elemento, aunque por sí solo supere el presupuesto.
+
+    Parámetros:
+    - function: Función a nivel de módulo (se ejecuta en otro proceso) que recibe un elemento.
+    - items: Lista de elementos.
+    - workers: Cantidad de procesos o hilos (1 = secuencial, en el mismo proceso).
+    - max_in_flight: Máximo de elementos a la vez (0 = dos por proceso).
+    - memory_mb: Presupuesto de memoria en MB.
+    - size: Función que retorna los bytes de un resultado (None = no se mide).
+    - estimate: Función que estima los bytes del resultado de un elemento en proceso.
+    - executor: Clase del pool (None = ProcessPoolExecutor); ThreadPoolExecutor sirve para
+      trabajo que libera el GIL, como el OCR.
+
+    Retorna:
+    - Un generador de tuplas (elemento, resultado, error); si la función falla, resultado
+      es None y error el mensaje.
+    """
+    if workers <= 1 or len(items) <= 1:
+        for item in items:
+            try:
+                yield item, function(item), None
+            except Exception as e:
+                yield item, None, str(e)
+        return
+
+    max_in_flight = max_in_flight or 2 * workers
+    budget = memory_mb * 1024 * 1024
+    window = deque()  # Listas [elemento, futuro, bytes del resultado o None si no se ha medido]
+
+    def window_bytes():
+        total = 0
+        for entry in window:
+            item, future, measured = entry
+            if measured is None and future.done() and size is not None and future.exception() is None:
+                entry[2] = measured = size(future.result())
+            if measured is not None:
+                total += measured
+            elif estimate is not None:
+                total += estimate(item)
+        return total
+
+    def next_result():
+        item, future, _ = window.popleft()
+        try:
+            return item, future.result(), None
+        except Exception as e:
+            # Un elemento fallido no detiene el resto
+            return item, None, str(e)
+
+    with (executor or ProcessPoolExecutor)(max_workers=min(workers, len(items))) as pool:
+        for item in items:
+            while window and (len(window) >= max_in_flight or window_bytes() >= budget):
+                yield next_result()
+            window.append([item, pool.submit(function, item), None])
+        while window:
+            yield next_result()
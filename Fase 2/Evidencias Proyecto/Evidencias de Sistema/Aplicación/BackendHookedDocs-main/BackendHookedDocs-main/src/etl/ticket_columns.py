@@ -0,0 +1,154 @@
+import numpy
+import pandas as pd
+
+# Tipo con que el lector de Excel entrega cada tipo de columna; los enteros compactos se leen
+# como int64 para poder descartar las filas vacías antes de convertirlos
+READER_TYPES = {"int32": "int64", "date": "datetime"}
+
+# Directivas de strftime que incluyen la hora
+TIME_PARTS = ("%H", "%I", "%M", "%S", "%f", "%p", "%X", "%c")
+
+# Formato de las fechas de texto si la columna no indica otro; las que no lo cumplen se leen
+# con el día primero (ver parse_dates)
+DEFAULT_INPUT_FORMAT = "ISO8601"
+
+
+def reader_types(columns):
+    """
+    Tipos que se piden al lector de Excel (excel_reader.read_excel) para las columnas de origen.
+
+    Parámetros:
+    - columns: Especificación de columnas de la boleta (ver apply_columns).
+
+    Retorna:
+    - Diccionario {columna de origen: tipo}, en el orden de la especificación.
+    """
+    return {
+        column["source"]: READER_TYPES.get(column["dtype"], column["dtype"])
+        for column in columns if column.get("source")
+    }
+
+
+def required_mask(data, columns):
+    """Filas que tienen valor en todas las columnas marcadas como requeridas (y presentes en el archivo)."""
+    required = [column["source"] for column in columns if column.get("required") and column["source"] in data.columns]
+    if not required:
+        return numpy.ones(len(data), dtype=bool)
+    return data[required].notna().all(axis=1).to_numpy()
+
+
+def apply_columns(data, columns, rows=None, derived=None):
+    """
+    Construye el DataFrame de salida en una sola pasada a partir de la especificación de
+    columnas, sin renombrar ni recortar el DataFrame leído.
+
+    Cada columna es un diccionario con:
+    - source: nombre de la columna en el Excel (None para columnas calculadas, ver `derived`).
+    - target: nombre en la base de datos (None si la columna solo se usa para filtrar o calcular).
+    - dtype: "int32" / "int64" (enteros; quedan en float64 si hay vacíos o no caben),
+      "float64", "category", "date" (texto con `format`, por defecto %Y%m%d) u "object".
+    - input_format: formato de las fechas que vienen como texto (por defecto ISO8601; ver parse_dates).
+    - required: si la fila se descarta cuando la columna está vacía (ver required_mask).
+
+    Parámetros:
+    - data: DataFrame leído del Excel.
+    - columns: Especificación de columnas.
+    - rows: Máscara booleana de las filas que se conservan (None para todas).
+    - derived: Diccionario {target: valores} de las columnas calculadas, ya filtradas por `rows`.
+
+    Retorna:
+    - Un DataFrame con las columnas de salida presentes, en el orden de la especificación,
+      conservando el índice de las filas originales.
+    """
+    if rows is not None:
+        index = data.index[rows]
+    else:
+        index = data.index
+    derived = derived or {}
+
+    result = {}
+    for column in columns:
+        target = column.get("target")
+        if not target:
+            continue
+        if target in derived:
+            values = derived[target]
+        elif column.get("source") in data.columns:
+            values = data[column["source"]].array
+            if rows is not None:
+                values = values[rows]
+        else:
+            continue
+        result[target] = convert(values, column)
+    return pd.DataFrame(result, index=index)
+
+
+def convert(values, column):
+    """Convierte un arreglo de valores al tipo declarado de la columna."""
+    dtype = column["dtype"]
+    if dtype in ("int32", "int64"):
+        return _integers(values, dtype)
+    if dtype == "float64":
+        return numpy.asarray(values, dtype=numpy.float64)
+    if dtype == "category":
+        return pd.Categorical(values)
+    if dtype == "date":
+        return format_dates(values, column.get("format", "%Y%m%d"), column.get("input_format", DEFAULT_INPUT_FORMAT))
+    return values
+
+
+def _integers(values, dtype):
+    """Enteros del tipo pedido; con vacíos, decimales o valores fuera de rango quedan en float64."""
+    numbers = numpy.asarray(values, dtype=numpy.float64)
+    if not numpy.isfinite(numbers).all() or (numbers != numpy.floor(numbers)).any():
+        return numbers
+    limits = numpy.iinfo(dtype)
+    if len(numbers) and (numbers.min() < limits.min or numbers.max() > limits.max):
+        return numbers.astype(numpy.int64)
+    return numbers.astype(dtype)
+
+
+def format_dates(values, output_format, input_format=DEFAULT_INPUT_FORMAT):
+    """
+    Fechas como texto con `output_format`. Las fechas del Excel ya vienen como datetime; las
+    que vienen como texto se leen con `input_format`. Cada fecha distinta se formatea una sola
+    vez y el resultado es categórico (las boletas de un período repiten pocas fechas).
+
+    Retorna:
+    - pd.Categorical con las fechas formateadas (NaN donde no hay fecha).
+    """
+    if not numpy.issubdtype(numpy.asarray(values).dtype, numpy.datetime64):
+        values = parse_dates(values, input_format)
+    values = pd.DatetimeIndex(values)
+    if not any(part in output_format for part in TIME_PARTS):
+        # Sin hora en el formato de salida, las fechas con distinta hora son el mismo valor
+        values = values.normalize()
+    codes, uniques = pd.factorize(values)
+    # Fechas distintas con el mismo texto (por ejemplo, con distinta hora) comparten categoría
+    text_codes, categories = pd.factorize(pd.DatetimeIndex(uniques).strftime(output_format))
+    codes = numpy.where(codes >= 0, text_codes[codes] if len(text_codes) else codes, -1)
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def parse_dates(values, input_format=DEFAULT_INPUT_FORMAT):
+    """
+    Convierte fechas de texto (o ya convertidas) en un DatetimeIndex. Cada texto distinto se
+    lee una sola vez con `input_format`; los que no lo cumplen (por ejemplo '15/01/2024' con
+    ISO8601) se leen con format="mixed" y el día primero, como las fechas de las exportaciones
+    locales. Un texto que no es una fecha es un error.
+
+    Retorna:
+    - pd.DatetimeIndex (NaT donde no hay fecha).
+    """
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    uniques = pd.Series(uniques, dtype=object)
+    parsed = pd.to_datetime(uniques, format=input_format, errors="coerce")
+    retry = parsed.isna() & uniques.notna()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(uniques[retry], format="mixed", dayfirst=True)
+    return pd.DatetimeIndex(parsed).take(codes, allow_fill=True, fill_value=pd.NaT)
+
+
+def frame_bytes(data):
+    """Memoria que ocupa un DataFrame, incluidos los textos de sus columnas."""
+    return int(data.memory_usage(deep=True).sum())
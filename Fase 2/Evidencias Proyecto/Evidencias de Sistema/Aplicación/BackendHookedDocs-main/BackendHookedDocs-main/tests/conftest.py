@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# Configuración de rutas para importar el paquete src desde las pruebas
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    """
+    Configura el backend SQLite sobre una base de datos temporal y retorna su ruta.
+    La caché de lecturas se vacía para que no entregue documentos de otra prueba.
+    """
+    from src.core import crud, database
+
+    path = str(tmp_path / "hookeddocs.db")
+    database.close_pool()
+    monkeypatch.setitem(database.DB_CONFIG, "engine", "sqlite")
+    monkeypatch.setitem(database.DB_CONFIG, "sqlite_path", path)
+    monkeypatch.setattr(database, "_backend", None)
+    crud.clear_invoice_cache()
+    yield path
+    crud.clear_invoice_cache()
+    database.close_pool()
@@ -0,0 +1,253 @@
+import datetime
+import sqlite3
+
+import pandas as pd
+
+from src.core import crud, metrics
+
+
+def invoice(number):
+    return {
+        "invoice_number": str(number), "issue_date": "01022024", "pay_method": "EF",
+        "items": [{"quantity": 1, "sku": "A", "description": "d", "unit_price": 100, "discount": 0, "subtotal": 100}],
+        "subtotal": 100, "tax": 19, "total": 119,
+        "issuer": {"name": "X", "rut": "1", "address": None, "email": None, "phone": None}
+    }
+
+
+def count(path, table):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def test_bulk_insert_is_one_transaction(sqlite_db, monkeypatch):
+    backend = crud.get_backend()
+    records = [invoice(number) for number in (1, 2, 3)]
+
+    def fail(cursor, table_name):
+        raise RuntimeError("falla en el traspaso")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(backend, "process_invoices", fail)
+        assert crud.create_invoices_bulk(records, "invoices_received") is None
+    assert count(sqlite_db, "invoices_received") == 0
+    assert count(sqlite_db, "flat_invoices_received") == 0
+
+    # El reintento carga el lote una sola vez
+    results = crud.create_invoices_bulk(records, "invoices_received")
+    assert [result["ok"] for result in results] == [True, True, True]
+    assert count(sqlite_db, "flat_invoices_received") == 3
+
+
+def tickets(rows):
+    """Boletas físicas transformadas a partir de tuplas (folio, dte, fecha 'YYYYMMDD')."""
+    return pd.DataFrame([
+        {"numero_documento": folio, "monto_neto": 100, "monto_impuestos": 19, "monto_total": 119,
+         "codigo_tributario": dte, "fecha_emision": date, "vendedor": "1", "sucursal": "S1"}
+        for folio, dte, date in rows
+    ])
+
+
+def flat_totals(path):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("SELECT invoice_number, total FROM flat_invoices_received ORDER BY invoice_number").fetchall()
+    finally:
+        connection.close()
+
+
+def test_batch_update_rolls_back_when_audit_fails(sqlite_db, monkeypatch):
+    crud.create_invoices_bulk([invoice(number) for number in (1, 2)], "invoices_received")
+    backend = crud.get_backend()
+
+    def fail(cursor, functionality):
+        raise RuntimeError("falla en la auditoría")
+
+    monkeypatch.setattr(backend, "audit_invoices", fail)
+    assert crud.update_selected_invoices({1: {"total": 500}, 2: {"total": 600}}, 1) is None
+
+    assert flat_totals(sqlite_db) == [(1, 119), (2, 119)]
+
+
+def test_batch_delete_rolls_back_when_depuration_fails(sqlite_db, monkeypatch):
+    crud.create_invoices_bulk([invoice(number) for number in (1, 2)], "invoices_received")
+    audit_rows = count(sqlite_db, "invoice_audit_log")
+    backend = crud.get_backend()
+
+    def fail(cursor, invoice_numbers):
+        raise sqlite3.OperationalError("falla en la depuración")
+
+    monkeypatch.setattr(backend, "depurate_logs", fail)
+    assert crud.delete_invoices([1, 2], 1) is None
+
+    assert flat_totals(sqlite_db) == [(1, 119), (2, 119)]
+    assert count(sqlite_db, "invoice_audit_log") == audit_rows
+
+
+def test_batch_delete_rolls_back_when_audit_log_delete_fails(sqlite_db, monkeypatch):
+    crud.create_invoices_bulk([invoice(number) for number in (1, 2)], "invoices_received")
+    audit_rows = count(sqlite_db, "invoice_audit_log")
+    backend = crud.get_backend()
+    executemany = backend.executemany
+
+    def fail_on_log(cursor, sql, rows):
+        if "invoice_audit_log" in sql:
+            return [(1, "falla al eliminar la validación")]
+        return executemany(cursor, sql, rows)
+
+    monkeypatch.setattr(backend, "executemany", fail_on_log)
+    assert crud.delete_invoices([1, 2], 1) is None
+
+    assert flat_totals(sqlite_db) == [(1, 119), (2, 119)]
+    assert count(sqlite_db, "invoice_audit_log") == audit_rows
+
+
+def test_batch_delete_rolls_back_when_depuration_reports_failures(sqlite_db, monkeypatch):
+    crud.create_invoices_bulk([invoice(number) for number in (1, 2)], "invoices_received")
+    monkeypatch.setattr(crud.get_backend(), "depurate_logs", lambda cursor, invoice_numbers: 1)
+
+    assert crud.delete_invoices([1, 2], 1) is None
+
+    assert flat_totals(sqlite_db) == [(1, 119), (2, 119)]
+
+
+def test_reloading_tickets_skips_every_row(sqlite_db):
+    data = tickets([(1, 39, "20240102"), (2, 39, "20240103"), (3, 33, "20240103")])
+
+    first = crud.create_physical_tickets(data, skip_existing=True)
+    second = crud.create_physical_tickets(data, skip_existing=True)
+
+    assert (first["inserted"], first["skipped"]) == (3, 0)
+    assert (second["inserted"], second["skipped"]) == (0, 3)
+    assert count(sqlite_db, "physical_tickets") == 3
+
+
+def test_tickets_repeated_in_one_frame_are_loaded_once(sqlite_db):
+    data = tickets([(1, 39, "20240102"), (1, 39, "20240102"), (1, 33, "20240102"), (1, 39, "20240103")])
+
+    result = crud.create_physical_tickets(data, skip_existing=True)
+
+    assert (result["inserted"], result["skipped"]) == (3, 1)
+
+
+def test_tickets_straddling_the_loaded_date_range(sqlite_db):
+    crud.create_physical_tickets(tickets([(1, 39, "20240110"), (2, 39, "20240120")]), skip_existing=True)
+
+    # El mismo folio en otra fecha, antes o después del rango ya cargado, es otra boleta
+    data = tickets([(1, 39, "20240105"), (1, 39, "20240110"), (2, 39, "20240120"), (2, 39, "20240125")])
+    result = crud.create_physical_tickets(data, skip_existing=True)
+    assert (result["inserted"], result["skipped"]) == (2, 2)
+
+    # Las fechas extremas del DataFrame también se comparan (rango inclusivo)
+    data = tickets([(1, 39, "20240110"), (3, 39, "20240115"), (2, 39, "20240120")])
+    result = crud.create_physical_tickets(data, skip_existing=True)
+    assert (result["inserted"], result["skipped"]) == (1, 2)
+    assert count(sqlite_db, "physical_tickets") == 5
+
+
+def test_log_filters_and_pagination(sqlite_db):
+    crud.count_log()
+    connection = sqlite3.connect(sqlite_db)
+    connection.executemany(
+        "INSERT INTO invoice_audit_log (invoice_id, issue_date, validation_message, process, issuer_name) VALUES (?, ?, ?, ?, ?)",
+        [(number, f"2024-01-{number:02d}", "ok", "CARGA" if number % 2 else "VALIDACION", "X") for number in range(1, 11)]
+    )
+    connection.commit()
+    connection.close()
+
+    assert crud.count_log() == 10
+    assert crud.count_log(process="CARGA", date_from="03/01/2024", date_to=datetime.date(2024, 1, 7)) == 3
+    assert [row["INVOICE_ID"] for row in crud.read_log(process="CARGA", date_to="2024-01-07")] == [1, 3, 5, 7]
+
+    first_page = crud.read_log(limit=4)
+    next_page = crud.read_log(after_id=first_page[-1]["AUDIT_ID"], limit=4)
+    assert [row["INVOICE_ID"] for row in first_page + next_page] == list(range(1, 9))
+    assert [row["INVOICE_ID"] for row in crud.read_log(offset=8)] == [9, 10]
+    assert [row["INVOICE_ID"] for row in crud.iter_log(issuer="X", arraysize=3)] == list(range(1, 11))
+
+
+def set_total(path, number, total):
+    """Modifica una factura directamente en la BD, sin pasar por crud."""
+    connection = sqlite3.connect(path)
+    connection.execute("UPDATE flat_invoices_received SET total = ? WHERE invoice_number = ?", (total, number))
+    connection.commit()
+    connection.close()
+
+
+def test_invoice_cache_hit_and_invalidation(sqlite_db):
+    crud.create_invoices_bulk([invoice(number) for number in (1, 2)], "invoices_received")
+    assert crud.read_select_invoice("1", 1)[0]["total"] == 119
+
+    # La segunda lectura (con el número como entero o con espacios) sale de la caché
+    hits = crud.invoice_cache_stats()["hits"]
+    set_total(sqlite_db, 1, 999)
+    assert crud.read_select_invoice(" 1 ", 1)[0]["total"] == 119
+    assert crud.read_select_invoice(1, 1)[0]["total"] == 119
+    assert crud.invoice_cache_stats()["hits"] == hits + 2
+
+    crud.update_selected_invoice(1, {"total": 500}, 1)
+    assert crud.read_select_invoice("1", 1)[0]["total"] == 500
+
+    crud.read_select_invoice("2", 1)
+    crud.delete_invoice(1, 2)
+    assert crud.read_select_invoice("2", 1) == []
+
+
+def test_read_select_invoices_in_chunks(sqlite_db, monkeypatch):
+    crud.create_invoices_bulk([invoice(number) for number in range(1, 6)], "invoices_received")
+    schema = crud.get_schema(1)
+    select_in_sql = schema.select_in_sql
+    chunks = []
+
+    def record(size):
+        chunks.append(size)
+        return select_in_sql(size)
+
+    monkeypatch.setattr(schema, "select_in_sql", record)
+    result = crud.read_select_invoices([1, "2", 3, 4, 5, 99], 1, chunk_size=2)
+
+    assert chunks == [2, 2, 2]
+    assert [rows[0]["invoice_number"] for rows in result.values() if rows] == [1, 2, 3, 4, 5]
+    assert result[99] == []
+
+    # Los números ya leídos salen de la caché; solo se consulta el que falta
+    chunks.clear()
+    assert list(crud.read_select_invoices([2, 99], 1, chunk_size=2)) == [2, 99]
+    assert chunks == [1]
+
+
+def test_schema_statements_are_built_once():
+    schema = crud.get_schema(3)
+
+    assert schema.select_in_sql(3) is schema.select_in_sql(3)
+    assert schema.select_in_sql(3).endswith("WHERE folio IN (:n0, :n1, :n2)")
+    assert schema.update_sql(["neto", "fecha"]) is schema.update_sql(("neto", "fecha"))
+    assert schema.update_sql(["neto", "fecha"]) == (
+        "UPDATE physical_tickets SET neto = :neto, fecha = TO_DATE(:fecha, 'DD/MM/YYYY') WHERE folio = :doc_number"
+    )
+    assert schema.valid_fields({"neto": 1, "otro": 2}) == {"neto": 1}
+    assert crud.get_schema(9) is None
+
+
+def test_calls_are_recorded_in_histograms(sqlite_db):
+    metrics.reset()
+    crud.count_log()
+    crud.count_log(date_from="no es fecha")
+
+    entry = metrics.snapshot()["count_log"]
+    assert (entry["calls"], entry["failures"]) == (2, 1)
+    # La llamada correcta hace un SELECT y el commit, y lee una fila; la fallida no llega a la BD
+    assert entry["round_trips"]["sum"] == 2
+    assert entry["round_trips"]["buckets"]["1"] == 1
+    assert entry["round_trips"]["buckets"]["2"] == 2
+    assert entry["rows"]["sum"] == 1
+
+    text = metrics.to_prometheus()
+    assert 'hookeddocs_db_calls_total{function="count_log"} 2' in text
+    assert 'hookeddocs_db_failures_total{function="count_log"} 1' in text
+    assert 'hookeddocs_db_round_trips_bucket{function="count_log",le="+Inf"} 2' in text
+    assert "# TYPE hookeddocs_db_call_seconds histogram" in text
+    metrics.reset()
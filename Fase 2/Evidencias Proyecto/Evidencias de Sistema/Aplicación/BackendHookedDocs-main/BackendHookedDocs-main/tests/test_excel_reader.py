@@ -0,0 +1,147 @@
+import re
+import zipfile
+
+import numpy
+import pandas as pd
+import pytest
+
+from src.etl import excel_reader
+from src.etl.excel_reader import read_excel, read_excel_cached
+from src.etl.extraction_cache import ExtractionCache
+
+# Columnas pedidas al lector y su tipo declarado
+DTYPES = {
+    "Nº Documento": "int64",
+    "Fecha Emisión": "datetime",
+    "Monto Documento": "float64",
+    "Monto Exento": "int64",
+    "Vendedor": "object",
+}
+
+
+def sample(rows=50):
+    """Hoja de prueba: columnas pedidas mezcladas con otras, con celdas vacías."""
+    index = numpy.arange(rows)
+    return pd.DataFrame({
+        "Otra": [f"x{i}" for i in index],
+        "Nº Documento": index + 1000,
+        "Fecha Emisión": pd.Timestamp("2024-01-01") + pd.to_timedelta(index % 31, unit="D"),
+        "Monto Documento": index * 10.5,
+        "Monto Exento": [None if i % 7 == 0 else i for i in index],
+        "Sin uso": index,
+        "Vendedor": [None if i % 5 == 0 else f"vendedor {i % 3}" for i in index],
+    })
+
+
+def expected(path):
+    return pd.read_excel(path)[list(DTYPES)]
+
+
+def assert_same(result, reference):
+    assert list(result.columns) == list(reference.columns)
+    assert len(result) == len(reference)
+    for name in reference.columns:
+        left = result[name].reset_index(drop=True)
+        right = reference[name].reset_index(drop=True)
+        if DTYPES[name] == "object":
+            right = right.astype(object).where(right.notna(), None)
+            left = left.astype(object).where(left.notna(), None)
+        elif DTYPES[name] == "datetime":
+            # Se comparan las fechas, no la resolución con que cada lector las entrega
+            left = left.astype("datetime64[ns]")
+            right = right.astype("datetime64[ns]")
+        pd.testing.assert_series_equal(left, right, check_dtype=DTYPES[name] != "object", check_names=False)
+
+
+def strip_references(source, target):
+    """Copia el .xlsx sin los atributos r de filas y celdas (opcionales en OOXML)."""
+    with zipfile.ZipFile(source) as original, zipfile.ZipFile(target, "w") as copy:
+        for item in original.infolist():
+            content = original.read(item.filename)
+            if item.filename.startswith("xl/worksheets/"):
+                content = re.sub(rb'(<(?:c|row)\b[^>]*?) r="[A-Z]*\d+"', rb"\1", content)
+            copy.writestr(item, content)
+
+
+def test_xlsx_matches_pandas(tmp_path):
+    path = tmp_path / "boletas.xlsx"
+    sample().to_excel(path, index=False)
+
+    assert_same(read_excel(str(path), list(DTYPES), DTYPES), expected(path))
+
+
+def test_xlsx_in_chunks_matches_pandas(tmp_path):
+    path = tmp_path / "boletas.xlsx"
+    sample(120).to_excel(path, index=False)
+
+    assert_same(read_excel(str(path), list(DTYPES), DTYPES, chunk_rows=16), expected(path))
+
+
+def test_xlsx_without_cell_references_matches_pandas(tmp_path):
+    source = tmp_path / "boletas.xlsx"
+    path = tmp_path / "sin_referencias.xlsx"
+    sample().to_excel(source, index=False)
+    strip_references(source, path)
+    assert b' r="' not in zipfile.ZipFile(path).read("xl/worksheets/sheet1.xml")
+
+    result = read_excel(str(path), list(DTYPES), DTYPES)
+
+    assert len(result) == 50
+    assert_same(result, expected(path))
+
+
+def test_missing_column_is_an_error(tmp_path):
+    path = tmp_path / "boletas.xlsx"
+    sample().drop(columns=["Vendedor"]).to_excel(path, index=False)
+
+    with pytest.raises(ValueError, match="Vendedor"):
+        read_excel(str(path), list(DTYPES), DTYPES)
+
+
+def test_rows_without_requested_values_are_an_error(tmp_path):
+    path = tmp_path / "boletas.xlsx"
+    data = sample(10)
+    data["Nº Documento"] = None
+    data[["Fecha Emisión", "Monto Documento", "Monto Exento", "Vendedor"]] = None
+    data.to_excel(path, index=False)
+
+    with pytest.raises(ValueError, match="ninguna con valores"):
+        read_excel(str(path), ["Nº Documento"], {"Nº Documento": "int64"})
+
+
+def test_xls_matches_pandas(tmp_path):
+    xlwt = pytest.importorskip("xlwt")
+    path = tmp_path / "boletas.xls"
+    data = sample()
+    book = xlwt.Workbook()
+    sheet = book.add_sheet("Hoja1")
+    date_style = xlwt.easyxf(num_format_str="YYYY-MM-DD")
+    for column, name in enumerate(data.columns):
+        sheet.write(0, column, name)
+        for row, value in enumerate(data[name], start=1):
+            if value is None or (isinstance(value, float) and numpy.isnan(value)):
+                continue
+            if isinstance(value, pd.Timestamp):
+                sheet.write(row, column, value.to_pydatetime(), date_style)
+            elif isinstance(value, numpy.generic):
+                sheet.write(row, column, value.item())
+            else:
+                sheet.write(row, column, value)
+    book.save(str(path))
+
+    assert_same(read_excel(str(path), list(DTYPES), DTYPES), expected(path))
+
+
+def test_cached_sheet_is_read_from_feather(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    path = tmp_path / "boletas.xlsx"
+    sample().to_excel(path, index=False)
+    cache = ExtractionCache("boletas", directory=str(tmp_path / "cache"))
+    first = read_excel_cached(str(path), list(DTYPES), DTYPES, cache)
+
+    # La segunda lectura no abre el Excel
+    monkeypatch.setattr(excel_reader, "read_excel", None)
+    second = read_excel_cached(str(path), list(DTYPES), DTYPES, cache)
+
+    assert [entry.suffix for entry in (tmp_path / "cache" / "boletas").iterdir()] == [".feather"]
+    assert_same(second, first)
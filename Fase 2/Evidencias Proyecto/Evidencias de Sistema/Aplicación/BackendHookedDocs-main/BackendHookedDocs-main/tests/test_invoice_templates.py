@@ -0,0 +1,24 @@
+import json
+
+from src.etl.invoice_templates import load_templates
+
+
+def write_template(directory, file_name, spec):
+    (directory / file_name).write_text(json.dumps(spec), encoding="utf-8")
+
+
+def test_templates_are_loaded_by_priority_then_file_name(tmp_path):
+    write_template(tmp_path, "a.json", {"name": "A", "priority": 3})
+    write_template(tmp_path, "b.json", {"name": "B", "priority": 1})
+    write_template(tmp_path, "c.json", {"name": "C"})
+    write_template(tmp_path, "d.json", {"name": "D", "priority": 3})
+
+    assert [template.name for template in load_templates(str(tmp_path))] == ["B", "A", "D", "C"]
+
+
+def test_vendors_are_checked_in_the_original_order():
+    from src.etl.invoices_received import classify_vendor
+
+    assert classify_vendor("MI TIENDA SPA\nPROFESSIONAL FISHING SPA")["name"] == "PROFESSIONAL FISHING SPA"
+    assert classify_vendor("RUT 76.214.117-5\nMI TIENDA SPA")["name"] == "MI TIENDA SPA"
+    assert classify_vendor("RUT 76.214.117-5")["name"] == "RAPALA"
@@ -0,0 +1,74 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.etl import excel_reader, pipeline
+
+MB = 1024 * 1024
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    """Pool que cuenta los elementos enviados que la etapa consumidora aún no recibe."""
+
+    pending = 0
+    peak = 0
+
+    def submit(self, *args, **kwargs):
+        CountingExecutor.pending += 1
+        CountingExecutor.peak = max(CountingExecutor.peak, CountingExecutor.pending)
+        return super().submit(*args, **kwargs)
+
+
+def square(value):
+    if value == 3:
+        raise ValueError("elemento inválido")
+    return value * value
+
+
+def run(monkeypatch, **options):
+    monkeypatch.setattr(pipeline, "ProcessPoolExecutor", CountingExecutor)
+    CountingExecutor.pending = CountingExecutor.peak = 0
+    results = []
+    for item, result, error in pipeline.parallel_map(square, list(range(8)), 4, **options):
+        CountingExecutor.pending -= 1
+        results.append((item, result, error))
+    return results
+
+
+def test_results_in_order_with_errors(monkeypatch):
+    results = run(monkeypatch)
+
+    assert [item for item, _, _ in results] == list(range(8))
+    assert results[2] == (2, 4, None)
+    assert results[3] == (3, None, "elemento inválido")
+    assert CountingExecutor.peak == 8
+
+
+@pytest.mark.parametrize("memory_mb, peak", [(0, 1), (3, 3), (100, 8)])
+def test_memory_budget_limits_items_in_flight(monkeypatch, memory_mb, peak):
+    # Cada elemento en proceso se estima en 1 MB y su resultado no se mide
+    run(monkeypatch, memory_mb=memory_mb, estimate=lambda item: MB)
+
+    assert CountingExecutor.peak == peak
+
+
+def test_max_in_flight(monkeypatch):
+    run(monkeypatch, max_in_flight=2)
+
+    assert CountingExecutor.peak == 2
+
+
+def test_read_estimate_scales_file_size(tmp_path, monkeypatch):
+    path = tmp_path / "boletas.xlsx"
+    path.write_bytes(b"x" * 1000)
+    monkeypatch.setattr(excel_reader, "EXCEL_EXPANSION_FACTOR", 12.5)
+
+    assert excel_reader.read_bytes_estimate(str(path)) == 12500
+
+
+def test_executor_class_is_configurable():
+    CountingExecutor.pending = CountingExecutor.peak = 0
+    results = list(pipeline.parallel_map(square, [1, 2, 4], 2, max_in_flight=2, executor=CountingExecutor))
+
+    assert results == [(1, 1, None), (2, 4, None), (4, 16, None)]
+    assert CountingExecutor.peak == 3
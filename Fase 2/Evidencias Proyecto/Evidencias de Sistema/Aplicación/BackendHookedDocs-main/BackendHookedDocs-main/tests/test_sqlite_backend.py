@@ -0,0 +1,58 @@
+import sqlite3
+
+import pytest
+
+from src.core import crud
+from src.core.backends.sqlite import SQLiteBackend
+
+# Inserción en una tabla con columnas NOT NULL, para provocar errores por fila
+INSERT_FLAT = """
+INSERT INTO flat_invoices_received (invoice_number, subtotal, tax, total, create_date)
+VALUES (:invoice_number, :subtotal, :tax, :total, :create_date)
+"""
+
+
+def rows(count, failing=()):
+    return [
+        {"invoice_number": number, "subtotal": None if number in failing else 100,
+         "tax": 19, "total": 119, "create_date": "2024-01-01"}
+        for number in range(1, count + 1)
+    ]
+
+
+def count(path, table="flat_invoices_received"):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        connection.close()
+
+
+@pytest.fixture
+def connection(tmp_path):
+    connection = sqlite3.connect(str(tmp_path / "backend.db"))
+    SQLiteBackend().prepare_connection(connection)
+    yield connection
+    connection.close()
+
+
+@pytest.mark.parametrize("failing", [(), (2,)], ids=["lote", "fila-a-fila"])
+def test_batch_is_undone_by_rollback(connection, failing):
+    backend = SQLiteBackend()
+    cursor = connection.cursor()
+
+    errors = backend.executemany(cursor, INSERT_FLAT, rows(3, failing))
+    assert [offset for offset, _ in errors] == [number - 1 for number in failing]
+    connection.rollback()
+
+    assert connection.execute("SELECT COUNT(*) FROM flat_invoices_received").fetchone()[0] == 0
+
+
+def test_batch_then_failure_leaves_table_empty(sqlite_db):
+    @crud.with_connection
+    def load_and_fail(connection):
+        crud.get_backend().executemany(connection.cursor(), INSERT_FLAT, rows(3))
+        raise RuntimeError("falla después del lote")
+
+    assert load_and_fail() is None
+    assert count(sqlite_db) == 0
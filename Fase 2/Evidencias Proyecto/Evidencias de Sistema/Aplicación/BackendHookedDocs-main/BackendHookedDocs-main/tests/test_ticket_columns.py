@@ -0,0 +1,43 @@
+import numpy
+import pandas as pd
+import pytest
+
+from src.etl import physical_tickets
+from src.etl.ticket_columns import format_dates
+
+
+def test_day_first_text_dates():
+    assert list(format_dates(["15/01/2024", "16/01/2024"], "%Y%m%d")) == ["20240115", "20240116"]
+
+
+def test_mixed_text_dates_and_blanks():
+    values = ["2024-01-15", "02/03/2024", None, pd.Timestamp("2024-05-06 10:00")]
+
+    result = list(format_dates(values, "%Y%m%d"))
+
+    assert result[:2] == ["20240115", "20240302"]
+    assert pd.isna(result[2])
+    assert result[3] == "20240506"
+
+
+def test_text_that_is_not_a_date_is_an_error():
+    with pytest.raises(ValueError):
+        format_dates(["sin fecha"], "%Y%m%d")
+
+
+def test_physical_tickets_with_day_first_dates():
+    data = pd.DataFrame({
+        "Nº Documento": numpy.array([1, 2, 3], dtype=numpy.int64),
+        "Fecha Emisión": pd.Series(["15/01/2024", "16/01/2024", "17/01/2024"], dtype=object),
+        "Código Tributario": numpy.array([39, 39, 39], dtype=numpy.int64),
+        "Monto Neto Documento": numpy.array([100, 200, 300], dtype=numpy.int64),
+        "Monto Impuestos Documento": numpy.array([19, 38, 57], dtype=numpy.int64),
+        "Monto Documento": numpy.array([119, 238, 357], dtype=numpy.int64),
+        "Vendedor": ["a", "b", "c"],
+        "Sucursal": ["s1", "s1", "s2"],
+        "EFECTIVO": numpy.array([119, 0, 357], dtype=numpy.int64),
+    })
+
+    result = physical_tickets.transform(data)
+
+    assert list(result["fecha_emision"]) == ["20240115", "20240117"]
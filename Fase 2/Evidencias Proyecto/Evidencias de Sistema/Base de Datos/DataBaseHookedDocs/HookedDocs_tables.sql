@@ -239,6 +239,26 @@
   PCTINCREASE 0 FREELISTS 1 FREELIST GROUPS 1
   BUFFER_POOL DEFAULT FLASH_CACHE DEFAULT CELL_FLASH_CACHE DEFAULT)
   TABLESPACE "USERS" ;
+--------------------------------------------------------
+--  DDL for Index PHYSICAL_TICKETS_KEY
+--------------------------------------------------------
+
+  CREATE INDEX "HOOKEDDEVELOPER"."PHYSICAL_TICKETS_KEY" ON "HOOKEDDEVELOPER"."PHYSICAL_TICKETS" ("FECHA", "FOLIO", "DTE") 
+  PCTFREE 10 INITRANS 2 MAXTRANS 255 COMPUTE STATISTICS 
+  STORAGE(INITIAL 65536 NEXT 1048576 MINEXTENTS 1 MAXEXTENTS 2147483645
+  PCTINCREASE 0 FREELISTS 1 FREELIST GROUPS 1
+  BUFFER_POOL DEFAULT FLASH_CACHE DEFAULT CELL_FLASH_CACHE DEFAULT)
+  TABLESPACE "USERS" ;
+--------------------------------------------------------
+--  DDL for Index ELECTRONIC_TICKETS_KEY
+--------------------------------------------------------
+
+  CREATE INDEX "HOOKEDDEVELOPER"."ELECTRONIC_TICKETS_KEY" ON "HOOKEDDEVELOPER"."ELECTRONIC_TICKETS" ("EMISION", "FOLIO", "TIPO") 
+  PCTFREE 10 INITRANS 2 MAXTRANS 255 COMPUTE STATISTICS 
+  STORAGE(INITIAL 65536 NEXT 1048576 MINEXTENTS 1 MAXEXTENTS 2147483645
+  PCTINCREASE 0 FREELISTS 1 FREELIST GROUPS 1
+  BUFFER_POOL DEFAULT FLASH_CACHE DEFAULT CELL_FLASH_CACHE DEFAULT)
+  TABLESPACE "USERS" ;
 
 --------------------------------------------------------
 --  Constraints for Table PHYSICAL_TICKETS